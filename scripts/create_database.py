@@ -1,7 +1,9 @@
 from sqlalchemy_utils import create_database, database_exists
 
 import server.database.orm
-from server.database.database import Base, engine
+from server.database.database import Base, get_engine
+
+engine = get_engine()
 
 if not database_exists(engine.url):
     create_database(engine.url)
@@ -1,18 +1,33 @@
 import urllib.parse
-
-from authlib.integrations.starlette_client import OAuth
+from functools import cache
+from typing import TYPE_CHECKING
 
 from server.settings import settings
 
-oauth = OAuth()
+if TYPE_CHECKING:
+    from authlib.integrations.starlette_client import OAuth
+
+
+@cache
+def get_oauth() -> "OAuth":
+    """
+    authlib is slow to import, so the client is only created on the first
+    login. The Auth0 metadata is fetched by authlib when it's first needed.
+    """
+
+    from authlib.integrations.starlette_client import OAuth
+
+    oauth = OAuth()
+
+    oauth.register(
+        "auth0",
+        client_id=settings.auth0_client_id,
+        client_secret=settings.auth0_client_secret,
+        server_metadata_url=f"https://{settings.auth0_domain}/.well-known/openid-configuration",
+        client_kwargs={"scope": "openid profile email"},
+    )
 
-oauth.register(
-    "auth0",
-    client_id=settings.auth0_client_id,
-    client_secret=settings.auth0_client_secret,
-    server_metadata_url=f"https://{settings.auth0_domain}/.well-known/openid-configuration",
-    client_kwargs={"scope": "openid profile email"},
-)
+    return oauth
 
 
 # See The OpenID specs
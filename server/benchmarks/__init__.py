@@ -0,0 +1,6 @@
+"""
+Benchmarks for the server. They are not part of the app and are run by hand
+or in CI against a local database, e.g.
+
+    (set -a && source .env.benchmark && set +a && PYTHONPATH=. python -m server.benchmarks.graphql_endpoints)
+"""
@@ -0,0 +1,284 @@
+"""
+Generate synthetic content_v3 documents, shaped like the canvases the
+frontend saves, in any size.
+
+A canvas is made of chains of InputNode -> ChatGPTMessageNode ->
+ChatGPTChatCompletionNode -> OutputNode, like the example space, and the
+chains are linked by passing the message history of one chain's completion
+to the next chain's message node. variableValueLookUpDicts hold the values of
+a finished run, so they contain LLM output and message histories, which is
+what makes real documents large.
+"""
+
+import random
+import string
+from typing import Any
+
+from server import json_codec
+
+_ID_ALPHABET = string.ascii_letters + string.digits
+
+_WORDS = (
+    "the a poem about earth moon sea light river stone wind night morning "
+    "quiet bright old new small great under over through with and of in to "
+    "write summarize translate explain answer question list every word line"
+).split()
+
+
+class _TextSource:
+    """
+    Slices of one long random text, so generating megabytes of values
+    doesn't pick every word at random.
+    """
+
+    def __init__(self, rng: random.Random, size: int = 1 << 16):
+        self.rng = rng
+        self.text = " ".join(rng.choice(_WORDS) for _ in range(size // 4))
+
+    def get(self, length: int) -> str:
+        length = min(length, len(self.text))
+        start = self.rng.randrange(len(self.text) - length + 1)
+        return self.text[start : start + length]
+
+
+def generate_content(
+    nodes_per_type: int,
+    edge_count: int | None = None,
+    lookup_dict_count: int = 1,
+    value_length: int = 500,
+    seed: int = 0,
+) -> dict[str, Any]:
+    """
+    Generate a content_v3 document with nodes_per_type nodes of each of the
+    four node types.
+
+    There can be up to 4 * nodes_per_type - 1 edges, three within every chain
+    and one linking every chain to the next. edge_count keeps only the first
+    edges, chain edges first. None keeps all of them.
+
+    value_length is the length of LLM output and prompt texts, in characters.
+    """
+
+    max_edge_count = 4 * nodes_per_type - 1
+
+    if edge_count == None:
+        edge_count = max_edge_count
+    elif edge_count > max_edge_count:
+        raise Exception(
+            f"At most {max_edge_count} edges for {nodes_per_type} nodes "
+            "per type"
+        )
+
+    rng = random.Random(seed)
+    text_source = _TextSource(rng)
+    used_ids: set[str] = set()
+
+    def generate_id() -> str:
+        while True:
+            id = "".join(rng.choice(_ID_ALPHABET) for _ in range(5))
+
+            if id not in used_ids:
+                used_ids.add(id)
+                return id
+
+    nodes: list[dict[str, Any]] = []
+    variables: dict[str, dict[str, Any]] = {}
+    node_configs: dict[str, dict[str, Any]] = {}
+    chain_edges: list[tuple[str, str]] = []
+    link_edges: list[tuple[str, str]] = []
+
+    def add_node(node_type: str, chain_index: int, column: int) -> str:
+        node_id = generate_id()
+        nodes.append(
+            {
+                "id": node_id,
+                "data": None,
+                "type": node_type,
+                "position": {
+                    "x": 300.0 + column * 420 + rng.uniform(-40, 40),
+                    "y": 100.0 + chain_index * 360 + rng.uniform(-80, 80),
+                },
+            }
+        )
+        return node_id
+
+    def add_variable(
+        node_id: str,
+        name: str,
+        variable_type: str,
+        index: int,
+        id: str | None = None,
+    ) -> str:
+        variable_id = f"{node_id}/{id if id != None else generate_id()}"
+        variables[variable_id] = {
+            "id": variable_id,
+            "name": name,
+            "type": variable_type,
+            "index": index,
+            "nodeId": node_id,
+            "valueType": (
+                "String"
+                if variable_type in ("FlowInput", "FlowOutput")
+                else "Unknown"
+            ),
+        }
+        return variable_id
+
+    # Variables of every chain, to fill in the lookup dicts
+    chains: list[dict[str, str]] = []
+
+    for chain_index in range(nodes_per_type):
+        input_node_id = add_node("InputNode", chain_index, 0)
+        message_node_id = add_node("ChatGPTMessageNode", chain_index, 1)
+        completion_node_id = add_node(
+            "ChatGPTChatCompletionNode", chain_index, 2
+        )
+        output_node_id = add_node("OutputNode", chain_index, 3)
+
+        chain = {
+            "topic_out": add_variable(input_node_id, "topic", "FlowInput", 0),
+            "messages_in": add_variable(
+                message_node_id, "messages", "NodeInput", 0, "messages_in"
+            ),
+            "topic_in": add_variable(message_node_id, "topic", "NodeInput", 1),
+            "message": add_variable(
+                message_node_id, "message", "NodeOutput", 0, "message"
+            ),
+            "messages_out": add_variable(
+                message_node_id, "messages", "NodeOutput", 1, "messages_out"
+            ),
+            "completion_messages_in": add_variable(
+                completion_node_id, "messages", "NodeInput", 0, "messages_in"
+            ),
+            "content": add_variable(
+                completion_node_id, "content", "NodeOutput", 0, "content"
+            ),
+            "completion_message": add_variable(
+                completion_node_id, "message", "NodeOutput", 1, "message"
+            ),
+            "completion_messages_out": add_variable(
+                completion_node_id, "messages", "NodeOutput", 2, "messages_out"
+            ),
+            "result": add_variable(output_node_id, "result", "FlowOutput", 0),
+        }
+        chains.append(chain)
+
+        node_configs[input_node_id] = {
+            "type": "InputNode",
+            "nodeId": input_node_id,
+        }
+        node_configs[message_node_id] = {
+            "role": "user",
+            "type": "ChatGPTMessageNode",
+            "nodeId": message_node_id,
+            "content": text_source.get(value_length // 4) + " {{topic}}",
+        }
+        node_configs[completion_node_id] = {
+            "seed": None,
+            "stop": [],
+            "type": "ChatGPTChatCompletionNode",
+            "model": "gpt-4",
+            "nodeId": completion_node_id,
+            "temperature": 1,
+            "responseFormatType": None,
+        }
+        node_configs[output_node_id] = {
+            "type": "OutputNode",
+            "nodeId": output_node_id,
+        }
+
+        chain_edges += [
+            (chain["topic_out"], chain["topic_in"]),
+            (chain["messages_out"], chain["completion_messages_in"]),
+            (chain["content"], chain["result"]),
+        ]
+
+        if chain_index > 0:
+            link_edges.append(
+                (chains[-2]["completion_messages_out"], chain["messages_in"])
+            )
+
+    edges = []
+
+    for source_handle, target_handle in (chain_edges + link_edges)[:edge_count]:
+        edges.append(
+            {
+                "id": generate_id(),
+                "source": variables[source_handle]["nodeId"],
+                "target": variables[target_handle]["nodeId"],
+                "sourceHandle": source_handle,
+                "targetHandle": target_handle,
+            }
+        )
+
+    lookup_dicts = []
+
+    for _ in range(lookup_dict_count):
+        values: dict[str, Any] = {}
+
+        for chain in chains:
+            topic = text_source.get(20)
+            message = {
+                "role": "user",
+                "content": text_source.get(value_length // 4) + " " + topic,
+            }
+            completion_message = {
+                "role": "assistant",
+                "content": text_source.get(value_length),
+            }
+
+            values[chain["topic_out"]] = topic
+            values[chain["messages_in"]] = None
+            values[chain["topic_in"]] = topic
+            values[chain["message"]] = message
+            values[chain["messages_out"]] = [message]
+            values[chain["completion_messages_in"]] = [message]
+            values[chain["content"]] = completion_message["content"]
+            values[chain["completion_message"]] = completion_message
+            values[chain["completion_messages_out"]] = [
+                message,
+                completion_message,
+            ]
+            values[chain["result"]] = completion_message["content"]
+
+        lookup_dicts.append(values)
+
+    return {
+        "edges": edges,
+        "nodes": nodes,
+        "variablesDict": variables,
+        "nodeConfigsDict": node_configs,
+        "variableValueLookUpDicts": lookup_dicts,
+    }
+
+
+def generate_content_of_size(
+    size: int,
+    lookup_dict_count: int = 1,
+    value_length: int = 500,
+    seed: int = 0,
+) -> dict[str, Any]:
+    """
+    Generate a document of about size bytes of JSON, with as many chains as
+    needed. Documents grow linearly with the number of chains.
+    """
+
+    def measure(nodes_per_type: int) -> int:
+        content = generate_content(
+            nodes_per_type,
+            lookup_dict_count=lookup_dict_count,
+            value_length=value_length,
+            seed=seed,
+        )
+        return len(json_codec.dumps(content).encode())
+
+    one_chain_size = measure(1)
+    chain_size = measure(2) - one_chain_size
+    nodes_per_type = max(1, round((size - one_chain_size) / chain_size) + 1)
+
+    return generate_content(
+        nodes_per_type,
+        lookup_dict_count=lookup_dict_count,
+        value_length=value_length,
+        seed=seed,
+    )
@@ -0,0 +1,346 @@
+"""
+Micro-benchmarks of how handling a content_v3 document scales with its size,
+for every JSON library that is installed:
+
+- dumps: encoding a document, e.g. a value assigned by a mutation.
+- loads: decoding a document, e.g. to run a flow.
+- validate: json_codec.validate, what updateSpace does with contentV3.
+- response: encoding a GraphQL response with the document as a string field,
+  i.e. escaping it.
+
+With --database, also the round trip through the database in
+POSTGRES_DATABASE_NAME, which is dropped and recreated like for the other
+benchmarks:
+
+- db write: updating content_v3 from JSON text, like updateSpace.
+- db read text: selecting content_v3 cast to text, like Space.contentV3.
+- db read: selecting content_v3 decoded by the driver, like the ORM.
+
+    (set -a && source .env.benchmark && set +a && PYTHONPATH=. python -m server.benchmarks.content_v3_serialization --database)
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+from uuid import UUID, uuid4
+
+from sqlalchemy import Text, cast, select, update
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+from server import json_codec
+from server.database.database import AsyncSessionLocal, async_engine
+from server.database.orm.space import OrmSpace
+from server.database.orm.user import OrmUser
+from server.database.utils import jsonb_from_text
+
+from .content_v3 import generate_content_of_size
+from .seed import reset_benchmark_database
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+DEFAULT_SIZES = "10KB,100KB,1MB,5MB,20MB"
+
+_UNITS = {"KB": 1 << 10, "MB": 1 << 20, "B": 1}
+
+
+@dataclass
+class Measurement:
+    size: int
+    operation: str
+    library: str
+    repeats: int
+    median_ms: float
+    min_ms: float
+    mb_per_second: float
+
+
+def parse_size(value: str) -> int:
+    value = value.strip().upper()
+
+    for unit, multiplier in _UNITS.items():
+        if value.endswith(unit):
+            return int(float(value.removesuffix(unit)) * multiplier)
+
+    return int(value)
+
+
+def _get_libraries() -> dict[str, tuple[Callable, Callable]]:
+    """
+    (loads, dumps) of every installed JSON library, dumps returning str.
+    """
+
+    libraries: dict[str, tuple[Callable, Callable]] = {
+        "json": (json.loads, json.dumps),
+    }
+
+    if orjson != None:
+        libraries["orjson"] = (
+            orjson.loads,
+            lambda value: orjson.dumps(value).decode(),
+        )
+
+    return libraries
+
+
+def _summarize(
+    size: int,
+    operation: str,
+    library: str,
+    seconds: list[float],
+) -> Measurement:
+    median = statistics.median(seconds)
+
+    return Measurement(
+        size=size,
+        operation=operation,
+        library=library,
+        repeats=len(seconds),
+        median_ms=median * 1000,
+        min_ms=min(seconds) * 1000,
+        mb_per_second=size / (1 << 20) / median,
+    )
+
+
+def time_call(
+    fn: Callable[[], Any], min_seconds: float, min_repeats: int
+) -> list[float]:
+    """
+    Call fn until it ran for min_seconds in total, at least min_repeats
+    times.
+    """
+
+    seconds: list[float] = []
+
+    while len(seconds) < min_repeats or sum(seconds) < min_seconds:
+        tic = time.perf_counter()
+        fn()
+        seconds.append(time.perf_counter() - tic)
+
+    return seconds
+
+
+async def time_async_call(
+    fn: Callable[[], Awaitable[Any]], min_seconds: float, min_repeats: int
+) -> list[float]:
+    seconds: list[float] = []
+
+    while len(seconds) < min_repeats or sum(seconds) < min_seconds:
+        tic = time.perf_counter()
+        await fn()
+        seconds.append(time.perf_counter() - tic)
+
+    return seconds
+
+
+def benchmark_codecs(
+    content: dict[str, Any],
+    min_seconds: float,
+    min_repeats: int,
+) -> list[Measurement]:
+    json_text = json_codec.dumps(content)
+    size = len(json_text.encode())
+    measurements = []
+
+    for library, (loads, dumps) in _get_libraries().items():
+        operations: dict[str, Callable[[], Any]] = {
+            "dumps": lambda: dumps(content),
+            "loads": lambda: loads(json_text),
+            "response": lambda: dumps(
+                {"data": {"space": {"space": {"contentV3": json_text}}}}
+            ),
+        }
+
+        for operation, fn in operations.items():
+            seconds = time_call(fn, min_seconds, min_repeats)
+            measurements.append(_summarize(size, operation, library, seconds))
+
+    # validate always uses json_codec, i.e. orjson when it's installed
+    seconds = time_call(
+        lambda: json_codec.validate(json_text), min_seconds, min_repeats
+    )
+    measurements.append(_summarize(size, "validate", "json_codec", seconds))
+
+    return measurements
+
+
+async def benchmark_database(
+    session_maker: async_sessionmaker[AsyncSession],
+    space_id: UUID,
+    content: dict[str, Any],
+    min_seconds: float,
+    min_repeats: int,
+) -> list[Measurement]:
+    json_text = json_codec.dumps(content)
+    size = len(json_text.encode())
+
+    async with session_maker() as db:
+
+        async def write() -> None:
+            await db.execute(
+                update(OrmSpace)
+                .where(OrmSpace.id == space_id)
+                .values(content_v3=jsonb_from_text(json_text))
+            )
+            await db.commit()
+
+        async def read_text() -> None:
+            await db.scalar(
+                select(cast(OrmSpace.content_v3, Text)).where(
+                    OrmSpace.id == space_id
+                )
+            )
+            await db.commit()
+
+        async def read() -> None:
+            await db.scalar(
+                select(OrmSpace.content_v3).where(OrmSpace.id == space_id)
+            )
+            await db.commit()
+
+        operations = {
+            "db write": write,
+            "db read text": read_text,
+            "db read": read,
+        }
+        measurements = []
+
+        for operation, fn in operations.items():
+            seconds = await time_async_call(fn, min_seconds, min_repeats)
+            measurements.append(
+                _summarize(size, operation, "json_codec", seconds)
+            )
+
+    return measurements
+
+
+async def create_space(
+    session_maker: async_sessionmaker[AsyncSession],
+) -> UUID:
+    async with session_maker() as db:
+        db_user = OrmUser(
+            is_user_placeholder=True,
+            placeholder_client_token=str(uuid4()),
+        )
+        db_space = OrmSpace(owner=db_user, content_v3={})
+        db.add(db_space)
+        await db.commit()
+
+        return db_space.id
+
+
+async def run_benchmarks(
+    args: argparse.Namespace,
+    engine: AsyncEngine | None = None,
+    session_maker: async_sessionmaker[AsyncSession] | None = None,
+) -> list[Measurement]:
+    """
+    The database benchmarks run when engine and session_maker are provided.
+    """
+
+    space_id = None
+
+    if engine != None and session_maker != None:
+        await reset_benchmark_database(engine)
+        space_id = await create_space(session_maker)
+
+    measurements = []
+
+    for size in args.sizes:
+        content = generate_content_of_size(
+            size,
+            lookup_dict_count=args.lookup_dicts,
+            value_length=args.value_length,
+        )
+        size_measurements = benchmark_codecs(
+            content, args.min_seconds, args.min_repeats
+        )
+
+        if space_id != None and session_maker != None:
+            size_measurements += await benchmark_database(
+                session_maker,
+                space_id,
+                content,
+                args.min_seconds,
+                args.min_repeats,
+            )
+
+        for measurement in size_measurements:
+            print_measurement(measurement)
+
+        measurements += size_measurements
+
+    return measurements
+
+
+def print_measurement(measurement: Measurement) -> None:
+    print(
+        f"{measurement.size / 1024:>10.0f}KB  {measurement.operation:<14}"
+        f"{measurement.library:<12}{measurement.median_ms:>10.2f}ms"
+        f"{measurement.min_ms:>10.2f}ms{measurement.mb_per_second:>10.1f}MB/s"
+    )
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--sizes",
+        type=lambda value: [parse_size(size) for size in value.split(",")],
+        default=DEFAULT_SIZES,
+        help=f"Comma separated document sizes (default {DEFAULT_SIZES})",
+    )
+    parser.add_argument(
+        "--lookup-dicts",
+        type=int,
+        default=1,
+        help="Number of variableValueLookUpDicts entries",
+    )
+    parser.add_argument(
+        "--value-length",
+        type=int,
+        default=500,
+        help="Characters of LLM output per completion node",
+    )
+    parser.add_argument("--min-seconds", type=float, default=1)
+    parser.add_argument("--min-repeats", type=int, default=5)
+    parser.add_argument(
+        "--database",
+        action="store_true",
+        help="Also measure the round trip through the database",
+    )
+    parser.add_argument(
+        "--output", type=Path, help="Write the measurements as JSON"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+
+    print(
+        f"{'size':>12}  {'operation':<14}{'library':<12}{'median':>12}"
+        f"{'min':>12}{'throughput':>14}"
+    )
+
+    if args.database:
+        measurements = asyncio.run(
+            run_benchmarks(args, async_engine, AsyncSessionLocal)
+        )
+    else:
+        measurements = asyncio.run(run_benchmarks(args))
+
+    if args.output != None:
+        args.output.write_text(
+            json.dumps([asdict(m) for m in measurements], indent=2) + "\n"
+        )
+
+
+if __name__ == "__main__":
+    main()
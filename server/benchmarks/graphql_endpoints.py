@@ -0,0 +1,480 @@
+"""
+End-to-end benchmark of the hot GraphQL operations. It seeds the database in
+POSTGRES_DATABASE_NAME, which is dropped and recreated, so the name must
+contain "bench", e.g. in a .env.benchmark copied from .env.local. Requests go
+through the whole app, i.e. FastAPI, Strawberry and SQLAlchemy, with an
+in-process ASGI client, so no server needs to run:
+
+    (set -a && source .env.benchmark && set +a && PYTHONPATH=. python -m server.benchmarks.graphql_endpoints)
+
+Save a baseline with --save-baseline. Later runs fail when an operation's p95
+latency regresses beyond --tolerance, or when it executes more SQL
+statements than in the baseline.
+
+When SPACE_WRITE_COALESCING_WINDOW_MS is set, updateSpace without
+expectedRevision also waits for the write coalescing window.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import sys
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+import httpx
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+from server.database.database import AsyncSessionLocal, async_engine
+from server.database.utils import space_example_content
+from server.settings import settings
+
+from .seed import SeededUser, reset_benchmark_database, scale_content, seed
+
+DEFAULT_BASELINE_PATH = (
+    Path(__file__).parent / "graphql_endpoints_baseline.json"
+)
+
+QUERY_USER_SPACES = """
+query BenchmarkUserSpaces {
+  user {
+    id
+    spaces {
+      id
+      name
+      contentVersion
+      updatedAt
+    }
+  }
+}
+"""
+
+QUERY_SPACE = """
+query BenchmarkSpace($spaceId: UUID!) {
+  space(id: $spaceId) {
+    isReadOnly
+    space {
+      id
+      name
+      contentVersion
+      contentV3
+      csvEvaluationPresets {
+        id
+        name
+      }
+    }
+  }
+}
+"""
+
+MUTATION_UPDATE_SPACE = """
+mutation BenchmarkUpdateSpace($spaceId: ID!, $contentV3: String!) {
+  updateSpace(id: $spaceId, contentV3: $contentV3) {
+    id
+    revision
+    updatedAt
+  }
+}
+"""
+
+MUTATION_CREATE_CSV_EVALUATION_PRESET = """
+mutation BenchmarkCreateCsvEvaluationPreset(
+  $spaceId: ID!
+  $name: String!
+  $csvContent: String!
+) {
+  createCsvEvaluationPreset(
+    spaceId: $spaceId
+    name: $name
+    csvContent: $csvContent
+  ) {
+    csvEvaluationPreset {
+      id
+    }
+  }
+}
+"""
+
+
+@dataclass
+class OperationResult:
+    iterations: int
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    requests_per_second: float
+    sql_statements_per_operation: float
+
+
+# Builds the GraphQL request body for the n-th request of an operation
+BuildRequest = Callable[[SeededUser, int], dict[str, Any]]
+
+
+def _build_operations(content_v3: str) -> dict[str, BuildRequest]:
+    def user_spaces(user: SeededUser, index: int) -> dict[str, Any]:
+        return {"query": QUERY_USER_SPACES}
+
+    def space(user: SeededUser, index: int) -> dict[str, Any]:
+        return {
+            "query": QUERY_SPACE,
+            "variables": {
+                "spaceId": str(user.space_ids[index % len(user.space_ids)])
+            },
+        }
+
+    def update_space(user: SeededUser, index: int) -> dict[str, Any]:
+        return {
+            "query": MUTATION_UPDATE_SPACE,
+            "variables": {
+                "spaceId": str(user.space_ids[index % len(user.space_ids)]),
+                "contentV3": content_v3,
+            },
+        }
+
+    def create_csv_evaluation_preset(
+        user: SeededUser, index: int
+    ) -> dict[str, Any]:
+        return {
+            "query": MUTATION_CREATE_CSV_EVALUATION_PRESET,
+            "variables": {
+                "spaceId": str(user.space_ids[index % len(user.space_ids)]),
+                "name": f"Benchmark preset {index}",
+                "csvContent": "topic,poem\nthe earth,\nthe moon,\n",
+            },
+        }
+
+    return {
+        "user.spaces": user_spaces,
+        "space": space,
+        "updateSpace": update_space,
+        "createCsvEvaluationPreset": create_csv_evaluation_preset,
+    }
+
+
+def percentile(sorted_values: list[float], percent: float) -> float:
+    """
+    Nearest-rank percentile of a sorted, non-empty list.
+    """
+
+    rank = max(0, math.ceil(percent / 100 * len(sorted_values)) - 1)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class StatementCounter:
+    """
+    Counts SQL statements executed on an engine, between start() and stop().
+    """
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self.count = 0
+
+    def _before_cursor_execute(self, *args: Any) -> None:
+        self.count += 1
+
+    def start(self) -> None:
+        self.count = 0
+        event.listen(
+            self.engine, "before_cursor_execute", self._before_cursor_execute
+        )
+
+    def stop(self) -> None:
+        event.remove(
+            self.engine, "before_cursor_execute", self._before_cursor_execute
+        )
+
+
+async def _send(
+    client: httpx.AsyncClient,
+    users: list[SeededUser],
+    build_request: BuildRequest,
+    index: int,
+) -> float:
+    user = users[index % len(users)]
+    # Spread requests over the user's spaces once every user had one
+    body = build_request(user, index // len(users))
+
+    tic = time.perf_counter()
+    response = await client.post(
+        "/graphql",
+        json=body,
+        headers={"PlaceholderUserToken": user.placeholder_user_token},
+    )
+    seconds = time.perf_counter() - tic
+
+    response.raise_for_status()
+    result = response.json()
+
+    if result.get("errors") != None:
+        raise Exception(f"GraphQL errors: {result['errors']}")
+
+    return seconds
+
+
+async def _run_requests(
+    count: int,
+    concurrency: int,
+    send: Callable[[int], Awaitable[float]],
+) -> list[float]:
+    latencies: list[float] = []
+    next_index = 0
+
+    async def worker() -> None:
+        nonlocal next_index
+
+        while next_index < count:
+            index = next_index
+            next_index += 1
+            latencies.append(await send(index))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    return latencies
+
+
+async def benchmark_operation(
+    client: httpx.AsyncClient,
+    counter: StatementCounter,
+    users: list[SeededUser],
+    build_request: BuildRequest,
+    iterations: int,
+    warmup: int,
+    concurrency: int,
+) -> OperationResult:
+    def send(index: int) -> Awaitable[float]:
+        return _send(client, users, build_request, index)
+
+    # Fills caches, e.g. the parser cache and the connection pool
+    await _run_requests(warmup, concurrency, send)
+
+    counter.start()
+    tic = time.perf_counter()
+
+    try:
+        latencies = await _run_requests(
+            iterations, concurrency, lambda index: send(warmup + index)
+        )
+    finally:
+        counter.stop()
+
+    seconds = time.perf_counter() - tic
+    latencies_ms = sorted(latency * 1000 for latency in latencies)
+
+    return OperationResult(
+        iterations=iterations,
+        p50_ms=percentile(latencies_ms, 50),
+        p95_ms=percentile(latencies_ms, 95),
+        p99_ms=percentile(latencies_ms, 99),
+        requests_per_second=iterations / seconds,
+        sql_statements_per_operation=counter.count / iterations,
+    )
+
+
+async def run_benchmarks(
+    app: Any,
+    engine: AsyncEngine,
+    session_maker: async_sessionmaker[AsyncSession],
+    args: argparse.Namespace,
+) -> dict[str, OperationResult]:
+    await reset_benchmark_database(engine)
+
+    async with session_maker() as db:
+        users = await seed(
+            db,
+            user_count=args.users,
+            spaces_per_user=args.spaces_per_user,
+            presets_per_space=args.presets_per_space,
+            rows_per_preset=args.rows_per_preset,
+            content_scale=args.content_scale,
+        )
+
+    operations = _build_operations(
+        json.dumps(scale_content(space_example_content(), args.content_scale))
+    )
+    counter = StatementCounter(engine.sync_engine)
+    results: dict[str, OperationResult] = {}
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app),
+        base_url="http://benchmark",
+        headers={"Accept": "application/json"},
+    ) as client:
+        for name, build_request in operations.items():
+            if args.operation != None and name not in args.operation:
+                continue
+
+            results[name] = await benchmark_operation(
+                client,
+                counter,
+                users,
+                build_request,
+                iterations=args.iterations,
+                warmup=args.warmup,
+                concurrency=args.concurrency,
+            )
+
+    return results
+
+
+def get_config(args: argparse.Namespace) -> dict[str, Any]:
+    """
+    What the results depend on, besides the code and the machine. Results are
+    only compared with a baseline recorded with the same config.
+    """
+
+    return {
+        "users": args.users,
+        "spaces_per_user": args.spaces_per_user,
+        "presets_per_space": args.presets_per_space,
+        "rows_per_preset": args.rows_per_preset,
+        "content_scale": args.content_scale,
+        "iterations": args.iterations,
+        "concurrency": args.concurrency,
+        "space_write_coalescing_window_ms": (
+            settings.space_write_coalescing_window_ms
+        ),
+    }
+
+
+def compare_with_baseline(
+    results: dict[str, OperationResult],
+    baseline: dict[str, Any],
+    tolerance: float,
+) -> list[str]:
+    """
+    Returns the regressions, empty when there are none.
+    """
+
+    regressions = []
+
+    for name, result in results.items():
+        baseline_result = baseline["results"].get(name)
+
+        if baseline_result == None:
+            continue
+
+        max_p95_ms = baseline_result["p95_ms"] * (1 + tolerance)
+
+        if result.p95_ms > max_p95_ms:
+            regressions.append(
+                f"{name}: p95 {result.p95_ms:0.1f}ms > "
+                f"{max_p95_ms:0.1f}ms "
+                f"(baseline {baseline_result['p95_ms']:0.1f}ms)"
+            )
+
+        baseline_statements = baseline_result["sql_statements_per_operation"]
+
+        if result.sql_statements_per_operation > baseline_statements:
+            regressions.append(
+                f"{name}: {result.sql_statements_per_operation:g} SQL "
+                f"statements per operation > {baseline_statements:g} "
+                f"(baseline)"
+            )
+
+    return regressions
+
+
+def print_results(results: dict[str, OperationResult]) -> None:
+    print(
+        f"{'operation':<28}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+        f"{'req/s':>10}{'SQL/op':>10}"
+    )
+
+    for name, result in results.items():
+        print(
+            f"{name:<28}{result.p50_ms:>10.1f}{result.p95_ms:>10.1f}"
+            f"{result.p99_ms:>10.1f}{result.requests_per_second:>10.1f}"
+            f"{result.sql_statements_per_operation:>10.2f}"
+        )
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--spaces-per-user", type=int, default=10)
+    parser.add_argument("--presets-per-space", type=int, default=2)
+    parser.add_argument("--rows-per-preset", type=int, default=100)
+    parser.add_argument(
+        "--content-scale",
+        type=int,
+        default=10,
+        help="Number of copies of the example flow in every space",
+    )
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument(
+        "--operation",
+        action="append",
+        help="Only benchmark this operation, can be repeated",
+    )
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE_PATH)
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Write the results to the baseline file instead of comparing",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Allowed p95 regression, as a fraction of the baseline",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+
+    from server.main import app
+
+    results = asyncio.run(
+        run_benchmarks(app, async_engine, AsyncSessionLocal, args)
+    )
+    print_results(results)
+
+    config = get_config(args)
+
+    if args.save_baseline:
+        args.baseline.write_text(
+            json.dumps(
+                {
+                    "config": config,
+                    "results": {
+                        name: asdict(result) for name, result in results.items()
+                    },
+                },
+                indent=2,
+            )
+            + "\n"
+        )
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}, run with --save-baseline")
+        return 0
+
+    baseline = json.loads(args.baseline.read_text())
+
+    if baseline["config"] != config:
+        raise Exception(
+            f"Baseline was recorded with {baseline['config']}, "
+            f"not comparable with {config}"
+        )
+
+    regressions = compare_with_baseline(results, baseline, args.tolerance)
+
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+
+    return 1 if len(regressions) > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
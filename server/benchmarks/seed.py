@@ -0,0 +1,183 @@
+import copy
+from dataclasses import dataclass
+from typing import Any
+from uuid import UUID, uuid4
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+import server.database.orm
+from server.database.csv_rows import replace_all_rows
+from server.database.database import Base
+from server.database.orm.csv_evaluation_preset import OrmCSVEvaluationPreset
+from server.database.orm.space import OrmSpace
+from server.database.orm.user import OrmUser
+from server.database.utils import space_example_content
+from server.settings import settings
+
+
+async def reset_benchmark_database(engine: AsyncEngine) -> None:
+    """
+    Drop and create all tables. Only allowed when POSTGRES_DATABASE_NAME
+    contains "bench", so a benchmark never wipes a development database.
+    """
+
+    if "bench" not in settings.postgres_database_name:
+        raise Exception(
+            "POSTGRES_DATABASE_NAME must contain 'bench', "
+            "because benchmarks drop and seed the database"
+        )
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+
+@dataclass
+class SeededUser:
+    placeholder_user_token: str
+    space_ids: list[UUID]
+
+
+def scale_content(content: dict[str, Any], factor: int) -> dict[str, Any]:
+    """
+    Repeat every node of a content_v3 document factor times, with its edges,
+    variables, configs and values, as if the flow had been copied and pasted.
+    """
+
+    if factor <= 1:
+        return content
+
+    scaled: dict[str, Any] = {
+        "edges": [],
+        "nodes": [],
+        "variablesDict": {},
+        "nodeConfigsDict": {},
+        "variableValueLookUpDicts": [
+            {} for _ in content["variableValueLookUpDicts"]
+        ],
+    }
+
+    for copy_index in range(factor):
+
+        def rename(id: str) -> str:
+            # Variable and handle ids are prefixed with their node id
+            node_id, separator, rest = id.partition("/")
+            return f"{node_id}-{copy_index}{separator}{rest}"
+
+        for edge in content["edges"]:
+            scaled["edges"].append(
+                {
+                    "id": rename(edge["id"]),
+                    "source": rename(edge["source"]),
+                    "target": rename(edge["target"]),
+                    "sourceHandle": rename(edge["sourceHandle"]),
+                    "targetHandle": rename(edge["targetHandle"]),
+                }
+            )
+
+        for node in content["nodes"]:
+            position = node["position"]
+            scaled["nodes"].append(
+                {
+                    **node,
+                    "id": rename(node["id"]),
+                    "position": {
+                        "x": position["x"],
+                        "y": position["y"] + copy_index * 500,
+                    },
+                }
+            )
+
+        for variable_id, variable in content["variablesDict"].items():
+            scaled["variablesDict"][rename(variable_id)] = {
+                **variable,
+                "id": rename(variable_id),
+                "nodeId": rename(variable["nodeId"]),
+            }
+
+        for node_id, node_config in content["nodeConfigsDict"].items():
+            scaled["nodeConfigsDict"][rename(node_id)] = {
+                **copy.deepcopy(node_config),
+                "nodeId": rename(node_id),
+            }
+
+        for values, scaled_values in zip(
+            content["variableValueLookUpDicts"],
+            scaled["variableValueLookUpDicts"],
+        ):
+            for variable_id, value in values.items():
+                scaled_values[rename(variable_id)] = value
+
+    return scaled
+
+
+async def seed(
+    db: AsyncSession,
+    user_count: int,
+    spaces_per_user: int,
+    presets_per_space: int,
+    rows_per_preset: int,
+    content_scale: int,
+) -> list[SeededUser]:
+    """
+    Insert placeholder users, each with spaces of scaled example content and
+    CSV evaluation presets. Users can be authenticated with their
+    PlaceholderUserToken.
+    """
+
+    content = scale_content(space_example_content(), content_scale)
+    csv_rows = [["topic", "poem"]] + [
+        [f"topic {index}", ""] for index in range(rows_per_preset)
+    ]
+
+    seeded_users: list[SeededUser] = []
+    user_values: list[dict[str, Any]] = []
+    space_values: list[dict[str, Any]] = []
+
+    for user_index in range(user_count):
+        user_id = uuid4()
+        seeded_user = SeededUser(
+            placeholder_user_token=str(uuid4()),
+            space_ids=[uuid4() for _ in range(spaces_per_user)],
+        )
+        seeded_users.append(seeded_user)
+
+        user_values.append(
+            {
+                "id": user_id,
+                "is_user_placeholder": True,
+                "placeholder_client_token": seeded_user.placeholder_user_token,
+            }
+        )
+
+        for space_index, space_id in enumerate(seeded_user.space_ids):
+            space_values.append(
+                {
+                    "id": space_id,
+                    "owner_id": user_id,
+                    "name": f"Space {user_index}/{space_index}",
+                    "content_version": "v3",
+                    "content_v3": content,
+                }
+            )
+
+    await db.execute(insert(OrmUser), user_values)
+    await db.execute(insert(OrmSpace), space_values)
+
+    for space in space_values:
+        for preset_index in range(presets_per_space):
+            db_preset = OrmCSVEvaluationPreset(
+                owner_id=space["owner_id"],
+                space_id=space["id"],
+                name=f"Preset {preset_index}",
+                config_content={"repeatTimes": 1, "concurrencyLimit": 2},
+            )
+            db.add(db_preset)
+            await db.flush()
+
+            await replace_all_rows(db, db_preset, csv_rows)
+
+    await db.commit()
+
+    return seeded_users
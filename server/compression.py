@@ -0,0 +1,479 @@
+"""
+HTTP compression. Responses are compressed with the best encoding the client
+accepts, and request bodies sent with Content-Encoding, e.g. large
+updateSpace uploads, are decompressed before they reach the app.
+
+gzip is always available. brotli and zstd are used when the brotli and
+zstandard packages are installed.
+"""
+
+import zlib
+from typing import Protocol
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import PlainTextResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from server.settings import settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Text formats, other types are usually compressed already, e.g. images
+_COMPRESSIBLE_MEDIA_TYPES = {
+    "application/json",
+    "application/graphql-response+json",
+    "application/javascript",
+    "image/svg+xml",
+    # Streamed GraphQL responses, e.g. subscriptions over HTTP
+    "multipart/mixed",
+}
+
+
+class _Compressor(Protocol):
+    def compress(self, data: bytes) -> bytes: ...
+
+    def flush(self) -> bytes:
+        """
+        Everything compressed so far, so the client can decode it without
+        waiting for the rest of a streamed response.
+        """
+        ...
+
+    def finish(self) -> bytes: ...
+
+
+class _Decompressor(Protocol):
+    def decompress(self, data: bytes, max_size: int) -> bytes:
+        """
+        Decompress the next part of the body. Raises _OutputLimitExceeded as
+        soon as the output is larger than max_size, without decompressing the
+        rest, so a small body can't expand into more memory than allowed.
+        """
+        ...
+
+
+class _OutputLimitExceeded(Exception):
+    pass
+
+
+class _GzipCompressor:
+    def __init__(self):
+        self.compressobj = zlib.compressobj(
+            settings.compression_gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS
+        )
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressobj.compress(data)
+
+    def flush(self) -> bytes:
+        return self.compressobj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self.compressobj.flush(zlib.Z_FINISH)
+
+
+class _BrotliCompressor:
+    def __init__(self):
+        self.compressor = brotli.Compressor(
+            quality=settings.compression_brotli_quality
+        )
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self.compressor.flush()
+
+    def finish(self) -> bytes:
+        return self.compressor.finish()
+
+
+class _ZstdCompressor:
+    def __init__(self):
+        self.compressobj = zstandard.ZstdCompressor(
+            level=settings.compression_zstd_level
+        ).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressobj.compress(data)
+
+    def flush(self) -> bytes:
+        return self.compressobj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self.compressobj.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+class _GzipDecompressor:
+    def __init__(self):
+        self.decompressobj = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def decompress(self, data: bytes, max_size: int) -> bytes:
+        # One byte more than allowed, to tell a body of exactly max_size
+        # apart from a larger one. Input is only left unconsumed when the
+        # output reached that length.
+        output = self.decompressobj.decompress(data, max_size + 1)
+
+        if len(output) > max_size:
+            raise _OutputLimitExceeded()
+
+        return output
+
+
+class _BrotliDecompressor:
+    def __init__(self):
+        self.decompressor = brotli.Decompressor()
+
+    def decompress(self, data: bytes, max_size: int) -> bytes:
+        parts: list[bytes] = []
+        size = 0
+        output = self.decompressor.process(
+            data, output_buffer_limit=max_size + 1
+        )
+
+        while True:
+            size += len(output)
+
+            if size > max_size:
+                raise _OutputLimitExceeded()
+
+            parts.append(output)
+
+            # More output is pending until the decompressor accepts input
+            if self.decompressor.can_accept_more_data():
+                return b"".join(parts)
+
+            output = self.decompressor.process(
+                b"", output_buffer_limit=max_size + 1 - size
+            )
+
+
+class _LimitedWriter:
+    """
+    Collects the output of a zstd stream writer, which writes it in chunks
+    of at most `write_size`, and stops the decompression once it's too large.
+    """
+
+    def __init__(self):
+        self.parts: list[bytes] = []
+        self.size = 0
+        self.max_size = 0
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+
+        if self.size > self.max_size:
+            raise _OutputLimitExceeded()
+
+        self.parts.append(bytes(data))
+        return len(data)
+
+
+class _ZstdDecompressor:
+    def __init__(self):
+        self.output = _LimitedWriter()
+        self.writer = zstandard.ZstdDecompressor().stream_writer(
+            self.output, closefd=False
+        )
+
+    def decompress(self, data: bytes, max_size: int) -> bytes:
+        self.output.parts = []
+        self.output.size = 0
+        self.output.max_size = max_size
+        self.writer.write(data)
+        return b"".join(self.output.parts)
+
+
+COMPRESSORS = {"gzip": _GzipCompressor}
+DECOMPRESSORS = {"gzip": _GzipDecompressor}
+
+if brotli != None:
+    COMPRESSORS["br"] = _BrotliCompressor
+
+    # Decompressing with bounded output needs brotli 1.2 or later
+    if hasattr(brotli.Decompressor, "can_accept_more_data"):
+        DECOMPRESSORS["br"] = _BrotliDecompressor
+
+if zstandard != None:
+    COMPRESSORS["zstd"] = _ZstdCompressor
+    DECOMPRESSORS["zstd"] = _ZstdDecompressor
+
+
+def choose_encoding(accept_encoding: str) -> str | None:
+    """
+    The encoding to compress a response with, given the request's
+    Accept-Encoding header. Among the encodings the client accepts equally,
+    the first one in settings.compression_encodings wins.
+    """
+
+    qualities: dict[str, float] = {}
+
+    for item in accept_encoding.split(","):
+        coding, *params = item.split(";")
+        quality = 1.0
+
+        for param in params:
+            name, _, value = param.partition("=")
+
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0
+
+        if coding.strip() != "":
+            qualities[coding.strip().lower()] = quality
+
+    encoding = None
+    best_quality = 0.0
+
+    for candidate in settings.compression_encodings.split(","):
+        candidate = candidate.strip()
+
+        if candidate not in COMPRESSORS:
+            continue
+
+        quality = qualities.get(candidate, qualities.get("*", 0))
+
+        if quality > best_quality:
+            encoding = candidate
+            best_quality = quality
+
+    return encoding
+
+
+def _is_compressible(headers: Headers, status: int) -> bool:
+    if status < 200 or status in (204, 304):
+        return False
+
+    if "content-encoding" in headers:
+        return False
+
+    if "no-transform" in headers.get("cache-control", ""):
+        return False
+
+    media_type = headers.get("content-type", "").split(";")[0].strip()
+
+    return media_type.startswith("text/") or (
+        media_type in _COMPRESSIBLE_MEDIA_TYPES
+    )
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        content_encoding = headers.get("content-encoding", "identity")
+
+        if content_encoding.strip().lower() != "identity":
+            try:
+                scope, receive = await _decompress_request(
+                    scope, receive, content_encoding.strip().lower()
+                )
+            except RequestBodyError as error:
+                response = PlainTextResponse(
+                    error.message,
+                    status_code=error.status_code,
+                    headers=error.headers,
+                )
+                await response(scope, receive, send)
+                return
+
+        encoding = choose_encoding(headers.get("accept-encoding", ""))
+
+        await _CompressedResponse(self.app, encoding)(scope, receive, send)
+
+
+class _CompressedResponse:
+    """
+    Compresses the response of one request, with encoding None when the
+    client doesn't accept any we support. Whether to compress is decided
+    on the first body message: a complete body is compressed at once when
+    it's large enough, a streamed body is compressed chunk by chunk and
+    flushed, so streamed events arrive without delay.
+    """
+
+    def __init__(self, app: ASGIApp, encoding: str | None):
+        self.app = app
+        self.encoding = encoding
+        self.send: Send
+        self.start_message: Message | None = None
+        self.compressor: _Compressor | None = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            # Headers depend on the body, so wait for it
+            self.start_message = message
+            return
+
+        if self.start_message != None:
+            start_message = self.start_message
+            self.start_message = None
+
+            if message["type"] == "http.response.body":
+                await self.start(start_message, message)
+                return
+
+            await self.send(start_message)
+
+        if message["type"] != "http.response.body" or self.compressor == None:
+            await self.send(message)
+            return
+
+        more_body = message.get("more_body", False)
+        body = self.compressor.compress(message.get("body", b""))
+        body += (
+            self.compressor.flush() if more_body else self.compressor.finish()
+        )
+
+        await self.send(
+            {"type": "http.response.body", "body": body, "more_body": more_body}
+        )
+
+    async def start(self, start_message: Message, message: Message) -> None:
+        headers = MutableHeaders(raw=start_message["headers"])
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if not _is_compressible(headers, start_message["status"]):
+            await self.send(start_message)
+            await self.send(message)
+            return
+
+        # The response would be compressed if it was larger
+        headers.add_vary_header("Accept-Encoding")
+
+        if self.encoding == None or (
+            not more_body and len(body) < settings.compression_minimum_size
+        ):
+            await self.send(start_message)
+            await self.send(message)
+            return
+
+        self.compressor = COMPRESSORS[self.encoding]()
+        headers["Content-Encoding"] = self.encoding
+
+        # The compressed representation isn't byte for byte the same
+        etag = headers.get("etag")
+
+        if etag != None and not etag.startswith("W/"):
+            headers["ETag"] = f"W/{etag}"
+
+        body = self.compressor.compress(body)
+
+        if more_body:
+            body += self.compressor.flush()
+            del headers["Content-Length"]
+        else:
+            body += self.compressor.finish()
+            headers["Content-Length"] = str(len(body))
+
+        await self.send(start_message)
+        await self.send(
+            {"type": "http.response.body", "body": body, "more_body": more_body}
+        )
+
+
+class RequestBodyError(Exception):
+    def __init__(
+        self,
+        message: str,
+        status_code: int,
+        headers: dict[str, str] | None = None,
+    ):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.headers = headers
+
+
+async def _decompress_request(
+    scope: Scope, receive: Receive, encoding: str
+) -> tuple[Scope, Receive]:
+    """
+    Read and decompress the whole request body, and return the scope and
+    receive to pass it on uncompressed. Request bodies are read completely
+    by the app anyway, e.g. to parse a GraphQL request.
+    """
+
+    if encoding not in DECOMPRESSORS:
+        raise RequestBodyError(
+            f"Unsupported Content-Encoding: {encoding}",
+            status_code=415,
+            # What we accept instead, see RFC 7694
+            headers={"Accept-Encoding": ", ".join(DECOMPRESSORS)},
+        )
+
+    decompressor = DECOMPRESSORS[encoding]()
+    max_size = settings.request_max_decompressed_size
+    parts: list[bytes] = []
+    size = 0
+    more_body = True
+
+    while more_body:
+        message = await receive()
+
+        if message["type"] == "http.disconnect":
+            raise RequestBodyError("Client disconnected", status_code=400)
+
+        more_body = message.get("more_body", False)
+        data = message.get("body", b"")
+
+        if len(data) == 0:
+            continue
+
+        try:
+            part = decompressor.decompress(data, max_size - size)
+        except _OutputLimitExceeded:
+            raise RequestBodyError(
+                f"Request body is larger than {max_size} bytes",
+                status_code=413,
+            )
+        except Exception as exception:
+            raise RequestBodyError(
+                f"Invalid {encoding} request body", status_code=400
+            ) from exception
+
+        size += len(part)
+        parts.append(part)
+
+    body = b"".join(parts)
+
+    headers = [
+        (name, value)
+        for name, value in scope["headers"]
+        if name not in (b"content-encoding", b"content-length")
+    ]
+    headers.append((b"content-length", str(len(body)).encode()))
+
+    is_body_sent = False
+
+    async def receive_decompressed() -> Message:
+        nonlocal is_body_sent
+
+        if not is_body_sent:
+            is_body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        # Nothing more to read, wait for the client to disconnect
+        return await receive()
+
+    return {**scope, "headers": headers}, receive_decompressed
@@ -0,0 +1,85 @@
+"""
+SQL expressions that modify a space's `content_v3` in place with Postgres
+JSONB functions, so a small edit doesn't need the whole document to be sent
+to the database and rewritten by the client.
+
+Each function takes the current document expression and returns the new one,
+so operations can be chained into a single UPDATE statement. They only
+reference the document once, to keep the chained expression linear in size.
+"""
+
+from sqlalchemy import Text, cast, column, func, literal, select
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, array
+from sqlalchemy.sql.expression import ColumnElement
+
+from .utils import jsonb_from_text
+
+
+def _path(path: list[str]) -> ColumnElement:
+    return literal(path, ARRAY(Text))
+
+
+def set_value(doc: ColumnElement, path: list[str], value: str) -> ColumnElement:
+    return func.jsonb_set(doc, _path(path), jsonb_from_text(value), True)
+
+
+def remove_value(doc: ColumnElement, path: list[str]) -> ColumnElement:
+    return doc.op("#-", return_type=JSONB)(_path(path))
+
+
+def add_node(doc: ColumnElement, node: str) -> ColumnElement:
+    # Append to the end of the `nodes` array.
+    return func.jsonb_insert(
+        doc, _path(["nodes", "-1"]), jsonb_from_text(node), True
+    )
+
+
+def move_node(doc: ColumnElement, node_id: str, position: str) -> ColumnElement:
+    # `nodes` is an array, so the node is looked up by its ID in the document
+    # being patched, which includes nodes added by earlier patches. The
+    # document is needed twice, for the lookup and for jsonb_set(), so it's
+    # selected once as a one row table instead of being repeated in the
+    # expression. A table function, unlike a derived table, correlates to
+    # the row being updated.
+    current_doc = (
+        func.unnest(array([doc], type_=JSONB))
+        .table_valued(column("doc", JSONB))
+        .render_derived()
+        .c.doc
+    )
+
+    nodes = func.jsonb_array_elements(current_doc["nodes"]).table_valued(
+        column("value", JSONB), with_ordinality="ordinality"
+    )
+
+    # NULL if the node doesn't exist, and jsonb_set() rejects a path with NULL
+    # in it, which aborts the update.
+    index = (
+        select(cast(nodes.c.ordinality - 1, Text))
+        .where(nodes.c.value["id"].astext == node_id)
+        .scalar_subquery()
+    )
+
+    return select(
+        func.jsonb_set(
+            current_doc,
+            array([literal("nodes"), index, literal("position")], type_=Text),
+            jsonb_from_text(position),
+        )
+    ).scalar_subquery()
+
+
+def set_node_config(
+    doc: ColumnElement,
+    node_id: str,
+    node_config: str,
+) -> ColumnElement:
+    return set_value(doc, ["nodeConfigsDict", node_id], node_config)
+
+
+def set_variable_value(
+    doc: ColumnElement,
+    variable_id: str,
+    value: str,
+) -> ColumnElement:
+    return set_value(doc, ["variableValueLookUpDicts", "0", variable_id], value)
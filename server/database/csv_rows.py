@@ -0,0 +1,262 @@
+"""
+Store CSV datasets of evaluation presets as fixed size chunks of rows, so rows
+can be read and written by index without transferring the whole dataset.
+
+Row N is stored at index N % ROWS_PER_CHUNK of chunk N // ROWS_PER_CHUNK.
+Callers must lock the preset row (`SELECT ... FOR UPDATE`) before writing,
+because writes read and update `row_count`.
+"""
+
+import csv
+import io
+from typing import AsyncIterator, Iterable, Iterator
+from uuid import UUID
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from server import json_codec
+
+from .orm.csv_evaluation_preset import OrmCSVEvaluationPreset
+from .orm.csv_evaluation_preset_row_chunk import OrmCSVEvaluationPresetRowChunk
+
+ROWS_PER_CHUNK = 1000
+
+_Chunk = OrmCSVEvaluationPresetRowChunk
+
+
+def parse_csv(csv_content: str) -> Iterator[list[str]]:
+    """
+    Parse CSV rows lazily. Blank lines are kept as empty rows, so row indexes
+    match the rows the browser parses from the same text.
+    """
+
+    return csv.reader(io.StringIO(csv_content))
+
+
+def format_csv(rows: Iterable[list[str]]) -> str:
+    """
+    Format rows as CSV text. Only the rows are stored, not the text they were
+    parsed from, so the text is normalized: lines end with "\n", and fields
+    are only quoted when needed, e.g. when they contain a comma.
+    """
+
+    output = io.StringIO()
+    csv.writer(output, lineterminator="\n").writerows(rows)
+    return output.getvalue()
+
+
+def _iter_chunks(
+    rows: Iterable[list[str]],
+    first_chunk_index: int,
+) -> Iterator[tuple[int, list[list[str]]]]:
+    chunk_index = first_chunk_index
+    chunk_rows: list[list[str]] = []
+
+    for row in rows:
+        chunk_rows.append(row)
+
+        if len(chunk_rows) == ROWS_PER_CHUNK:
+            yield chunk_index, chunk_rows
+            chunk_index += 1
+            chunk_rows = []
+
+    if len(chunk_rows) > 0:
+        yield chunk_index, chunk_rows
+
+
+async def _write_chunks(
+    db: AsyncSession,
+    preset_id: UUID,
+    chunks: Iterable[tuple[int, list[list[str]]]],
+) -> None:
+    """
+    Insert chunks that don't exist yet. Uses COPY on asyncpg, which is much
+    faster than INSERT for large datasets.
+    """
+
+    chunks = list(chunks)
+
+    if len(chunks) == 0:
+        return
+
+    connection = await db.connection()
+
+    if connection.dialect.driver == "asyncpg":
+        # NOTE: The session has already executed a statement at this point,
+        # i.e. locking the preset, so COPY runs inside the same transaction.
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            _Chunk.__tablename__,
+            records=[
+                (preset_id, chunk_index, json_codec.dumps(rows))
+                for chunk_index, rows in chunks
+            ],
+            columns=["preset_id", "chunk_index", "rows"],
+        )
+    else:
+        await db.execute(
+            insert(_Chunk),
+            [
+                {
+                    "preset_id": preset_id,
+                    "chunk_index": chunk_index,
+                    "rows": rows,
+                }
+                for chunk_index, rows in chunks
+            ],
+        )
+
+
+async def _load_chunks(
+    db: AsyncSession,
+    preset_id: UUID,
+    first_chunk_index: int,
+    last_chunk_index: int,
+) -> dict[int, list[list[str]]]:
+    result = await db.execute(
+        select(_Chunk.chunk_index, _Chunk.rows).where(
+            _Chunk.preset_id == preset_id,
+            _Chunk.chunk_index >= first_chunk_index,
+            _Chunk.chunk_index <= last_chunk_index,
+        )
+    )
+
+    return {chunk_index: rows for chunk_index, rows in result}
+
+
+async def _delete_chunks_from(
+    db: AsyncSession,
+    preset_id: UUID,
+    first_chunk_index: int,
+) -> None:
+    await db.execute(
+        delete(_Chunk).where(
+            _Chunk.preset_id == preset_id,
+            _Chunk.chunk_index >= first_chunk_index,
+        )
+    )
+
+
+async def replace_all_rows(
+    db: AsyncSession,
+    db_preset: OrmCSVEvaluationPreset,
+    rows: Iterable[list[str]],
+) -> None:
+    await _delete_chunks_from(db, db_preset.id, 0)
+
+    row_count = 0
+
+    def count(rows: Iterable[list[str]]) -> Iterator[list[str]]:
+        nonlocal row_count
+
+        for row in rows:
+            row_count += 1
+            yield row
+
+    await _write_chunks(db, db_preset.id, _iter_chunks(count(rows), 0))
+
+    db_preset.row_count = row_count
+
+
+async def replace_rows(
+    db: AsyncSession,
+    db_preset: OrmCSVEvaluationPreset,
+    start: int,
+    rows: list[list[str]],
+) -> None:
+    """
+    Overwrite rows starting at `start`. Rows past the current end are
+    appended, so `start == row_count` appends.
+    """
+
+    if start < 0 or start > db_preset.row_count:
+        raise Exception(f"start must be between 0 and {db_preset.row_count}")
+
+    if len(rows) == 0:
+        return
+
+    end = start + len(rows)
+    first_chunk_index = start // ROWS_PER_CHUNK
+    last_chunk_index = (end - 1) // ROWS_PER_CHUNK
+
+    chunks = await _load_chunks(
+        db, db_preset.id, first_chunk_index, last_chunk_index
+    )
+
+    for row_index, row in enumerate(rows, start):
+        chunk_rows = chunks.setdefault(row_index // ROWS_PER_CHUNK, [])
+        offset = row_index % ROWS_PER_CHUNK
+
+        if offset < len(chunk_rows):
+            chunk_rows[offset] = row
+        else:
+            chunk_rows.append(row)
+
+    # Rewrite changed chunks, it's cheaper than updating JSONB elements one
+    # by one, and chunks are small.
+    await db.execute(
+        delete(_Chunk).where(
+            _Chunk.preset_id == db_preset.id,
+            _Chunk.chunk_index.in_(chunks.keys()),
+        )
+    )
+    await _write_chunks(db, db_preset.id, sorted(chunks.items()))
+
+    db_preset.row_count = max(db_preset.row_count, end)
+
+
+async def get_rows(
+    db: AsyncSession,
+    preset_id: UUID,
+    offset: int,
+    limit: int,
+) -> list[list[str]]:
+    if offset < 0:
+        raise Exception("offset must not be negative")
+
+    if limit <= 0:
+        return []
+
+    chunks = await _load_chunks(
+        db,
+        preset_id,
+        offset // ROWS_PER_CHUNK,
+        (offset + limit - 1) // ROWS_PER_CHUNK,
+    )
+
+    rows: list[list[str]] = []
+
+    for chunk_index in sorted(chunks.keys()):
+        chunk_start = chunk_index * ROWS_PER_CHUNK
+        chunk_rows = chunks[chunk_index]
+
+        rows.extend(
+            chunk_rows[
+                max(offset - chunk_start, 0) : offset + limit - chunk_start
+            ]
+        )
+
+    return rows
+
+
+async def iter_rows(
+    db: AsyncSession,
+    preset_id: UUID,
+) -> AsyncIterator[list[str]]:
+    """
+    Iterate over all rows, loading one chunk at a time.
+    """
+
+    chunk_index = 0
+
+    while True:
+        chunks = await _load_chunks(db, preset_id, chunk_index, chunk_index)
+
+        if chunk_index not in chunks:
+            return
+
+        for row in chunks[chunk_index]:
+            yield row
+
+        chunk_index += 1
@@ -1,30 +1,145 @@
-from sqlalchemy import create_engine
+import asyncio
+from functools import cache
+
+from sqlalchemy import Engine, create_engine
+from sqlalchemy.ext.asyncio import (
+    AsyncAttrs,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.orm import DeclarativeBase, sessionmaker
 
+from server import json_codec
 from server.settings import settings
 
+from .instrumentation import instrument_engine
+from .pool import create_engine_options
+
 _user = settings.postgres_user
 _pass = settings.postgres_password
 _host = settings.postgres_host
 _port = settings.postgres_port
 _database_name = settings.postgres_database_name
 
-engine = create_engine(
-    f"postgresql://{_user}:{_pass}@{_host}:{_port}/{_database_name}",
-    # echo=True,
-)
 
+def _create_database_url(driver: str) -> str:
+    return f"postgresql+{driver}://{_user}:{_pass}@{_host}:{_port}/{_database_name}"
 
-SessionLocal = sessionmaker(bind=engine)
+
+# Sync engine is only used by the scripts in `scripts/`. It's created on first
+# use, so the server doesn't import psycopg2 when it starts.
+@cache
+def get_engine() -> Engine:
+    return create_engine(
+        _create_database_url("psycopg2"),
+        # echo=True,
+        json_serializer=json_codec.dumps,
+        json_deserializer=json_codec.loads,
+        **create_engine_options("psycopg2"),
+    )
+
+
+SessionLocal = sessionmaker()
 
 
 def get_db():
-    db = SessionLocal()
+    db = SessionLocal(bind=get_engine())
     try:
         yield db
     finally:
         db.close()
 
 
-class Base(DeclarativeBase):
-    pass
+# Async engine is used by the GraphQL router and the FastAPI routes, so a
+# request waiting on Postgres doesn't pin a threadpool worker. There is no
+# sync mode for the app: resolvers are written against AsyncSession only, and
+# keeping a second, sync implementation of every resolver in step isn't worth
+# it. postgres_async_driver selects the DBAPI driver instead.
+async_engine = create_async_engine(
+    _create_database_url(settings.postgres_async_driver),
+    # echo=True,
+    json_serializer=json_codec.dumps,
+    json_deserializer=json_codec.loads,
+    **create_engine_options(settings.postgres_async_driver),
+)
+
+instrument_engine(async_engine.sync_engine)
+
+
+class SerializedAsyncSession(AsyncSession):
+    """
+    GraphQL resolves sibling fields concurrently, but an AsyncSession doesn't
+    allow concurrent operations. Queue the operations of a request instead
+    of failing them.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._lock = asyncio.Lock()
+
+    async def execute(self, *args, **kwargs):
+        async with self._lock:
+            return await super().execute(*args, **kwargs)
+
+    async def scalar(self, *args, **kwargs):
+        async with self._lock:
+            return await super().scalar(*args, **kwargs)
+
+    # `scalars()` calls `execute()`, so it is already serialized.
+
+    async def get(self, *args, **kwargs):
+        async with self._lock:
+            return await super().get(*args, **kwargs)
+
+    async def get_one(self, *args, **kwargs):
+        async with self._lock:
+            return await super().get_one(*args, **kwargs)
+
+    async def refresh(self, *args, **kwargs):
+        async with self._lock:
+            return await super().refresh(*args, **kwargs)
+
+    async def delete(self, *args, **kwargs):
+        async with self._lock:
+            return await super().delete(*args, **kwargs)
+
+    async def merge(self, *args, **kwargs):
+        async with self._lock:
+            return await super().merge(*args, **kwargs)
+
+    async def flush(self, *args, **kwargs):
+        async with self._lock:
+            return await super().flush(*args, **kwargs)
+
+    async def commit(self):
+        async with self._lock:
+            return await super().commit()
+
+    async def rollback(self):
+        async with self._lock:
+            return await super().rollback()
+
+    async def run_sync(self, *args, **kwargs):
+        async with self._lock:
+            return await super().run_sync(*args, **kwargs)
+
+
+# Objects are not expired on commit, because accessing expired attributes
+# would trigger implicit IO, which is not allowed with AsyncSession.
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=SerializedAsyncSession,
+    expire_on_commit=False,
+)
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+class Base(AsyncAttrs, DeclarativeBase):
+    # Fetch server generated values, e.g. `updated_at`, with RETURNING right
+    # after INSERT and UPDATE, instead of lazily loading them on access.
+    __mapper_args__ = {"eager_defaults": True}
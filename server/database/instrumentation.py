@@ -0,0 +1,164 @@
+"""
+Statement level instrumentation of the async engine: latency metrics, per
+GraphQL operation counts, and a log of slow statements.
+
+Slow statements are printed with their duration, the resolver that ran them
+and the shape of their parameters, never the values. When
+`slow_query_log_path` is set, they are also appended to that file as JSON
+lines, and a sample of the slow SELECTs is run again with
+`EXPLAIN (ANALYZE, BUFFERS)` to capture the plan.
+"""
+
+import random
+import time
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import Connection, Engine, event
+
+from server import json_codec
+from server.metrics import current_operation_stats, db_statement_seconds
+from server.settings import settings
+
+# "ParentType.field" of the async resolver being executed, set by the
+# OperationMetrics extension.
+current_resolver: ContextVar[str | None] = ContextVar(
+    "current_resolver", default=None
+)
+
+
+def _describe_value(value: Any) -> str:
+    if isinstance(value, (str, bytes, list, tuple, dict)):
+        return f"{type(value).__name__}[{len(value)}]"
+
+    return type(value).__name__
+
+
+def _get_parameters_shape(parameters: Any, executemany: bool) -> Any:
+    """
+    Types and lengths of the bound parameters, without their values, which
+    can contain user content.
+    """
+
+    if executemany:
+        return {
+            "rows": len(parameters),
+            "first": (
+                _get_parameters_shape(parameters[0], False)
+                if len(parameters) > 0
+                else None
+            ),
+        }
+
+    if isinstance(parameters, dict):
+        return {
+            key: _describe_value(value) for key, value in parameters.items()
+        }
+
+    if isinstance(parameters, (list, tuple)):
+        return [_describe_value(value) for value in parameters]
+
+    return None
+
+
+def _explain(conn: Connection, statement: str, parameters: Any) -> Any:
+    # Run on a separate DBAPI cursor, so the results of the original
+    # statement aren't consumed, and inside a savepoint, so a failure
+    # doesn't abort the transaction.
+    cursor = conn.connection.cursor()
+
+    try:
+        cursor.execute("SAVEPOINT slow_query_explain")
+
+        try:
+            cursor.execute(
+                "EXPLAIN (ANALYZE, BUFFERS) " + statement, parameters
+            )
+            plan = [row[0] for row in cursor.fetchall()]
+        except Exception as exception:
+            cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+            return f"EXPLAIN failed: {exception}"
+
+        cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+        return plan
+    finally:
+        cursor.close()
+
+
+def _log_slow_query(
+    conn: Connection,
+    statement: str,
+    parameters: Any,
+    executemany: bool,
+    seconds: float,
+) -> None:
+    duration_ms = round(seconds * 1000, 3)
+    resolver = current_resolver.get()
+
+    print(f"Slow query ({duration_ms}ms) in {resolver}: {statement[:200]}")
+
+    if settings.slow_query_log_path == None:
+        return
+
+    record = {
+        "at": datetime.utcnow().isoformat(),
+        "duration_ms": duration_ms,
+        "resolver": resolver,
+        "statement": statement,
+        "parameters": _get_parameters_shape(parameters, executemany),
+    }
+
+    # EXPLAIN ANALYZE executes the statement again, so only SELECTs are
+    # explained, and only a sample of them.
+    if (
+        not executemany
+        and conn.dialect.name == "postgresql"
+        and statement.lstrip()[:6].upper() == "SELECT"
+        and random.random() < settings.slow_query_explain_sample_rate
+    ):
+        record["plan"] = _explain(conn, statement, parameters)
+
+    try:
+        with open(settings.slow_query_log_path, "a", encoding="utf-8") as file:
+            file.write(json_codec.dumps(record) + "\n")
+    except OSError as exception:
+        print(f"Could not write the slow query log: {exception}")
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Time every statement executed by engine, count statements and rows for
+    the current GraphQL operation, and log slow statements.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(
+        conn, cursor, statement, parameters, context, executemany
+    ) -> None:
+        conn.info.setdefault("statement_started_at", []).append(
+            time.perf_counter()
+        )
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(
+        conn, cursor, statement, parameters, context, executemany
+    ) -> None:
+        seconds = time.perf_counter() - conn.info["statement_started_at"].pop()
+
+        db_statement_seconds.observe(seconds)
+
+        stats = current_operation_stats.get()
+
+        if stats != None:
+            stats.sql_statements += 1
+
+            # -1 when the driver doesn't know
+            if cursor.rowcount > 0:
+                stats.sql_rows += cursor.rowcount
+
+        if (
+            settings.slow_query_threshold_ms != None
+            and seconds * 1000 >= settings.slow_query_threshold_ms
+        ):
+            _log_slow_query(conn, statement, parameters, executemany, seconds)
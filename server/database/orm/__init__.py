@@ -1,6 +1,10 @@
 from .block_set import OrmBlockSet
 from .completer_block import OrmCompleterBlock
 from .csv_evaluation_preset import OrmCSVEvaluationPreset
+from .csv_evaluation_preset_row_chunk import OrmCSVEvaluationPresetRowChunk
+from .csv_evaluation_run import OrmCSVEvaluationRun
+from .csv_evaluation_run_result import OrmCSVEvaluationRunResult
+from .llm_completion_cache_entry import OrmLlmCompletionCacheEntry
 from .preset import OrmPreset
 from .prompt_block import OrmPromptBlock
 from .space import OrmSpace
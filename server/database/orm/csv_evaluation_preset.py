@@ -1,17 +1,21 @@
 from __future__ import annotations
 
-from typing import Any
+from typing import TYPE_CHECKING, Any
 from uuid import UUID
 
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, Index, text
 from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.orm import Mapped, WriteOnlyMapped, mapped_column, relationship
 
 from ..database import Base
 from ..mixins import MixinCreatedAt, MixinUpdatedAt, MixinUuidPrimaryKey
 from .space import OrmSpace
 from .user import OrmUser
 
+if TYPE_CHECKING:
+    from .csv_evaluation_preset_row_chunk import OrmCSVEvaluationPresetRowChunk
+    from .csv_evaluation_run import OrmCSVEvaluationRun
+
 
 class OrmCSVEvaluationPreset(
     Base,
@@ -20,10 +24,23 @@ class OrmCSVEvaluationPreset(
     MixinUpdatedAt,
 ):
     __tablename__ = "csv_evaluation_presets"
+    __table_args__ = (
+        # Listing a space's presets, most recently updated first
+        Index(
+            "ix_csv_evaluation_presets_space_id_updated_at_id",
+            "space_id",
+            text("updated_at DESC"),
+            text("id DESC"),
+        ),
+    )
 
     name: Mapped[str] = mapped_column(default="New preset")
-    csv_content: Mapped[str] = mapped_column(default="")
-    config_content: Mapped[dict[str, Any] | None] = mapped_column(type_=JSONB)
+    # Number of CSV rows, including the header row. Rows are stored in
+    # OrmCSVEvaluationPresetRowChunk.
+    row_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    config_content: Mapped[dict[str, Any] | None] = mapped_column(
+        type_=JSONB, deferred=True
+    )
 
     # --- Parent ---
 
@@ -38,9 +55,24 @@ class OrmCSVEvaluationPreset(
 
     space_id: Mapped[UUID] = mapped_column(
         ForeignKey("spaces.id", ondelete="CASCADE"),
-        index=True,
     )
     space: Mapped[OrmSpace] = relationship(
         foreign_keys=[space_id],
         back_populates="csv_evaluation_presets",
     )
+
+    # --- Children ---
+
+    row_chunks: WriteOnlyMapped[
+        OrmCSVEvaluationPresetRowChunk
+    ] = relationship(
+        back_populates="preset",
+        cascade="all, delete",
+        passive_deletes=True,
+    )
+
+    csv_evaluation_runs: WriteOnlyMapped[OrmCSVEvaluationRun] = relationship(
+        back_populates="preset",
+        cascade="all, delete",
+        passive_deletes=True,
+    )
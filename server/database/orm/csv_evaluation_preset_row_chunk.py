@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+from uuid import UUID
+
+from sqlalchemy import ForeignKey
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+
+from ..database import Base
+from .csv_evaluation_preset import OrmCSVEvaluationPreset
+
+
+class OrmCSVEvaluationPresetRowChunk(Base):
+    """
+    A fixed size chunk of CSV rows, row N of a preset is stored at index
+    N % ROWS_PER_CHUNK of chunk N // ROWS_PER_CHUNK, see csv_rows.py.
+    """
+
+    __tablename__ = "csv_evaluation_preset_row_chunks"
+
+    chunk_index: Mapped[int] = mapped_column(primary_key=True)
+    # List of rows, each a list of cell strings
+    rows: Mapped[list[list[str]]] = mapped_column(type_=JSONB)
+
+    # --- Parent ---
+
+    preset_id: Mapped[UUID] = mapped_column(
+        ForeignKey("csv_evaluation_presets.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    preset: Mapped[OrmCSVEvaluationPreset] = relationship(
+        foreign_keys=[preset_id],
+        back_populates="row_chunks",
+    )
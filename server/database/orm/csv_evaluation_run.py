@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+from enum import auto
+from typing import TYPE_CHECKING
+from uuid import UUID
+
+from sqlalchemy import ForeignKey
+from sqlalchemy.orm import Mapped, WriteOnlyMapped, mapped_column, relationship
+from strenum import LowercaseStrEnum
+
+from ..database import Base
+from ..mixins import MixinCreatedAt, MixinUpdatedAt, MixinUuidPrimaryKey
+from .csv_evaluation_preset import OrmCSVEvaluationPreset
+from .user import OrmUser
+
+if TYPE_CHECKING:
+    from .csv_evaluation_run_result import OrmCSVEvaluationRunResult
+
+
+class CSVEvaluationRunStatus(LowercaseStrEnum):
+    PENDING = auto()
+    RUNNING = auto()
+    SUCCEEDED = auto()
+    FAILED = auto()
+
+
+class OrmCSVEvaluationRun(
+    Base,
+    MixinUuidPrimaryKey,
+    MixinCreatedAt,
+    MixinUpdatedAt,
+):
+    __tablename__ = "csv_evaluation_runs"
+
+    status: Mapped[str] = mapped_column(default=CSVEvaluationRunStatus.PENDING)
+    concurrency: Mapped[int]
+    repeat_count: Mapped[int]
+    # Number of row and iteration combinations to run
+    total_count: Mapped[int] = mapped_column(default=0)
+    finished_count: Mapped[int] = mapped_column(default=0)
+    # Run level error, e.g. the preset or flow couldn't be loaded
+    error: Mapped[str | None]
+
+    # --- Parent ---
+
+    owner_id: Mapped[UUID] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"),
+        index=True,
+    )
+    owner: Mapped[OrmUser] = relationship(
+        foreign_keys=[owner_id],
+        back_populates="csv_evaluation_runs",
+    )
+
+    preset_id: Mapped[UUID] = mapped_column(
+        ForeignKey("csv_evaluation_presets.id", ondelete="CASCADE"),
+        index=True,
+    )
+    preset: Mapped[OrmCSVEvaluationPreset] = relationship(
+        foreign_keys=[preset_id],
+        back_populates="csv_evaluation_runs",
+    )
+
+    # --- Children ---
+
+    results: WriteOnlyMapped[OrmCSVEvaluationRunResult] = relationship(
+        back_populates="run",
+        cascade="all, delete",
+        passive_deletes=True,
+    )
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from typing import Any
+from uuid import UUID
+
+from sqlalchemy import ForeignKey, UniqueConstraint
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+
+from ..database import Base
+from ..mixins import MixinCreatedAt, MixinUuidPrimaryKey
+from .csv_evaluation_run import OrmCSVEvaluationRun
+
+
+class OrmCSVEvaluationRunResult(Base, MixinUuidPrimaryKey, MixinCreatedAt):
+    __tablename__ = "csv_evaluation_run_results"
+    __table_args__ = (
+        UniqueConstraint("run_id", "row_index", "iteration_index"),
+    )
+
+    # Index of the CSV row, not counting the header row
+    row_index: Mapped[int]
+    iteration_index: Mapped[int]
+    # Flow output values keyed by variable name, None if the row failed
+    outputs: Mapped[dict[str, Any] | None] = mapped_column(type_=JSONB)
+    error: Mapped[str | None]
+
+    # --- Parent ---
+
+    run_id: Mapped[UUID] = mapped_column(
+        ForeignKey("csv_evaluation_runs.id", ondelete="CASCADE"),
+    )
+    run: Mapped[OrmCSVEvaluationRun] = relationship(
+        foreign_keys=[run_id],
+        back_populates="results",
+    )
@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import DateTime
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from ..database import Base
+from ..mixins import MixinCreatedAt
+
+
+class OrmLlmCompletionCacheEntry(Base, MixinCreatedAt):
+    __tablename__ = "llm_completion_cache_entries"
+
+    # sha256 hex digest of the canonical request, see completion_cache.py
+    key: Mapped[str] = mapped_column(primary_key=True)
+    model: Mapped[str]
+    # The completion message, i.e. {"role": ..., "content": ...}
+    message: Mapped[dict[str, Any]] = mapped_column(type_=JSONB)
+    expires_at: Mapped[datetime] = mapped_column(DateTime(), index=True)
@@ -3,7 +3,7 @@ from __future__ import annotations
 from typing import TYPE_CHECKING, Any
 from uuid import UUID
 
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, Index, text
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, WriteOnlyMapped, mapped_column, relationship
 
@@ -22,18 +22,36 @@ class OrmSpace(
     MixinUpdatedAt,
 ):
     __tablename__ = "spaces"
+    __table_args__ = (
+        # Listing a user's spaces, most recently updated first, including
+        # keyset pagination on (updated_at, id).
+        Index(
+            "ix_spaces_owner_id_updated_at_id",
+            "owner_id",
+            text("updated_at DESC"),
+            text("id DESC"),
+        ),
+    )
 
     name: Mapped[str] = mapped_column(default="Untitled space")
     content_version: Mapped[str | None] = mapped_column(default="v3")
-    content: Mapped[dict[str, Any] | None] = mapped_column(type_=JSONB)
-    flow_content: Mapped[dict[str, Any] | None] = mapped_column(type_=JSONB)
-    content_v3: Mapped[dict[str, Any] | None] = mapped_column(type_=JSONB)
+    # Incremented on every content write, used for compare-and-swap updates.
+    revision: Mapped[int] = mapped_column(default=0, server_default="0")
+    # Content columns can be megabytes each, only load them when requested.
+    content: Mapped[dict[str, Any] | None] = mapped_column(
+        type_=JSONB, deferred=True
+    )
+    flow_content: Mapped[dict[str, Any] | None] = mapped_column(
+        type_=JSONB, deferred=True
+    )
+    content_v3: Mapped[dict[str, Any] | None] = mapped_column(
+        type_=JSONB, deferred=True
+    )
 
     # --- Parent ---
 
     owner_id: Mapped[UUID] = mapped_column(
         ForeignKey("users.id", ondelete="CASCADE"),
-        index=True,
     )
     owner: Mapped[OrmUser] = relationship(
         foreign_keys=[owner_id],
@@ -11,6 +11,7 @@ if TYPE_CHECKING:
     from .block_set import OrmBlockSet
     from .completer_block import OrmCompleterBlock
     from .csv_evaluation_preset import OrmCSVEvaluationPreset
+    from .csv_evaluation_run import OrmCSVEvaluationRun
     from .preset import OrmPreset
     from .prompt_block import OrmPromptBlock
     from .space import OrmSpace
@@ -68,3 +69,8 @@ class OrmUser(Base, MixinUuidPrimaryKey, MixinCreatedAt, MixinUpdatedAt):
         cascade="all, delete",
         passive_deletes=True,
     )
+    csv_evaluation_runs: WriteOnlyMapped[OrmCSVEvaluationRun] = relationship(
+        back_populates="owner",
+        cascade="all, delete",
+        passive_deletes=True,
+    )
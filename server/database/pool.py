@@ -0,0 +1,153 @@
+import time
+from typing import Any
+from uuid import uuid4
+
+from sqlalchemy import (
+    AsyncAdaptedQueuePool,
+    Engine,
+    NullPool,
+    QueuePool,
+    event,
+    text,
+)
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import Session
+
+from server.metrics import db_pool_wait_seconds
+from server.settings import settings
+
+# DBAPI drivers without asyncio support
+_SYNC_DRIVERS = {"psycopg2"}
+
+
+class _TimedCheckoutMixin:
+    """
+    Record how long checkouts wait for a connection. SQLAlchemy has no event
+    before a checkout, so the pool's internal `_do_get` is timed instead.
+    """
+
+    def _do_get(self):
+        tic = time.perf_counter()
+
+        try:
+            return super()._do_get()
+        finally:
+            db_pool_wait_seconds.observe(time.perf_counter() - tic)
+
+
+class TimedQueuePool(_TimedCheckoutMixin, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def create_engine_options(driver: str) -> dict[str, Any]:
+    """
+    Build the keyword arguments for `create_engine` and `create_async_engine`
+    from the `postgres_pool_*` settings.
+    """
+
+    options: dict[str, Any] = {"pool_pre_ping": settings.postgres_pool_pre_ping}
+
+    if settings.postgres_pool_mode == "null":
+        # Let PgBouncer (or RDS Proxy) own the pooling, e.g. in Lambda where
+        # connections should not outlive the invocation.
+        options["poolclass"] = NullPool
+    elif settings.postgres_pool_mode == "queue":
+        options["poolclass"] = (
+            TimedQueuePool
+            if driver in _SYNC_DRIVERS
+            else TimedAsyncAdaptedQueuePool
+        )
+        options["pool_size"] = settings.postgres_pool_size
+        options["max_overflow"] = settings.postgres_max_overflow
+        options["pool_timeout"] = settings.postgres_pool_timeout
+        options["pool_recycle"] = settings.postgres_pool_recycle
+    else:
+        raise Exception(
+            f'Unknown postgres_pool_mode "{settings.postgres_pool_mode}"'
+        )
+
+    connect_args: dict[str, Any] = {}
+
+    if settings.postgres_pgbouncer_transaction_mode:
+        if driver == "asyncpg":
+            # Prepared statements don't survive across transactions in
+            # PgBouncer transaction mode.
+            connect_args["statement_cache_size"] = 0
+            connect_args["prepared_statement_cache_size"] = 0
+            connect_args["prepared_statement_name_func"] = (
+                lambda: f"__asyncpg_{uuid4()}__"
+            )
+        elif driver == "psycopg":
+            connect_args["prepare_threshold"] = None
+    elif settings.postgres_statement_timeout_ms != None:
+        # PgBouncer rejects unknown startup parameters, so in transaction mode
+        # the timeout is applied per transaction instead,
+        # see `_set_local_statement_timeout`.
+        timeout = str(settings.postgres_statement_timeout_ms)
+
+        if driver == "asyncpg":
+            connect_args["server_settings"] = {"statement_timeout": timeout}
+        else:
+            connect_args["options"] = f"-c statement_timeout={timeout}"
+
+    if connect_args:
+        options["connect_args"] = connect_args
+
+    return options
+
+
+@event.listens_for(Session, "after_begin")
+def _set_local_statement_timeout(session, transaction, connection) -> None:
+    if (
+        not settings.postgres_pgbouncer_transaction_mode
+        or settings.postgres_statement_timeout_ms == None
+    ):
+        return
+
+    connection.exec_driver_sql(
+        "SET LOCAL statement_timeout = %d"
+        % settings.postgres_statement_timeout_ms
+    )
+
+
+def get_pool_status(engine: Engine | AsyncEngine) -> dict[str, Any]:
+    pool = engine.pool
+
+    if isinstance(pool, NullPool):
+        return {"mode": "null"}
+
+    size = pool.size()
+    checked_out = pool.checkedout()
+    capacity = size + settings.postgres_max_overflow
+
+    return {
+        "mode": "queue",
+        "size": size,
+        "checked_in": pool.checkedin(),
+        "checked_out": checked_out,
+        "overflow": pool.overflow(),
+        "capacity": capacity,
+        "saturation": checked_out / capacity if capacity > 0 else 1.0,
+    }
+
+
+async def check_pool_health(engine: AsyncEngine) -> dict[str, Any]:
+    """
+    Check out a connection, run a trivial query and return it to the pool,
+    reporting how long the checkout waited on the pool.
+    """
+
+    tic = time.perf_counter()
+
+    async with engine.connect() as conn:
+        checkout_latency = time.perf_counter() - tic
+        await conn.execute(text("SELECT 1"))
+
+    return {
+        "checkout_latency_ms": round(checkout_latency * 1000, 3),
+        "pool": get_pool_status(engine),
+    }
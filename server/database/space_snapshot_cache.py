@@ -0,0 +1,116 @@
+"""
+Read-only snapshots of spaces, e.g. for viewers of shared flows, encoded once
+and served from an in-process LRU cache. Clients and CDNs revalidate them with
+the ETag, which changes on every write to the space.
+
+Entries expire after `space_snapshot_cache_ttl_seconds`, which bounds how long
+another process can serve a stale snapshot. Writes made in this process
+invalidate the entry right away, see `invalidate_space_snapshot`.
+"""
+
+import hashlib
+from dataclasses import dataclass
+from datetime import datetime
+from uuid import UUID
+
+from sqlalchemy import Text, cast, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from server import json_codec
+from server.lru_cache import LRUCache
+from server.settings import settings
+
+from .orm.space import OrmSpace
+
+
+@dataclass
+class SpaceSnapshot:
+    etag: str
+    body: bytes
+
+
+space_snapshot_cache = LRUCache[str, SpaceSnapshot](
+    max_size=settings.space_snapshot_cache_max_size,
+    ttl_seconds=settings.space_snapshot_cache_ttl_seconds,
+)
+
+
+def _create_etag(space_id: UUID, revision: int, updated_at: datetime) -> str:
+    version = f"{space_id}:{revision}:{updated_at.isoformat()}"
+    return '"' + hashlib.sha256(version.encode()).hexdigest()[:32] + '"'
+
+
+async def get_space_snapshot(
+    db: AsyncSession,
+    space_id: UUID,
+) -> SpaceSnapshot | None:
+    snapshot = space_snapshot_cache.get(str(space_id))
+
+    if snapshot != None:
+        return snapshot
+
+    # Content is loaded as JSON text and embedded in the body as is, without
+    # decoding and encoding it again.
+    row = (
+        await db.execute(
+            select(
+                OrmSpace.id,
+                OrmSpace.name,
+                OrmSpace.content_version,
+                OrmSpace.revision,
+                OrmSpace.updated_at,
+                cast(OrmSpace.content, Text),
+                cast(OrmSpace.flow_content, Text),
+                cast(OrmSpace.content_v3, Text),
+            ).where(OrmSpace.id == space_id)
+        )
+    ).one_or_none()
+
+    if row == None:
+        return None
+
+    (
+        id,
+        name,
+        content_version,
+        revision,
+        updated_at,
+        content,
+        flow_content,
+        content_v3,
+    ) = row
+
+    fields = json_codec.dumps(
+        {
+            "id": str(id),
+            "name": name,
+            "contentVersion": content_version,
+            "revision": revision,
+            "updatedAt": updated_at.isoformat(),
+        }
+    )
+
+    # Drop the closing brace, so the content fields can be appended
+    parts = [fields[:-1]]
+
+    for key, json_text in [
+        ("content", content),
+        ("flowContent", flow_content),
+        ("contentV3", content_v3),
+    ]:
+        parts.append(f',"{key}":{json_text if json_text != None else "null"}')
+
+    parts.append("}")
+
+    snapshot = SpaceSnapshot(
+        etag=_create_etag(id, revision, updated_at),
+        body="".join(parts).encode("utf-8"),
+    )
+
+    space_snapshot_cache.set(str(space_id), snapshot)
+
+    return snapshot
+
+
+def invalidate_space_snapshot(space_id: UUID | str) -> None:
+    space_snapshot_cache.delete(str(space_id))
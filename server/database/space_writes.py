@@ -0,0 +1,113 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Any
+from uuid import UUID
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from server.settings import settings
+
+from .database import AsyncSessionLocal
+from .orm.space import OrmSpace
+
+
+async def write_space(
+    db: AsyncSession,
+    space_id: UUID | str,
+    owner_id: UUID,
+    values: dict[str, Any],
+    expected_revision: int | None = None,
+) -> OrmSpace | None:
+    """
+    Write values to a space and increment its revision in one statement.
+
+    Returns None if the space doesn't exist, isn't owned by owner_id, or when
+    expected_revision is provided and doesn't match the stored revision.
+    """
+
+    statement = update(OrmSpace).where(
+        OrmSpace.id == space_id,
+        OrmSpace.owner_id == owner_id,
+    )
+
+    if expected_revision != None:
+        statement = statement.where(OrmSpace.revision == expected_revision)
+
+    return await db.scalar(
+        statement.values(**values, revision=OrmSpace.revision + 1)
+        .returning(OrmSpace)
+        .execution_options(
+            synchronize_session=False,
+            populate_existing=True,
+        )
+    )
+
+
+@dataclass
+class _PendingWrite:
+    values: dict[str, Any]
+    future: asyncio.Future[OrmSpace | None]
+
+
+class SpaceWriteCoalescer:
+    """
+    Merge bursts of writes to the same space, e.g. autosaves from the editor,
+    into a single UPDATE. Values for the same column are overridden by the
+    later write. Every caller waits for the merged write and gets the same
+    result.
+    """
+
+    def __init__(self, window_seconds: float) -> None:
+        self.window_seconds = window_seconds
+        self._pending: dict[tuple[UUID | str, UUID], _PendingWrite] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    async def write(
+        self,
+        space_id: UUID | str,
+        owner_id: UUID,
+        values: dict[str, Any],
+    ) -> OrmSpace | None:
+        key = (space_id, owner_id)
+        pending = self._pending.get(key)
+
+        if pending == None:
+            pending = _PendingWrite(
+                values={},
+                future=asyncio.get_running_loop().create_future(),
+            )
+            self._pending[key] = pending
+
+            task = asyncio.create_task(self._flush(key, pending))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        pending.values.update(values)
+
+        # Shield the write, so one cancelled request doesn't cancel the write
+        # for the other requests merged into it.
+        return await asyncio.shield(pending.future)
+
+    async def _flush(
+        self,
+        key: tuple[UUID | str, UUID],
+        pending: _PendingWrite,
+    ) -> None:
+        await asyncio.sleep(self.window_seconds)
+
+        del self._pending[key]
+
+        try:
+            async with AsyncSessionLocal() as db:
+                db_space = await write_space(db, *key, pending.values)
+                await db.commit()
+        except Exception as exception:
+            pending.future.set_exception(exception)
+        else:
+            pending.future.set_result(db_space)
+
+
+space_write_coalescer = SpaceWriteCoalescer(
+    window_seconds=settings.space_write_coalescing_window_ms / 1000
+)
@@ -0,0 +1,92 @@
+"""
+Resolve users for authenticated requests through a short-lived in-process
+LRU cache, so every request doesn't need a round trip to the users table.
+
+Entries expire after `user_cache_ttl_seconds`, which bounds how long another
+process can serve a stale user. Changes made in this process invalidate the
+entries right away, see `invalidate_user`.
+"""
+
+from typing import Any
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+
+from server.lru_cache import LRUCache
+from server.settings import settings
+
+from .orm.user import OrmUser
+
+_CacheKey = tuple[str, str]
+
+
+user_cache = LRUCache[_CacheKey, dict[str, Any]](
+    max_size=settings.user_cache_max_size,
+    ttl_seconds=settings.user_cache_ttl_seconds,
+)
+
+
+def _id_key(user_id: Any) -> _CacheKey:
+    return ("id", str(user_id))
+
+
+def _placeholder_user_token_key(placeholder_user_token: str) -> _CacheKey:
+    return ("placeholder_user_token", placeholder_user_token)
+
+
+def _to_values(db_user: OrmUser) -> dict[str, Any]:
+    return {
+        attr.key: getattr(db_user, attr.key)
+        for attr in OrmUser.__mapper__.column_attrs
+    }
+
+
+async def _to_db_user(db: AsyncSession, values: dict[str, Any]) -> OrmUser:
+    # Attach a copy of the cached user to the session without querying the
+    # database, so it can be used like a loaded user, e.g. as a relationship.
+    db_user = OrmUser(**values)
+    make_transient_to_detached(db_user)
+    return await db.merge(db_user, load=False)
+
+
+async def _get_user(
+    db: AsyncSession,
+    key: _CacheKey,
+    where_clause: Any,
+) -> OrmUser | None:
+    values = user_cache.get(key)
+
+    if values != None:
+        return await _to_db_user(db, values)
+
+    db_user = await db.scalar(select(OrmUser).where(where_clause))
+
+    if db_user != None:
+        user_cache.set(key, _to_values(db_user))
+
+    return db_user
+
+
+async def get_user_by_id(db: AsyncSession, user_id: str) -> OrmUser | None:
+    return await _get_user(db, _id_key(user_id), OrmUser.id == user_id)
+
+
+async def get_user_by_placeholder_user_token(
+    db: AsyncSession,
+    placeholder_user_token: str,
+) -> OrmUser | None:
+    return await _get_user(
+        db,
+        _placeholder_user_token_key(placeholder_user_token),
+        OrmUser.placeholder_client_token == placeholder_user_token,
+    )
+
+
+def invalidate_user(db_user: OrmUser) -> None:
+    user_cache.delete(_id_key(db_user.id))
+
+    if db_user.placeholder_client_token != None:
+        user_cache.delete(
+            _placeholder_user_token_key(db_user.placeholder_client_token)
+        )
@@ -1,9 +1,22 @@
 from typing import Any
 
+from sqlalchemy import Text, cast, literal
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql.expression import ColumnElement
+
 from .orm.space import OrmSpace
 from .orm.user import OrmUser
 
 
+def jsonb_from_text(value: str) -> ColumnElement:
+    """
+    Send a JSON document to Postgres as text and let Postgres cast it to
+    JSONB, so it doesn't need to be decoded and encoded again in Python.
+    """
+
+    return cast(literal(value, Text), JSONB)
+
+
 def create_space_with_example_content(db_user: OrmUser) -> OrmSpace:
     db_space_v2 = OrmSpace(
         name="Example space",
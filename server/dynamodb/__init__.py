@@ -1,9 +1,23 @@
-import boto3
+from functools import cache
+from typing import Any
 
-client = boto3.client("dynamodb", endpoint_url="http://localhost:9000")
+from server.settings import settings
 
-table = client.list_tables()
 
+@cache
+def get_client() -> Any:
+    """
+    boto3 is slow to import, so the client is only created when it's first
+    used, instead of when the server starts.
+    """
+
+    import boto3
+
+    return boto3.client("dynamodb", endpoint_url=settings.dynamodb_endpoint_url)
+
+
+# client.list_tables() returns e.g.
+#
 # {
 #     "TableNames": [],
 #     "ResponseMetadata": {
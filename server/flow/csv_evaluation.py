@@ -0,0 +1,256 @@
+"""
+Run a CSV evaluation preset on the server: run the space's flow once for every
+CSV row (except the header row) and iteration, and store the outputs of each
+run.
+
+Runs are executed in a background task with their own database session, so
+they continue after the request that started them, e.g. when the user closes
+the tab. Progress is published to `csv_evaluation_run_topic(run_id)`.
+
+The task lives in the server process, so this needs the long-lived uvicorn
+server, see Dockerfile. Behind a per-request handler like Mangum on AWS
+Lambda, the process is frozen once the response is sent, and runs don't
+progress.
+"""
+
+import asyncio
+from dataclasses import dataclass
+from typing import Any
+from uuid import UUID
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer
+
+from server.database.csv_rows import iter_rows
+from server.database.database import AsyncSessionLocal
+from server.database.orm.csv_evaluation_preset import OrmCSVEvaluationPreset
+from server.database.orm.csv_evaluation_run import (
+    CSVEvaluationRunStatus,
+    OrmCSVEvaluationRun,
+)
+from server.database.orm.csv_evaluation_run_result import (
+    OrmCSVEvaluationRunResult,
+)
+from server.database.orm.space import OrmSpace
+from server.llm.get_completion import ApiConfig
+from server.pubsub import broker
+
+from .run_flow import run_flow
+
+# Results are inserted in batches to limit round trips for large CSVs.
+_RESULT_BATCH_SIZE = 50
+
+
+@dataclass
+class CSVEvaluationRunEvent:
+    status: CSVEvaluationRunStatus
+    total_count: int
+    finished_count: int
+    # Set when a row finished
+    row_index: int | None = None
+    iteration_index: int | None = None
+    error: str | None = None
+
+
+def csv_evaluation_run_topic(run_id: UUID) -> str:
+    return f"csv_evaluation_run:{run_id}"
+
+
+# Keep references to running tasks, otherwise they can be garbage collected
+# before they finish.
+_running_tasks: set[asyncio.Task] = set()
+
+
+def start_csv_evaluation_run(
+    run_id: UUID,
+    api_config: ApiConfig,
+    use_cache: bool = True,
+) -> None:
+    """
+    Run in the background of the server process, see the module docstring
+    for why this needs the long-lived server.
+    """
+
+    task = asyncio.create_task(
+        run_csv_evaluation(run_id, api_config, use_cache)
+    )
+    _running_tasks.add(task)
+    task.add_done_callback(_running_tasks.discard)
+
+
+async def run_csv_evaluation(
+    run_id: UUID,
+    api_config: ApiConfig,
+    use_cache: bool = True,
+) -> None:
+    async with AsyncSessionLocal() as db:
+        db_run = await db.get_one(OrmCSVEvaluationRun, run_id)
+
+        try:
+            await _run(db, db_run, api_config, use_cache)
+        except Exception as exception:
+            print(exception)
+            await db.rollback()
+            db_run.status = CSVEvaluationRunStatus.FAILED
+            db_run.error = str(exception)
+        else:
+            db_run.status = CSVEvaluationRunStatus.SUCCEEDED
+
+        await db.commit()
+        # Rollback expired the run, and counts were updated with UPDATE
+        await db.refresh(db_run)
+
+        broker.publish(
+            csv_evaluation_run_topic(run_id),
+            CSVEvaluationRunEvent(
+                status=db_run.status,
+                total_count=db_run.total_count,
+                finished_count=db_run.finished_count,
+                error=db_run.error,
+            ),
+        )
+
+
+async def _run(
+    db: AsyncSession,
+    db_run: OrmCSVEvaluationRun,
+    api_config: ApiConfig,
+    use_cache: bool,
+) -> None:
+    db_preset = await db.scalar(
+        select(OrmCSVEvaluationPreset)
+        .options(undefer(OrmCSVEvaluationPreset.config_content))
+        .where(OrmCSVEvaluationPreset.id == db_run.preset_id)
+    )
+
+    if db_preset == None:
+        raise Exception("CSV evaluation preset doesn't exist")
+
+    content = await db.scalar(
+        select(OrmSpace.content_v3).where(OrmSpace.id == db_preset.space_id)
+    )
+
+    if content == None:
+        raise Exception("Space doesn't have a v3 flow")
+
+    # Same config format as the browser, i.e. CsvEvaluationConfigContent
+    config_content = db_preset.config_content or {}
+    variables = content["variablesDict"]
+
+    input_column_indexes = {
+        variables[variable_id]["name"]: column_index
+        for variable_id, column_index in config_content.get(
+            "variableIdToCsvColumnIndexMap", {}
+        ).items()
+        if column_index != None and variable_id in variables
+    }
+
+    db_run.total_count = db_run.repeat_count * max(db_preset.row_count - 1, 0)
+    db_run.status = CSVEvaluationRunStatus.RUNNING
+    await db.commit()
+
+    # Bounded, so rows are only loaded, one chunk at a time, shortly before
+    # a worker is free to run them.
+    jobs = asyncio.Queue[tuple[int, int, list[str]] | None](
+        maxsize=db_run.concurrency * 2
+    )
+
+    async def produce_jobs() -> None:
+        for iteration_index in range(db_run.repeat_count):
+            row_index = -1
+
+            async for row in iter_rows(db, db_preset.id):
+                # Skip the header row
+                if row_index >= 0:
+                    await jobs.put((row_index, iteration_index, row))
+
+                row_index += 1
+
+        for _ in range(db_run.concurrency):
+            await jobs.put(None)
+
+    pending_results: list[dict[str, Any]] = []
+    finished_count = 0
+
+    async def flush_results() -> None:
+        if len(pending_results) == 0:
+            return
+
+        results = pending_results.copy()
+        pending_results.clear()
+
+        await db.execute(insert(OrmCSVEvaluationRunResult), results)
+        await db.execute(
+            update(OrmCSVEvaluationRun)
+            .where(OrmCSVEvaluationRun.id == db_run.id)
+            .values(
+                finished_count=OrmCSVEvaluationRun.finished_count + len(results)
+            )
+        )
+        await db.commit()
+
+    async def work() -> None:
+        nonlocal finished_count
+
+        while (job := await jobs.get()) != None:
+            row_index, iteration_index, row = job
+
+            inputs = {
+                name: row[column_index] if column_index < len(row) else None
+                for name, column_index in input_column_indexes.items()
+            }
+
+            try:
+                outputs = await run_flow(
+                    content,
+                    api_config,
+                    inputs,
+                    use_cache=use_cache,
+                    repeat_index=iteration_index,
+                )
+                error = None
+            except Exception as exception:
+                outputs = None
+                error = str(exception)
+
+            pending_results.append(
+                {
+                    "run_id": db_run.id,
+                    "row_index": row_index,
+                    "iteration_index": iteration_index,
+                    "outputs": outputs,
+                    "error": error,
+                }
+            )
+
+            finished_count += 1
+
+            broker.publish(
+                csv_evaluation_run_topic(db_run.id),
+                CSVEvaluationRunEvent(
+                    status=CSVEvaluationRunStatus.RUNNING,
+                    total_count=db_run.total_count,
+                    finished_count=finished_count,
+                    row_index=row_index,
+                    iteration_index=iteration_index,
+                    error=error,
+                ),
+            )
+
+            if len(pending_results) >= _RESULT_BATCH_SIZE:
+                await flush_results()
+
+    # When the producer or a worker fails, the others are cancelled before
+    # the run is rolled back and marked as failed, so they neither wait on
+    # the queue forever nor keep using the session.
+    try:
+        async with asyncio.TaskGroup() as task_group:
+            task_group.create_task(produce_jobs())
+
+            for _ in range(db_run.concurrency):
+                task_group.create_task(work())
+    except ExceptionGroup as exception_group:
+        raise exception_group.exceptions[0]
+
+    await flush_results()
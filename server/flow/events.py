@@ -0,0 +1,26 @@
+from dataclasses import dataclass, field
+from enum import auto
+from typing import Any, Awaitable, Callable
+
+from strenum import LowercaseStrEnum
+
+
+class FlowRunEventType(LowercaseStrEnum):
+    NODE_STARTED = auto()
+    # A piece of LLM output, streamed while the node is running
+    NODE_TOKEN = auto()
+    NODE_FINISHED = auto()
+    FLOW_FINISHED = auto()
+
+
+@dataclass
+class FlowRunEvent:
+    type: FlowRunEventType
+    node_id: str | None = None
+    token: str | None = None
+    # NODE_FINISHED: node output values, FLOW_FINISHED: flow output values,
+    # both keyed by variable name.
+    values: dict[str, Any] = field(default_factory=dict)
+
+
+EmitFlowRunEvent = Callable[[FlowRunEvent], Awaitable[None]]
@@ -0,0 +1,183 @@
+"""
+Python implementations of the node types in packages/flow-models, for running
+content_v3 flows on the server.
+
+Each runner receives the node config and its input variable values (ordered
+by variable index) and returns the output variable values, in the same order
+as the node's output variables.
+"""
+
+import re
+from typing import Any, Awaitable, Callable
+
+from server import json_codec
+from server.llm.get_completion import (
+    ApiConfig,
+    LlmMessage,
+    get_completion,
+    stream_completion,
+)
+
+from .events import EmitFlowRunEvent, FlowRunEvent, FlowRunEventType
+
+_TEMPLATE_TAG_RE = re.compile(r"{{{\s*(.+?)\s*}}}|{{\s*(&?)\s*(.+?)\s*}}")
+
+# Same replacements as mustache.js's default escape function
+_ESCAPE_TABLE = str.maketrans(
+    {
+        "&": "&amp;",
+        "<": "&lt;",
+        ">": "&gt;",
+        '"': "&quot;",
+        "'": "&#39;",
+        "/": "&#x2F;",
+        "`": "&#x60;",
+        "=": "&#x3D;",
+    }
+)
+
+
+def render_template(template: str, values: dict[str, Any]) -> str:
+    """
+    Render the variable tags of a mustache template, i.e. `{{name}}`,
+    `{{{name}}}` and `{{& name}}`, the same way mustache.js does.
+    """
+
+    def replace(match: re.Match) -> str:
+        triple_name, ampersand, name = match.groups()
+        value = values.get(triple_name or name)
+
+        if value == None:
+            return ""
+
+        if not isinstance(value, str):
+            value = json_codec.dumps(value)
+
+        if triple_name != None or ampersand == "&":
+            return value
+
+        return value.translate(_ESCAPE_TABLE)
+
+    return _TEMPLATE_TAG_RE.sub(replace, template)
+
+
+class NodeRunContext:
+    def __init__(
+        self,
+        api_config: ApiConfig,
+        flow_inputs: dict[str, Any],
+        use_cache: bool = True,
+        repeat_index: int = 0,
+        emit: EmitFlowRunEvent | None = None,
+    ) -> None:
+        self.api_config = api_config
+        self.use_cache = use_cache
+        # Which run of the same inputs this is, see create_cache_key()
+        self.repeat_index = repeat_index
+        # Set when someone is listening to run events, e.g. a subscription
+        self.emit = emit
+        # Keyed by the FlowInput variable name
+        self.flow_inputs = flow_inputs
+
+
+NodeRunner = Callable[
+    [NodeRunContext, str, dict, list[dict], list[dict], list[Any]],
+    Awaitable[list[Any]],
+]
+
+
+async def _run_input_node(
+    context: NodeRunContext,
+    node_id: str,
+    node_config: dict,
+    input_variables: list[dict],
+    output_variables: list[dict],
+    input_values: list[Any],
+) -> list[Any]:
+    return [context.flow_inputs.get(v["name"]) for v in output_variables]
+
+
+async def _run_output_node(
+    context: NodeRunContext,
+    node_id: str,
+    node_config: dict,
+    input_variables: list[dict],
+    output_variables: list[dict],
+    input_values: list[Any],
+) -> list[Any]:
+    # Output node has no outputs, flow outputs are read from its inputs.
+    return []
+
+
+async def _run_chatgpt_message_node(
+    context: NodeRunContext,
+    node_id: str,
+    node_config: dict,
+    input_variables: list[dict],
+    output_variables: list[dict],
+    input_values: list[Any],
+) -> list[Any]:
+    # NOTE: The first input variable is the messages array
+    values = {
+        v["name"]: value
+        for v, value in zip(input_variables[1:], input_values[1:])
+    }
+
+    messages = list(input_values[0] or [])
+
+    message = {
+        "role": node_config["role"],
+        "content": render_template(node_config["content"], values),
+    }
+
+    return [message, messages + [message]]
+
+
+async def _run_chatgpt_chat_completion_node(
+    context: NodeRunContext,
+    node_id: str,
+    node_config: dict,
+    input_variables: list[dict],
+    output_variables: list[dict],
+    input_values: list[Any],
+) -> list[Any]:
+    messages = list(input_values[0] or [])
+
+    options = dict(
+        api_config=context.api_config,
+        model=node_config["model"],
+        temperature=node_config["temperature"],
+        messages=[LlmMessage(**m) for m in messages],
+        stop=node_config.get("stop") or [],
+        seed=node_config.get("seed"),
+        response_format_type=node_config.get("responseFormatType"),
+        use_cache=context.use_cache,
+        repeat_index=context.repeat_index,
+    )
+
+    if context.emit != None:
+        tokens: list[str] = []
+
+        async for token in stream_completion(**options):
+            tokens.append(token)
+            await context.emit(
+                FlowRunEvent(
+                    type=FlowRunEventType.NODE_TOKEN,
+                    node_id=node_id,
+                    token=token,
+                )
+            )
+
+        message = {"role": "assistant", "content": "".join(tokens)}
+    else:
+        message = (await get_completion(**options)).dict()
+
+    return [message["content"], message, messages + [message]]
+
+
+NODE_RUNNERS: dict[str, NodeRunner] = {
+    "InputNode": _run_input_node,
+    "OutputNode": _run_output_node,
+    "ChatGPTMessageNode": _run_chatgpt_message_node,
+    "ChatGPTChatCompletionNode": _run_chatgpt_chat_completion_node,
+}
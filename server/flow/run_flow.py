@@ -0,0 +1,175 @@
+"""
+Run a content_v3 flow graph.
+
+Nodes are scheduled in topological order. A node starts as soon as all nodes
+feeding into it have finished, so independent branches run concurrently.
+"""
+
+import asyncio
+from collections import defaultdict
+from typing import Any
+
+from server.llm.get_completion import ApiConfig
+
+from .events import EmitFlowRunEvent, FlowRunEvent, FlowRunEventType
+from .nodes import NODE_RUNNERS, NodeRunContext
+
+# Variables read by a node, all others are written by it.
+_INPUT_VARIABLE_TYPES = {"NodeInput", "FlowOutput"}
+
+
+async def run_flow(
+    content: dict[str, Any],
+    api_config: ApiConfig,
+    inputs: dict[str, Any] | None = None,
+    use_cache: bool = True,
+    repeat_index: int = 0,
+    emit: EmitFlowRunEvent | None = None,
+) -> dict[str, Any]:
+    """
+    Run the flow and return the values of its FlowOutput variables, keyed by
+    variable name.
+
+    `inputs` are keyed by FlowInput variable name, inputs that are not
+    provided fall back to the values saved in the flow.
+
+    Runs with a different `repeat_index` don't share cached completions, so
+    repeating a run with the same inputs gets new LLM output.
+
+    When `emit` is provided, it's awaited with progress events, and LLM
+    output is streamed to it token by token. A slow `emit` slows down the
+    run instead of buffering events.
+    """
+    nodes = {node["id"]: node for node in content["nodes"]}
+    node_configs = content["nodeConfigsDict"]
+    variables = content["variablesDict"]
+    edges = content["edges"]
+
+    lookup_dicts = content.get("variableValueLookUpDicts") or [{}]
+    variable_values: dict[str, Any] = dict(lookup_dicts[0])
+
+    input_variables: dict[str, list[dict]] = defaultdict(list)
+    output_variables: dict[str, list[dict]] = defaultdict(list)
+
+    for variable in sorted(variables.values(), key=lambda v: v["index"]):
+        if variable["type"] in _INPUT_VARIABLE_TYPES:
+            input_variables[variable["nodeId"]].append(variable)
+        else:
+            output_variables[variable["nodeId"]].append(variable)
+
+    for node in nodes.values():
+        if node["type"] not in NODE_RUNNERS:
+            raise Exception(f"Unsupported node type: {node['type']}")
+
+    flow_inputs = {
+        v["name"]: variable_values.get(v["id"])
+        for v in variables.values()
+        if v["type"] == "FlowInput"
+    }
+
+    if inputs != None:
+        flow_inputs.update(inputs)
+
+    context = NodeRunContext(
+        api_config=api_config,
+        flow_inputs=flow_inputs,
+        use_cache=use_cache,
+        repeat_index=repeat_index,
+        emit=emit,
+    )
+
+    # Edges only connect an output variable to an input variable, so a
+    # downstream node can only start after the source node has finished.
+    downstream_edges: dict[str, list[dict]] = defaultdict(list)
+    pending_upstream_counts = {node_id: 0 for node_id in nodes}
+
+    for edge in edges:
+        downstream_edges[edge["source"]].append(edge)
+        pending_upstream_counts[edge["target"]] += 1
+
+    async def run_node(node_id: str) -> str:
+        node_input_variables = input_variables[node_id]
+        node_output_variables = output_variables[node_id]
+
+        if emit != None:
+            await emit(
+                FlowRunEvent(
+                    type=FlowRunEventType.NODE_STARTED, node_id=node_id
+                )
+            )
+
+        output_values = await NODE_RUNNERS[nodes[node_id]["type"]](
+            context,
+            node_id,
+            node_configs[node_id],
+            node_input_variables,
+            node_output_variables,
+            [variable_values.get(v["id"]) for v in node_input_variables],
+        )
+
+        for variable, value in zip(node_output_variables, output_values):
+            variable_values[variable["id"]] = value
+
+        if emit != None:
+            await emit(
+                FlowRunEvent(
+                    type=FlowRunEventType.NODE_FINISHED,
+                    node_id=node_id,
+                    values={
+                        variable["name"]: value
+                        for variable, value in zip(
+                            node_output_variables, output_values
+                        )
+                    },
+                )
+            )
+
+        return node_id
+
+    running: set[asyncio.Task] = {
+        asyncio.create_task(run_node(node_id))
+        for node_id, count in pending_upstream_counts.items()
+        if count == 0
+    }
+    finished_count = 0
+
+    try:
+        while len(running) > 0:
+            done, running = await asyncio.wait(
+                running, return_when=asyncio.FIRST_COMPLETED
+            )
+
+            for task in done:
+                node_id = task.result()
+                finished_count += 1
+
+                for edge in downstream_edges[node_id]:
+                    variable_values[edge["targetHandle"]] = variable_values.get(
+                        edge["sourceHandle"]
+                    )
+
+                    pending_upstream_counts[edge["target"]] -= 1
+
+                    if pending_upstream_counts[edge["target"]] == 0:
+                        running.add(
+                            asyncio.create_task(run_node(edge["target"]))
+                        )
+    finally:
+        for task in running:
+            task.cancel()
+
+    if finished_count < len(nodes):
+        raise Exception("Flow contains a cycle")
+
+    outputs = {
+        v["name"]: variable_values.get(v["id"])
+        for v in variables.values()
+        if v["type"] == "FlowOutput"
+    }
+
+    if emit != None:
+        await emit(
+            FlowRunEvent(type=FlowRunEventType.FLOW_FINISHED, values=outputs)
+        )
+
+    return outputs
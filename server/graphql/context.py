@@ -1,27 +1,49 @@
 from __future__ import annotations
 
-from functools import cached_property
+import asyncio
 from typing import TypeAlias, cast
 
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from strawberry.fastapi import BaseContext
 from strawberry.types import Info as _Info
 from strawberry.types.info import RootValueType
 
 from server.database.orm.user import OrmUser
+from server.database.user_cache import (
+    get_user_by_id,
+    get_user_by_placeholder_user_token,
+)
+
+from .loaders import Loaders
+
+_NOT_LOADED = object()
 
 
 class Context(BaseContext):
-    db: Session
+    db: AsyncSession
+    loaders: Loaders
     is_logged_in: bool = False
 
-    def __init__(self, db: Session) -> None:
+    def __init__(self, db: AsyncSession) -> None:
         super().__init__()
         self.db = db
+        self.loaders = Loaders(db)
+        self._db_user: OrmUser | None | object = _NOT_LOADED
+        self._db_user_lock = asyncio.Lock()
+
+    async def get_db_user(self) -> OrmUser | None:
+        """
+        Resolve the user once per request, see `_resolve_db_user`.
+        """
+
+        # Resolvers running concurrently should share the same lookup.
+        async with self._db_user_lock:
+            if self._db_user is _NOT_LOADED:
+                self._db_user = await self._resolve_db_user()
+
+        return cast(OrmUser | None, self._db_user)
 
-    @cached_property
-    def db_user(self) -> OrmUser | None:
+    async def _resolve_db_user(self) -> OrmUser | None:
         """
         Run the following logic step by step:
 
@@ -33,7 +55,7 @@ class Context(BaseContext):
         session_user: dict | None = self.request.session.get("user", None)
 
         if session_user != None:
-            db_user = self._get_db_user_by_session(session_user)
+            db_user = await self._get_db_user_by_session(session_user)
 
             if db_user != None:
                 self.is_logged_in = True
@@ -48,8 +70,17 @@ class Context(BaseContext):
             "PlaceholderUserToken", None
         )
 
+        # Browsers can't set headers on WebSocket connections, clients send
+        # the token in the connection_init payload instead.
+        if placeholder_user_token == None and isinstance(
+            self.connection_params, dict
+        ):
+            placeholder_user_token = self.connection_params.get(
+                "PlaceholderUserToken", None
+            )
+
         if placeholder_user_token != None:
-            db_user = self._get_db_user_by_placeholder_user_token(
+            db_user = await self._get_db_user_by_placeholder_user_token(
                 placeholder_user_token=placeholder_user_token,
             )
 
@@ -61,16 +92,17 @@ class Context(BaseContext):
         print("Neither session user nor PlaceholderUserToken header is present")
         return None
 
-    def _get_db_user_by_session(self, session_user: dict) -> OrmUser | None:
+    async def _get_db_user_by_session(
+        self,
+        session_user: dict,
+    ) -> OrmUser | None:
         db_user_id = cast(str | None, session_user.get("db_user_id", None))
 
         if db_user_id == None:
             print("db_user_id is None")
             return None
 
-        db_user = self.db.scalar(
-            select(OrmUser).where(OrmUser.id == db_user_id)
-        )
+        db_user = await get_user_by_id(self.db, db_user_id)
 
         if db_user == None:
             print("db_user is None")
@@ -79,14 +111,12 @@ class Context(BaseContext):
         print("db_user found")
         return db_user
 
-    def _get_db_user_by_placeholder_user_token(
+    async def _get_db_user_by_placeholder_user_token(
         self,
         placeholder_user_token: str,
     ) -> OrmUser | None:
-        db_user = self.db.scalar(
-            select(OrmUser).where(
-                OrmUser.placeholder_client_token == placeholder_user_token
-            )
+        db_user = await get_user_by_placeholder_user_token(
+            self.db, placeholder_user_token
         )
 
         if db_user == None:
@@ -1,33 +1,53 @@
-import time
-
 import strawberry
 from fastapi import Depends
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from strawberry.extensions import (
+    AddValidationRules,
+    ParserCache,
+    QueryDepthLimiter,
+    ValidationCache,
+)
 from strawberry.fastapi import GraphQLRouter
 
-from server.database.database import get_db
+from server.database.database import get_async_db
+from server.settings import settings
 
 from .context import Context
 from .mutations.mutation import Mutation
+from .operation_metrics import OperationMetrics
+from .persisted_queries import PersistedQueries
+from .query_cost import QueryCostRule
 from .query import Query
-
-schema = strawberry.Schema(query=Query, mutation=Mutation)
-
-
-def measure():
-    tic = time.perf_counter()
-    try:
-        yield
-    finally:
-        toc = time.perf_counter()
-        print(f"Finished in {toc - tic:0.4f} seconds")
+from .subscription import Subscription
+
+schema = strawberry.Schema(
+    query=Query,
+    mutation=Mutation,
+    subscription=Subscription,
+    extensions=[
+        OperationMetrics,
+        PersistedQueries,
+        # Factories, so every request gets its own extension instances
+        lambda: ParserCache(maxsize=settings.graphql_document_cache_max_size),
+        lambda: ValidationCache(
+            maxsize=settings.graphql_document_cache_max_size
+        ),
+        lambda: QueryDepthLimiter(max_depth=settings.graphql_max_query_depth),
+        lambda: AddValidationRules([QueryCostRule]),
+    ],
+)
 
 
 async def get_context(
-    db: Session = Depends(get_db),
-    ignored=Depends(measure),
+    db: AsyncSession = Depends(get_async_db),
 ) -> Context:
     return Context(db=db)
 
 
-graphql_router = GraphQLRouter(schema, context_getter=get_context)
+graphql_router = GraphQLRouter(
+    schema,
+    context_getter=get_context,
+    max_subscriptions_per_connection=(
+        settings.graphql_max_subscriptions_per_connection
+    ),
+)
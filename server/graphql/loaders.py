@@ -0,0 +1,122 @@
+from collections import defaultdict
+from functools import partial
+from uuid import UUID
+
+from sqlalchemy import Text, cast, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from strawberry.dataloader import DataLoader
+
+from server.database.database import Base
+from server.database.orm.csv_evaluation_preset import OrmCSVEvaluationPreset
+from server.database.orm.space import OrmSpace
+
+
+class Loaders:
+    """
+    DataLoaders created per request, so fields nested under a list are
+    fetched with one `IN (...)` query per level instead of one query per
+    parent object.
+    """
+
+    def __init__(self, db: AsyncSession) -> None:
+        self.db = db
+
+        self.spaces_by_owner_id = DataLoader[UUID, list[OrmSpace]](
+            load_fn=self._load_spaces_by_owner_ids
+        )
+        self.space_json_texts = DataLoader[tuple[UUID, str], str | None](
+            load_fn=partial(self._load_json_texts, OrmSpace)
+        )
+        self.csv_evaluation_presets_by_space_id = DataLoader[
+            UUID, list[OrmCSVEvaluationPreset]
+        ](load_fn=self._load_csv_evaluation_presets_by_space_ids)
+        self.csv_evaluation_preset_by_id = DataLoader[
+            UUID, OrmCSVEvaluationPreset | None
+        ](load_fn=self._load_csv_evaluation_presets_by_ids)
+        self.csv_evaluation_preset_json_texts = DataLoader[
+            tuple[UUID, str], str | None
+        ](load_fn=partial(self._load_json_texts, OrmCSVEvaluationPreset))
+
+    async def _load_spaces_by_owner_ids(
+        self,
+        owner_ids: list[UUID],
+    ) -> list[list[OrmSpace]]:
+        db_spaces = await self.db.scalars(
+            select(OrmSpace)
+            .where(OrmSpace.owner_id.in_(owner_ids))
+            .order_by(OrmSpace.updated_at.desc(), OrmSpace.id.desc())
+        )
+
+        spaces_by_owner_id: dict[UUID, list[OrmSpace]] = defaultdict(list)
+
+        for db_space in db_spaces:
+            spaces_by_owner_id[db_space.owner_id].append(db_space)
+
+        return [spaces_by_owner_id[owner_id] for owner_id in owner_ids]
+
+    async def _load_json_texts(
+        self,
+        orm_class: type[Base],
+        keys: list[tuple[UUID, str]],
+    ) -> list[str | None]:
+        """
+        Load deferred JSONB columns, keyed by (id, column name), as JSON text
+        (`::text`), so they can be returned to the client without decoding
+        and encoding them again in Python.
+        """
+
+        ids = {id for id, _ in keys}
+        column_names = sorted({column_name for _, column_name in keys})
+
+        rows = await self.db.execute(
+            select(
+                orm_class.id,
+                *[
+                    cast(getattr(orm_class, name), Text).label(name)
+                    for name in column_names
+                ],
+            ).where(orm_class.id.in_(ids))
+        )
+
+        rows_by_id = {row.id: row for row in rows}
+
+        return [
+            getattr(rows_by_id[id], column_name) if id in rows_by_id else None
+            for id, column_name in keys
+        ]
+
+    async def _load_csv_evaluation_presets_by_space_ids(
+        self,
+        space_ids: list[UUID],
+    ) -> list[list[OrmCSVEvaluationPreset]]:
+        db_presets = await self.db.scalars(
+            select(OrmCSVEvaluationPreset)
+            .where(OrmCSVEvaluationPreset.space_id.in_(space_ids))
+            .order_by(
+                OrmCSVEvaluationPreset.updated_at.desc(),
+                OrmCSVEvaluationPreset.id.desc(),
+            )
+        )
+
+        presets_by_space_id: dict[
+            UUID, list[OrmCSVEvaluationPreset]
+        ] = defaultdict(list)
+
+        for db_preset in db_presets:
+            presets_by_space_id[db_preset.space_id].append(db_preset)
+
+        return [presets_by_space_id[space_id] for space_id in space_ids]
+
+    async def _load_csv_evaluation_presets_by_ids(
+        self,
+        ids: list[UUID],
+    ) -> list[OrmCSVEvaluationPreset | None]:
+        db_presets = await self.db.scalars(
+            select(OrmCSVEvaluationPreset).where(
+                OrmCSVEvaluationPreset.id.in_(ids)
+            )
+        )
+
+        presets_by_id = {db_preset.id: db_preset for db_preset in db_presets}
+
+        return [presets_by_id.get(id) for id in ids]
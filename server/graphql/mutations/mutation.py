@@ -4,12 +4,14 @@ import strawberry
 from sqlalchemy import select
 
 from server.database.orm.user import OrmUser
+from server.database.user_cache import invalidate_user
 from server.database.utils import create_space_with_example_content
 
 from ..context import Info
 from ..types import CreatePlaceholderUserAndExampleSpaceResult, Space, User
 from ..utils import ensure_db_user
 from .mutation_csv_evaluation_presets import MutationCSVEvaluationPreset
+from .mutation_flow import MutationFlow
 from .mutation_space import MutationSpace
 from .mutation_user import MutationUser
 
@@ -19,17 +21,18 @@ class Mutation(
     MutationUser,
     MutationSpace,
     MutationCSVEvaluationPreset,
+    MutationFlow,
 ):
     @strawberry.mutation
-    def create_placeholder_user_and_example_space(
+    async def create_placeholder_user_and_example_space(
         self: None,
         info: Info,
     ) -> CreatePlaceholderUserAndExampleSpaceResult:
         db = info.context.db
-        db_user = info.context.db_user
+        db_user = await info.context.get_db_user()
 
         if db_user == None:
-            placeholder_client_token = uuid4()
+            placeholder_client_token = str(uuid4())
             db_user = OrmUser(
                 is_user_placeholder=True,
                 placeholder_client_token=placeholder_client_token,
@@ -40,7 +43,7 @@ class Mutation(
         db_space = create_space_with_example_content(db_user=db_user)
 
         db.add_all([db_user, db_space])
-        db.commit()
+        await db.commit()
 
         return CreatePlaceholderUserAndExampleSpaceResult(
             placeholder_client_token=placeholder_client_token,
@@ -49,7 +52,7 @@ class Mutation(
 
     @strawberry.mutation
     @ensure_db_user
-    def merge_placeholder_user_with_logged_in_user(
+    async def merge_placeholder_user_with_logged_in_user(
         self: None,
         info: Info,
         db_user: OrmUser,
@@ -57,7 +60,7 @@ class Mutation(
     ) -> User | None:
         db = info.context.db
 
-        db_placeholder_user = db.scalar(
+        db_placeholder_user = await db.scalar(
             select(OrmUser).where(
                 OrmUser.placeholder_client_token == placeholder_user_token
             )
@@ -68,14 +71,19 @@ class Mutation(
 
         # Merge placeholder user into the new user
 
-        db_spaces = db.scalars(db_placeholder_user.spaces.select())
+        db_spaces = await db.scalars(db_placeholder_user.spaces.select())
 
         for db_space in db_spaces:
-            db_space.owner = db_user
+            # Assign the foreign key directly, so the previous owner doesn't
+            # need to be loaded, which is not allowed with AsyncSession.
+            db_space.owner_id = db_user.id
 
         # Delete the placeholder user
-        db.delete(db_placeholder_user)
+        await db.delete(db_placeholder_user)
 
-        db.commit()
+        await db.commit()
+
+        invalidate_user(db_placeholder_user)
+        invalidate_user(db_user)
 
         return User.from_db(db_user)
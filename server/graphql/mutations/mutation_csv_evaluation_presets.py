@@ -1,13 +1,22 @@
-import json
-
 import strawberry
 
+from server import json_codec
+from server.database.csv_rows import (
+    parse_csv,
+    replace_all_rows,
+    replace_rows,
+)
 from server.database.orm.csv_evaluation_preset import OrmCSVEvaluationPreset
+from server.database.orm.csv_evaluation_run import OrmCSVEvaluationRun
 from server.database.orm.space import OrmSpace
 from server.database.orm.user import OrmUser
+from server.database.utils import jsonb_from_text
+from server.flow.csv_evaluation import start_csv_evaluation_run
+from server.llm.get_completion import ApiConfig
+from server.settings import settings
 
 from ..context import Info
-from ..types import CSVEvaluationPreset, Space
+from ..types import CSVEvaluationPreset, CSVEvaluationRun, Space
 from ..utils import ensure_db_user
 
 
@@ -21,7 +30,7 @@ class CreateCsvEvaluationPresetResult:
 class MutationCSVEvaluationPreset:
     @strawberry.mutation
     @ensure_db_user
-    def create_csv_evaluation_preset(
+    async def create_csv_evaluation_preset(
         self: None,
         info: Info,
         db_user: OrmUser,
@@ -32,7 +41,7 @@ class MutationCSVEvaluationPreset:
     ) -> CreateCsvEvaluationPresetResult | None:
         db = info.context.db
 
-        db_space = db.scalar(
+        db_space = await db.scalar(
             db_user.spaces.select().where(OrmSpace.id == space_id)
         )
 
@@ -43,14 +52,29 @@ class MutationCSVEvaluationPreset:
             owner=db_user,
             space=db_space,
             name=name,
-            csv_content=csv_content,
-            config_content=json.loads(config_content)
-            if config_content != None
-            else None,
         )
 
+        if config_content != None and config_content != strawberry.UNSET:
+            db_csv_evaluation_preset.config_content = jsonb_from_text(
+                json_codec.validate(config_content)
+            )
+        else:
+            config_content = None
+
         db.add(db_csv_evaluation_preset)
-        db.commit()
+
+        if csv_content != None and csv_content != strawberry.UNSET:
+            # Insert the preset first, row chunks reference it
+            await db.flush()
+            await replace_all_rows(
+                db, db_csv_evaluation_preset, parse_csv(csv_content)
+            )
+
+        await db.commit()
+
+        info.context.loaders.csv_evaluation_preset_json_texts.prime(
+            (db_csv_evaluation_preset.id, "config_content"), config_content
+        )
 
         return CreateCsvEvaluationPresetResult(
             space=Space.from_db(db_space),
@@ -61,7 +85,7 @@ class MutationCSVEvaluationPreset:
 
     @strawberry.mutation
     @ensure_db_user
-    def update_csv_evaluation_preset(
+    async def update_csv_evaluation_preset(
         self: None,
         info: Info,
         db_user: OrmUser,
@@ -72,10 +96,10 @@ class MutationCSVEvaluationPreset:
     ) -> CSVEvaluationPreset | None:
         db = info.context.db
 
-        db_csv_evaluation_preset = db.scalar(
-            db_user.csv_evaluation_presets.select().where(
-                OrmCSVEvaluationPreset.id == preset_id
-            )
+        db_csv_evaluation_preset = await db.scalar(
+            db_user.csv_evaluation_presets.select()
+            .where(OrmCSVEvaluationPreset.id == preset_id)
+            .with_for_update()
         )
 
         if db_csv_evaluation_preset == None:
@@ -87,22 +111,85 @@ class MutationCSVEvaluationPreset:
             db_csv_evaluation_preset.name = name
 
         if csv_content == None:
-            db_csv_evaluation_preset.csv_content = None
+            await replace_all_rows(db, db_csv_evaluation_preset, [])
         elif csv_content != strawberry.UNSET:
-            db_csv_evaluation_preset.csv_content = csv_content
+            await replace_all_rows(
+                db, db_csv_evaluation_preset, parse_csv(csv_content)
+            )
 
         if config_content == None:
             db_csv_evaluation_preset.config_content = None
         elif config_content != strawberry.UNSET:
-            db_csv_evaluation_preset.config_content = json.loads(config_content)
+            db_csv_evaluation_preset.config_content = jsonb_from_text(
+                json_codec.validate(config_content)
+            )
+            info.context.loaders.csv_evaluation_preset_json_texts.prime(
+                (db_csv_evaluation_preset.id, "config_content"), config_content
+            )
 
-        db.commit()
+        await db.commit()
 
         return CSVEvaluationPreset.from_db(db_csv_evaluation_preset)
 
     @strawberry.mutation
     @ensure_db_user
-    def delete_csv_evaluation_preset(
+    async def append_csv_evaluation_preset_rows(
+        self: None,
+        info: Info,
+        db_user: OrmUser,
+        preset_id: strawberry.ID,
+        rows: list[list[str]],
+    ) -> CSVEvaluationPreset | None:
+        db = info.context.db
+
+        db_csv_evaluation_preset = await db.scalar(
+            db_user.csv_evaluation_presets.select()
+            .where(OrmCSVEvaluationPreset.id == preset_id)
+            .with_for_update()
+        )
+
+        if db_csv_evaluation_preset == None:
+            return None
+
+        await replace_rows(
+            db,
+            db_csv_evaluation_preset,
+            db_csv_evaluation_preset.row_count,
+            rows,
+        )
+        await db.commit()
+
+        return CSVEvaluationPreset.from_db(db_csv_evaluation_preset)
+
+    @strawberry.mutation
+    @ensure_db_user
+    async def replace_csv_evaluation_preset_rows(
+        self: None,
+        info: Info,
+        db_user: OrmUser,
+        preset_id: strawberry.ID,
+        start: int,
+        rows: list[list[str]],
+    ) -> CSVEvaluationPreset | None:
+        db = info.context.db
+
+        db_csv_evaluation_preset = await db.scalar(
+            db_user.csv_evaluation_presets.select()
+            .where(OrmCSVEvaluationPreset.id == preset_id)
+            .with_for_update()
+        )
+
+        if db_csv_evaluation_preset == None:
+            return None
+
+        await replace_rows(db, db_csv_evaluation_preset, start, rows)
+        await db.commit()
+
+        return CSVEvaluationPreset.from_db(db_csv_evaluation_preset)
+
+    @strawberry.mutation
+    @ensure_db_user
+    async def delete_csv_evaluation_preset(
         self: None,
         info: Info,
         db_user: OrmUser,
@@ -110,7 +197,7 @@ class MutationCSVEvaluationPreset:
     ) -> Space | None:
         db = info.context.db
 
-        db_csv_evaluation_preset = db.scalar(
+        db_csv_evaluation_preset = await db.scalar(
             db_user.csv_evaluation_presets.select().where(
                 OrmCSVEvaluationPreset.id == id
             )
@@ -119,10 +206,73 @@ class MutationCSVEvaluationPreset:
         if db_csv_evaluation_preset == None:
             return None
 
-        db_space = db_csv_evaluation_preset.space
+        db_space = await db.get_one(
+            OrmSpace, db_csv_evaluation_preset.space_id
+        )
 
-        db.delete(db_csv_evaluation_preset)
-        db.commit()
+        await db.delete(db_csv_evaluation_preset)
+        await db.commit()
 
-        db.refresh(db_space)
         return Space.from_db(db_space)
+
+    @strawberry.mutation
+    @ensure_db_user
+    async def run_csv_evaluation(
+        self: None,
+        info: Info,
+        db_user: OrmUser,
+        preset_id: strawberry.ID,
+        openai_api_key: str,
+        openai_organization_id: str = "",
+        concurrency: int = 2,
+        repeat_count: int = 1,
+        # Call the LLM even if an identical completion is cached
+        bypass_cache: bool = False,
+    ) -> CSVEvaluationRun | None:
+        """
+        Start running the preset in the background. Poll the returned run for
+        progress and results.
+        """
+        db = info.context.db
+
+        if (
+            concurrency < 1
+            or concurrency > settings.csv_evaluation_max_concurrency
+        ):
+            raise Exception(
+                "concurrency must be between 1 and "
+                f"{settings.csv_evaluation_max_concurrency}"
+            )
+
+        if repeat_count < 1:
+            raise Exception("repeat_count must be at least 1")
+
+        db_csv_evaluation_preset = await db.scalar(
+            db_user.csv_evaluation_presets.select().where(
+                OrmCSVEvaluationPreset.id == preset_id
+            )
+        )
+
+        if db_csv_evaluation_preset == None:
+            return None
+
+        db_run = OrmCSVEvaluationRun(
+            owner=db_user,
+            preset=db_csv_evaluation_preset,
+            concurrency=concurrency,
+            repeat_count=repeat_count,
+        )
+
+        db.add(db_run)
+        await db.commit()
+
+        start_csv_evaluation_run(
+            db_run.id,
+            ApiConfig(
+                openai_organization_id=openai_organization_id,
+                openai_key=openai_api_key,
+            ),
+            use_cache=not bypass_cache,
+        )
+
+        return CSVEvaluationRun.from_db(db_run)
@@ -0,0 +1,89 @@
+from typing import Any
+
+import strawberry
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer
+
+from server import json_codec
+from server.database.orm.space import OrmSpace
+from server.database.orm.user import OrmUser
+from server.flow.run_flow import run_flow
+from server.llm.get_completion import ApiConfig
+
+from ..context import Info
+from ..types import RunFlowResult
+from ..utils import ensure_db_user
+
+
+def parse_flow_inputs(inputs: str | None) -> dict[str, Any] | None:
+    if inputs == None:
+        return None
+
+    try:
+        flow_inputs = json_codec.loads(inputs)
+    except ValueError as exception:
+        raise Exception(f"Invalid JSON: {exception}") from exception
+
+    if not isinstance(flow_inputs, dict):
+        raise Exception("inputs must be a JSON object")
+
+    return flow_inputs
+
+
+async def load_flow_content(
+    db: AsyncSession,
+    db_user: OrmUser,
+    space_id: strawberry.ID,
+) -> dict[str, Any] | None:
+    db_space = await db.scalar(
+        db_user.spaces.select()
+        .options(undefer(OrmSpace.content_v3))
+        .where(OrmSpace.id == space_id)
+    )
+
+    if db_space == None:
+        return None
+
+    if db_space.content_v3 == None:
+        raise Exception("Space doesn't have a v3 flow")
+
+    # Return the connection to the pool, running the flow can take a while
+    await db.commit()
+
+    return db_space.content_v3
+
+
+@strawberry.type
+class MutationFlow:
+    @strawberry.mutation
+    @ensure_db_user
+    async def run_flow(
+        self: None,
+        info: Info,
+        db_user: OrmUser,
+        space_id: strawberry.ID,
+        openai_api_key: str,
+        openai_organization_id: str = "",
+        # JSON object of flow input values, keyed by variable name
+        inputs: str | None = None,
+        # Call the LLM even if an identical completion is cached
+        bypass_cache: bool = False,
+    ) -> RunFlowResult | None:
+        flow_inputs = parse_flow_inputs(inputs)
+
+        content = await load_flow_content(info.context.db, db_user, space_id)
+
+        if content == None:
+            return None
+
+        outputs = await run_flow(
+            content,
+            ApiConfig(
+                openai_organization_id=openai_organization_id,
+                openai_key=openai_api_key,
+            ),
+            flow_inputs,
+            use_cache=not bypass_cache,
+        )
+
+        return RunFlowResult(outputs=json_codec.dumps(outputs))
@@ -1,20 +1,121 @@
-import json
+from enum import auto
+from typing import Any
+from uuid import UUID
 
 import strawberry
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.expression import ColumnElement
+from strenum import LowercaseStrEnum
 
+from server import json_codec
+from server.database import content_patch
 from server.database.orm.space import OrmSpace
 from server.database.orm.user import OrmUser
+from server.database.space_snapshot_cache import invalidate_space_snapshot
+from server.database.space_writes import space_write_coalescer, write_space
+from server.database.utils import jsonb_from_text
 
 from ..context import Info
 from ..types import ContentVersion, Space
 from ..utils import ensure_db_user
 
 
+@strawberry.enum
+class SpaceContentPatchOperation(LowercaseStrEnum):
+    SET = auto()
+    REMOVE = auto()
+    ADD_NODE = auto()
+    MOVE_NODE = auto()
+    SET_NODE_CONFIG = auto()
+    SET_VARIABLE_VALUE = auto()
+
+
+@strawberry.input
+class SpaceContentPatch:
+    op: SpaceContentPatchOperation
+    path: list[str] | None = strawberry.field(
+        default=None,
+        description='Used by SET and REMOVE, e.g. ["nodeConfigsDict", "id", "model"]',
+    )
+    node_id: str | None = strawberry.field(
+        default=None,
+        description="Used by MOVE_NODE and SET_NODE_CONFIG",
+    )
+    variable_id: str | None = strawberry.field(
+        default=None,
+        description="Used by SET_VARIABLE_VALUE",
+    )
+    value: str | None = strawberry.field(
+        default=None,
+        description="JSON encoded value, used by all operations except REMOVE",
+    )
+
+
+def _apply_patch(doc: ColumnElement, patch: SpaceContentPatch) -> ColumnElement:
+    if patch.op != SpaceContentPatchOperation.REMOVE:
+        if patch.value == None:
+            raise Exception(f"value is required for {patch.op.name}")
+
+        value = json_codec.validate(patch.value)
+
+    match patch.op:
+        case SpaceContentPatchOperation.SET | SpaceContentPatchOperation.REMOVE:
+            if not patch.path:
+                raise Exception(f"path is required for {patch.op.name}")
+
+            if patch.op == SpaceContentPatchOperation.SET:
+                return content_patch.set_value(doc, patch.path, value)
+            else:
+                return content_patch.remove_value(doc, patch.path)
+        case SpaceContentPatchOperation.ADD_NODE:
+            return content_patch.add_node(doc, value)
+        case SpaceContentPatchOperation.MOVE_NODE:
+            if patch.node_id == None:
+                raise Exception("node_id is required for MOVE_NODE")
+
+            return content_patch.move_node(doc, patch.node_id, value)
+        case SpaceContentPatchOperation.SET_NODE_CONFIG:
+            if patch.node_id == None:
+                raise Exception("node_id is required for SET_NODE_CONFIG")
+
+            return content_patch.set_node_config(doc, patch.node_id, value)
+        case SpaceContentPatchOperation.SET_VARIABLE_VALUE:
+            if patch.variable_id == None:
+                raise Exception(
+                    "variable_id is required for SET_VARIABLE_VALUE"
+                )
+
+            return content_patch.set_variable_value(
+                doc, patch.variable_id, value
+            )
+        case _:
+            raise Exception(f"Unknown patch operation {patch.op}")
+
+
+async def _raise_if_revision_conflict(
+    db: AsyncSession,
+    db_user: OrmUser,
+    id: UUID | strawberry.ID,
+) -> None:
+    """
+    A conditional write didn't match any row. If the space exists, it was
+    updated by someone else since the expected revision.
+    """
+
+    db_space = await db.scalar(db_user.spaces.select().where(OrmSpace.id == id))
+
+    if db_space != None:
+        raise Exception(
+            f"Space is at revision {db_space.revision}, "
+            "reload it before updating"
+        )
+
+
 @strawberry.type
 class MutationSpace:
     @strawberry.mutation
     @ensure_db_user
-    def create_space(
+    async def create_space(
         self: None,
         info: Info,
         db_user: OrmUser,
@@ -28,13 +129,15 @@ class MutationSpace:
         )
 
         db.add(db_space)
-        db.commit()
+        await db.commit()
 
         return Space.from_db(db_space)
 
-    @strawberry.mutation
+    @strawberry.mutation(
+        description="When expected_revision is provided, the update fails if the space was updated since that revision. Otherwise, updates arriving in a short window are merged into one write."
+    )
     @ensure_db_user
-    def update_space(
+    async def update_space(
         self: None,
         info: Info,
         db_user: OrmUser,
@@ -44,48 +147,122 @@ class MutationSpace:
         content: str | None = strawberry.UNSET,
         flow_content: str | None = strawberry.UNSET,
         content_v3: str | None = strawberry.UNSET,
+        expected_revision: int | None = strawberry.UNSET,
     ) -> Space | None:
         db = info.context.db
 
-        db_space = db.scalar(db_user.spaces.select().where(OrmSpace.id == id))
-
-        if db_space == None:
-            return None
+        values: dict[str, Any] = {}
 
         if name == None:
             raise Exception("name cannot be null")
         elif name != strawberry.UNSET:
-            db_space.name = name
+            values["name"] = name
 
         if content_version == None:
             raise Exception("content_version cannot be null")
         elif content_version == ContentVersion.v1:
             raise Exception("content_version cannot be v1")
         elif content_version != strawberry.UNSET:
-            db_space.content_version = content_version
+            values["content_version"] = content_version
+
+        # Content is validated and forwarded to Postgres as text, and primed
+        # into the loader, so it's returned as is without being encoded again.
+
+        json_texts: dict[str, str | None] = {}
+
+        for column_name, json_text in [
+            ("content", content),
+            ("flow_content", flow_content),
+            ("content_v3", content_v3),
+        ]:
+            if json_text == None:
+                values[column_name] = None
+                json_texts[column_name] = None
+            elif json_text != strawberry.UNSET:
+                values[column_name] = jsonb_from_text(
+                    json_codec.validate(json_text)
+                )
+                json_texts[column_name] = json_text
+
+        if not values:
+            db_space = await db.scalar(
+                db_user.spaces.select().where(OrmSpace.id == id)
+            )
+        elif (
+            expected_revision != None and expected_revision != strawberry.UNSET
+        ):
+            db_space = await write_space(
+                db, id, db_user.id, values, expected_revision=expected_revision
+            )
 
-        if content == None:
-            db_space.content = None
-        elif content != strawberry.UNSET:
-            db_space.content = json.loads(content)
+            if db_space == None:
+                await _raise_if_revision_conflict(db, db_user, id)
 
-        if flow_content == None:
-            db_space.flow_content = None
-        elif flow_content != strawberry.UNSET:
-            db_space.flow_content = json.loads(flow_content)
+            await db.commit()
+        elif space_write_coalescer.window_seconds > 0:
+            db_space = await space_write_coalescer.write(id, db_user.id, values)
 
-        if content_v3 == None:
-            db_space.content_v3 = None
-        elif content_v3 != strawberry.UNSET:
-            db_space.content_v3 = json.loads(content_v3)
+            # Other updates may have been merged into the write, so what was
+            # stored isn't necessarily this update's content, the loader
+            # selects it instead.
+            json_texts = {}
+        else:
+            db_space = await write_space(db, id, db_user.id, values)
+            await db.commit()
 
-        db.commit()
+        if db_space == None:
+            return None
+
+        invalidate_space_snapshot(db_space.id)
+
+        for column_name, json_text in json_texts.items():
+            info.context.loaders.space_json_texts.prime(
+                (db_space.id, column_name), json_text
+            )
+
+        return Space.from_db(db_space)
+
+    @strawberry.mutation(
+        description="Apply patches to content_v3 in the database, instead of replacing the whole document. Fails if the space was updated since expected_revision."
+    )
+    @ensure_db_user
+    async def patch_space_content(
+        self: None,
+        info: Info,
+        db_user: OrmUser,
+        id: strawberry.ID,
+        expected_revision: int,
+        patches: list[SpaceContentPatch],
+    ) -> Space | None:
+        db = info.context.db
+        space_id = UUID(id)
+
+        doc = OrmSpace.content_v3
+
+        for patch in patches:
+            doc = _apply_patch(doc, patch)
+
+        db_space = await write_space(
+            db,
+            space_id,
+            db_user.id,
+            {"content_v3": doc},
+            expected_revision=expected_revision,
+        )
+
+        if db_space == None:
+            await _raise_if_revision_conflict(db, db_user, space_id)
+            return None
+
+        await db.commit()
+
+        invalidate_space_snapshot(db_space.id)
 
         return Space.from_db(db_space)
 
     @strawberry.mutation
     @ensure_db_user
-    def delete_space(
+    async def delete_space(
         self: None,
         info: Info,
         db_user: OrmUser,
@@ -93,12 +270,16 @@ class MutationSpace:
     ) -> bool | None:
         db = info.context.db
 
-        db_space = db.scalar(db_user.spaces.select().where(OrmSpace.id == id))
+        db_space = await db.scalar(
+            db_user.spaces.select().where(OrmSpace.id == id)
+        )
 
         if db_space == None:
             return False
 
-        db.delete(db_space)
-        db.commit()
+        await db.delete(db_space)
+        await db.commit()
+
+        invalidate_space_snapshot(db_space.id)
 
         return True
@@ -1,7 +1,6 @@
 from uuid import UUID
 
 import strawberry
-from auth0 import Auth0Error
 from sqlalchemy import select
 
 from server.database.orm.user import OrmUser
@@ -0,0 +1,111 @@
+import time
+from inspect import isawaitable
+from typing import Any, Awaitable, Callable, Iterator
+
+from graphql import GraphQLResolveInfo
+from strawberry.extensions import SchemaExtension
+
+from server.database.instrumentation import current_resolver
+from server.metrics import (
+    OperationStats,
+    current_operation_stats,
+    graphql_operation_seconds,
+    graphql_operation_sql_rows,
+    graphql_operation_sql_statements,
+    graphql_resolver_seconds,
+)
+
+# Operation names come from clients, only the first ones seen get their own
+# label, so a misbehaving client can't create unbounded time series.
+_MAX_OPERATION_NAMES = 200
+
+_operation_names: set[str] = set()
+
+
+def _get_operation_name_label(operation_name: str | None) -> str:
+    if operation_name == None:
+        return "anonymous"
+
+    if operation_name in _operation_names:
+        return operation_name
+
+    if len(_operation_names) >= _MAX_OPERATION_NAMES:
+        return "other"
+
+    _operation_names.add(operation_name)
+    return operation_name
+
+
+class OperationMetrics(SchemaExtension):
+    """
+    Records operation and resolver latency, and the SQL statements and rows
+    of each operation, see server/metrics.py.
+    """
+
+    def on_operation(self) -> Iterator[None]:
+        stats = OperationStats()
+        current_operation_stats.set(stats)
+
+        tic = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - tic
+            current_operation_stats.set(None)
+
+            try:
+                operation_type = self.execution_context.operation_type.value
+            except RuntimeError:
+                # The document didn't parse or has no matching operation
+                operation_type = "unknown"
+
+            labels = (
+                operation_type,
+                _get_operation_name_label(
+                    self.execution_context.operation_name
+                ),
+            )
+
+            graphql_operation_seconds.labels(*labels).observe(seconds)
+            graphql_operation_sql_statements.labels(*labels).observe(
+                stats.sql_statements
+            )
+            graphql_operation_sql_rows.labels(*labels).observe(stats.sql_rows)
+
+    def resolve(
+        self,
+        _next: Callable,
+        root: Any,
+        info: GraphQLResolveInfo,
+        *args,
+        **kwargs,
+    ) -> Any:
+        result = _next(root, info, *args, **kwargs)
+
+        # Only async resolvers are timed. Sync resolvers are attribute reads,
+        # and wrapping them would make every field awaitable.
+        if isawaitable(result):
+            return self._time_resolver(result, info, time.perf_counter())
+
+        return result
+
+    async def _time_resolver(
+        self,
+        result: Awaitable,
+        info: GraphQLResolveInfo,
+        tic: float,
+    ) -> Any:
+        # Attribute the statements run by the resolver to it in the slow
+        # query log.
+        token = current_resolver.set(
+            f"{info.parent_type.name}.{info.field_name}"
+        )
+
+        try:
+            return await result
+        finally:
+            current_resolver.reset(token)
+            graphql_resolver_seconds.labels(
+                info.parent_type.name, info.field_name
+            ).observe(time.perf_counter() - tic)
@@ -0,0 +1,124 @@
+import hashlib
+import json
+from typing import Iterator
+
+from graphql import DocumentNode, GraphQLError
+from strawberry.extensions import SchemaExtension
+
+from server.lru_cache import LRUCache
+from server.settings import settings
+
+# Query text and parsed document by the query's SHA-256 hash
+document_cache = LRUCache[str, tuple[str, DocumentNode | None]](
+    max_size=settings.graphql_persisted_query_cache_max_size,
+    ttl_seconds=settings.graphql_persisted_query_cache_ttl_seconds,
+)
+
+
+def hash_query(query: str) -> str:
+    return hashlib.sha256(query.encode("utf-8")).hexdigest()
+
+
+def load_allow_list(path: str) -> dict[str, str]:
+    """
+    Reads a JSON file containing a list of query documents, and returns them
+    keyed by their hash.
+    """
+    with open(path, encoding="utf-8") as file:
+        queries = json.load(file)
+
+    return {hash_query(query): query for query in queries}
+
+
+# When set, only these queries can be executed and clients can't register new
+# ones.
+allow_list = (
+    load_allow_list(settings.graphql_persisted_query_allow_list_path)
+    if settings.graphql_persisted_query_allow_list_path != None
+    else None
+)
+
+
+class PersistedQueries(SchemaExtension):
+    """
+    Automatic persisted queries, following the Apollo protocol.
+
+    Clients send `extensions.persistedQuery.sha256Hash` without the query.
+    When the hash is unknown, they receive a PersistedQueryNotFound error
+    and send the request again with the query, which registers it. Queries
+    that were seen before also skip parsing.
+    """
+
+    def on_operation(self) -> Iterator[None]:
+        execution_context = self.execution_context
+
+        persisted_query = (execution_context.operation_extensions or {}).get(
+            "persistedQuery"
+        )
+
+        query_hash = None
+        is_persisted = isinstance(persisted_query, dict)
+
+        if is_persisted:
+            if persisted_query.get("version") != 1:
+                raise GraphQLError(
+                    "Unsupported persisted query version",
+                    extensions={"code": "PERSISTED_QUERY_NOT_SUPPORTED"},
+                )
+
+            query_hash = persisted_query.get("sha256Hash")
+
+            if not isinstance(query_hash, str):
+                raise GraphQLError("persistedQuery.sha256Hash must be a string")
+
+        query = execution_context.query
+
+        if query_hash == None:
+            # Ad hoc queries still have to be in the allow list
+            if allow_list != None and query != None:
+                query_hash = hash_query(query)
+        elif query == None:
+            cached = document_cache.get(query_hash)
+
+            if cached == None and allow_list != None:
+                query = allow_list.get(query_hash)
+                cached = (query, None) if query != None else None
+
+            if cached == None:
+                raise GraphQLError(
+                    "PersistedQueryNotFound",
+                    extensions={"code": "PERSISTED_QUERY_NOT_FOUND"},
+                )
+
+            query, document = cached
+            execution_context.query = query
+            execution_context.graphql_document = document
+        elif hash_query(query) != query_hash:
+            raise GraphQLError(
+                "provided sha does not match query",
+                extensions={"code": "PERSISTED_QUERY_HASH_MISMATCH"},
+            )
+
+        if (
+            allow_list != None
+            and query_hash != None
+            and query_hash not in allow_list
+        ):
+            raise GraphQLError(
+                "Query is not in the allow list",
+                extensions={"code": "PERSISTED_QUERY_NOT_ALLOWED"},
+            )
+
+        yield
+
+        # Only remember documents that parsed and validated
+        if (
+            is_persisted
+            and execution_context.graphql_document != None
+            and not execution_context.pre_execution_errors
+            and document_cache.get(query_hash) == None
+        ):
+            document_cache.set(
+                query_hash,
+                (execution_context.query, execution_context.graphql_document),
+            )
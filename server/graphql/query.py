@@ -7,6 +7,7 @@ from sqlalchemy import select
 
 from server.database.orm.space import OrmSpace
 from server.database.orm.user import OrmUser
+from server.database.user_cache import get_user_by_placeholder_user_token
 
 from .types import Info, QuerySpaceResult, Space, User
 from .utils import ensure_db_user
@@ -21,17 +22,20 @@ class Query:
     @strawberry.field(
         description="Check if there is a user and the user is not a placeholder user"
     )
-    def is_logged_in(self: None, info: Info) -> bool:
+    async def is_logged_in(self: None, info: Info) -> bool:
         # Need to pull the user from the context to trigger the logic for
         # computing the is_logged_in
         # TODO: Improve this
-        db_user = info.context.db_user
+        db_user = await info.context.get_db_user()
         return info.context.is_logged_in
 
     @strawberry.field(
         description="When PlaceholderUserToken header is present and the token is not mapped to a user"
     )
-    def is_placeholder_user_token_invalid(self: None, info: Info) -> bool:
+    async def is_placeholder_user_token_invalid(
+        self: None,
+        info: Info,
+    ) -> bool:
         db = info.context.db
 
         placeholder_user_token = info.context.request.headers.get(
@@ -41,10 +45,8 @@ class Query:
         if placeholder_user_token == None:
             return False
 
-        db_user = db.scalar(
-            select(OrmUser).where(
-                OrmUser.placeholder_client_token == placeholder_user_token
-            )
+        db_user = await get_user_by_placeholder_user_token(
+            db, placeholder_user_token
         )
 
         if db_user != None:
@@ -54,19 +56,19 @@ class Query:
 
     @strawberry.field
     @ensure_db_user
-    def user(self: None, info: Info, db_user: OrmUser) -> User | None:
+    async def user(self: None, info: Info, db_user: OrmUser) -> User | None:
         return User.from_db(db_user)
 
     @strawberry.field
-    def space(
+    async def space(
         self: None,
         info: Info,
         id: UUID,
     ) -> QuerySpaceResult | None:
         db = info.context.db
-        db_user = info.context.db_user
+        db_user = await info.context.get_db_user()
 
-        db_space = db.scalar(select(OrmSpace).where(OrmSpace.id == id))
+        db_space = await db.scalar(select(OrmSpace).where(OrmSpace.id == id))
 
         if db_space == None:
             return None
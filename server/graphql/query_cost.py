@@ -0,0 +1,158 @@
+from graphql import (
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    GraphQLList,
+    GraphQLNamedType,
+    GraphQLNonNull,
+    InlineFragmentNode,
+    IntValueNode,
+    OperationDefinitionNode,
+    SelectionSetNode,
+    ValidationRule,
+    get_named_type,
+)
+
+from server.settings import settings
+
+# Arguments that bound the number of items a list field returns
+_LIST_SIZE_ARGUMENTS = ("first", "limit")
+
+
+class QueryCostRule(ValidationRule):
+    """
+    Rejects operations whose estimated cost exceeds the configured maximum.
+
+    Every field costs 1, plus the cost of its selections multiplied by the
+    number of items it returns. For list fields that is the value of a
+    literal `first` or `limit` argument, or an estimate otherwise. The
+    argument of a connection field, e.g. `spacesConnection(first: 50)`,
+    applies to the lists it contains, i.e. `edges`.
+    """
+
+    def enter_operation_definition(
+        self, node: OperationDefinitionNode, *args
+    ) -> None:
+        schema = self.context.schema
+        root_type = schema.get_root_type(node.operation)
+
+        if root_type == None:
+            return
+
+        cost = self._selection_set_cost(
+            node.selection_set, root_type, set(), None
+        )
+
+        if cost > settings.graphql_max_query_cost:
+            self.report_error(
+                GraphQLError(
+                    f"Query cost {cost} exceeds the maximum of "
+                    f"{settings.graphql_max_query_cost}",
+                    node,
+                    extensions={"code": "QUERY_TOO_EXPENSIVE"},
+                )
+            )
+
+    def _selection_set_cost(
+        self,
+        selection_set: SelectionSetNode | None,
+        parent_type: GraphQLNamedType,
+        visited_fragments: set[str],
+        list_size: int | None,
+    ) -> int:
+        if selection_set == None:
+            return 0
+
+        cost = 0
+
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                cost += self._field_cost(
+                    selection, parent_type, visited_fragments, list_size
+                )
+            elif isinstance(selection, InlineFragmentNode):
+                cost += self._selection_set_cost(
+                    selection.selection_set,
+                    self._type_condition(selection, parent_type),
+                    visited_fragments,
+                    list_size,
+                )
+            elif isinstance(selection, FragmentSpreadNode):
+                name = selection.name.value
+
+                # Fragment cycles are reported by NoFragmentCyclesRule
+                if name in visited_fragments:
+                    continue
+
+                fragment = self.context.get_fragment(name)
+
+                if fragment == None:
+                    continue
+
+                cost += self._selection_set_cost(
+                    fragment.selection_set,
+                    self._type_condition(fragment, parent_type),
+                    visited_fragments | {name},
+                    list_size,
+                )
+
+        return cost
+
+    def _field_cost(
+        self,
+        node: FieldNode,
+        parent_type: GraphQLNamedType,
+        visited_fragments: set[str],
+        list_size: int | None,
+    ) -> int:
+        # Introspection and unknown fields, the latter reported by
+        # FieldsOnCorrectTypeRule
+        field = getattr(parent_type, "fields", {}).get(node.name.value)
+
+        if field == None:
+            return 0
+
+        field_type = field.type
+
+        if isinstance(field_type, GraphQLNonNull):
+            field_type = field_type.of_type
+
+        size_argument = None
+
+        for argument in node.arguments or ():
+            if argument.name.value in _LIST_SIZE_ARGUMENTS and isinstance(
+                argument.value, IntValueNode
+            ):
+                size_argument = int(argument.value.value)
+
+        if isinstance(field_type, GraphQLList):
+            multiplier = (
+                size_argument
+                or list_size
+                or settings.graphql_query_cost_default_list_size
+            )
+            # Nested lists are sized by their own arguments
+            size_argument = None
+        else:
+            multiplier = 1
+
+        return 1 + multiplier * self._selection_set_cost(
+            node.selection_set,
+            get_named_type(field_type),
+            visited_fragments,
+            size_argument,
+        )
+
+    def _type_condition(
+        self,
+        node: InlineFragmentNode | FragmentDefinitionNode,
+        parent_type: GraphQLNamedType,
+    ) -> GraphQLNamedType:
+        if node.type_condition == None:
+            return parent_type
+
+        return (
+            self.context.schema.get_type(node.type_condition.name.value)
+            or parent_type
+        )
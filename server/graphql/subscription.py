@@ -0,0 +1,188 @@
+import asyncio
+from typing import AsyncGenerator
+from uuid import UUID
+
+import strawberry
+
+from server import json_codec
+from server.database.orm.csv_evaluation_run import (
+    CSVEvaluationRunStatus,
+    OrmCSVEvaluationRun,
+)
+from server.database.orm.user import OrmUser
+from server.flow import csv_evaluation, events
+from server.flow.run_flow import run_flow
+from server.llm.get_completion import ApiConfig
+from server.pubsub import broker
+from server.settings import settings
+
+from .context import Info
+from .mutations.mutation_flow import load_flow_content, parse_flow_inputs
+from .utils import ensure_db_user
+
+FlowRunEventType = strawberry.enum(events.FlowRunEventType)
+
+
+@strawberry.type
+class FlowRunEvent:
+    @classmethod
+    def from_event(cls, event: events.FlowRunEvent) -> "FlowRunEvent":
+        return FlowRunEvent(
+            type=event.type,
+            node_id=event.node_id,
+            token=event.token,
+            values=json_codec.dumps(event.values),
+        )
+
+    type: FlowRunEventType
+    node_id: str | None
+    token: str | None
+    values: str = strawberry.field(
+        description="JSON object of variable values, keyed by variable name"
+    )
+
+
+@strawberry.type
+class CSVEvaluationRunEvent:
+    @classmethod
+    def from_event(
+        cls, event: csv_evaluation.CSVEvaluationRunEvent
+    ) -> "CSVEvaluationRunEvent":
+        return CSVEvaluationRunEvent(
+            status=event.status,
+            total_count=event.total_count,
+            finished_count=event.finished_count,
+            row_index=event.row_index,
+            iteration_index=event.iteration_index,
+            error=event.error,
+        )
+
+    status: CSVEvaluationRunStatus
+    total_count: int
+    finished_count: int
+    row_index: int | None
+    iteration_index: int | None
+    error: str | None
+
+
+_FINISHED_STATUSES = {
+    CSVEvaluationRunStatus.SUCCEEDED,
+    CSVEvaluationRunStatus.FAILED,
+}
+
+
+@strawberry.type
+class Subscription:
+    @strawberry.subscription
+    @ensure_db_user
+    async def run_flow(
+        self: None,
+        info: Info,
+        db_user: OrmUser,
+        space_id: strawberry.ID,
+        openai_api_key: str,
+        openai_organization_id: str = "",
+        # JSON object of flow input values, keyed by variable name
+        inputs: str | None = None,
+        # Call the LLM even if an identical completion is cached
+        bypass_cache: bool = False,
+    ) -> AsyncGenerator[FlowRunEvent, None]:
+        flow_inputs = parse_flow_inputs(inputs)
+
+        content = await load_flow_content(info.context.db, db_user, space_id)
+
+        if content == None:
+            return
+
+        # Bounded, the flow waits for a slow client instead of buffering.
+        queue = asyncio.Queue[events.FlowRunEvent | None](
+            maxsize=settings.graphql_subscription_max_queue_size
+        )
+
+        async def run() -> None:
+            try:
+                await run_flow(
+                    content,
+                    ApiConfig(
+                        openai_organization_id=openai_organization_id,
+                        openai_key=openai_api_key,
+                    ),
+                    flow_inputs,
+                    use_cache=not bypass_cache,
+                    emit=queue.put,
+                )
+            except asyncio.CancelledError:
+                # The client is gone and nothing reads the queue anymore, so
+                # waiting for room in it to end the events would never return.
+                raise
+            except Exception:
+                await queue.put(None)
+                raise
+
+            await queue.put(None)
+
+        task = asyncio.create_task(run())
+
+        try:
+            while (event := await queue.get()) != None:
+                yield FlowRunEvent.from_event(event)
+
+            # Raise the error if the flow failed
+            await task
+        finally:
+            # The client unsubscribed or disconnected
+            task.cancel()
+
+    @strawberry.subscription
+    @ensure_db_user
+    async def csv_evaluation_run(
+        self: None,
+        info: Info,
+        db_user: OrmUser,
+        id: strawberry.ID,
+    ) -> AsyncGenerator[CSVEvaluationRunEvent, None]:
+        """
+        Current progress of the run, followed by an event for every finished
+        row, until the run finishes.
+        """
+        db = info.context.db
+
+        # Events are published on the canonical form of the id
+        try:
+            run_id = UUID(id)
+        except ValueError as exception:
+            raise Exception(f"Invalid run id {id}") from exception
+
+        # Subscribe before reading the run, so no event is missed in between.
+        async with broker.subscribe(
+            csv_evaluation.csv_evaluation_run_topic(run_id),
+            settings.graphql_subscription_max_queue_size,
+        ) as messages:
+            db_run = await db.scalar(
+                db_user.csv_evaluation_runs.select().where(
+                    OrmCSVEvaluationRun.id == run_id
+                )
+            )
+            # Don't hold a connection while waiting for events
+            await db.commit()
+
+            if db_run == None:
+                return
+
+            yield CSVEvaluationRunEvent(
+                status=CSVEvaluationRunStatus(db_run.status),
+                total_count=db_run.total_count,
+                finished_count=db_run.finished_count,
+                row_index=None,
+                iteration_index=None,
+                error=db_run.error,
+            )
+
+            if db_run.status in _FINISHED_STATUSES:
+                return
+
+            async for event in messages:
+                yield CSVEvaluationRunEvent.from_event(event)
+
+                if event.status in _FINISHED_STATUSES:
+                    return
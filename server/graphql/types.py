@@ -1,25 +1,56 @@
 from __future__ import annotations
 
-import json
+import base64
 from datetime import datetime
 from enum import auto
 from uuid import UUID
 
 import strawberry
+from sqlalchemy import inspect, tuple_
+from strawberry.dataloader import DataLoader
 from strenum import LowercaseStrEnum
 
+from server import json_codec
+from server.database.csv_rows import format_csv, get_rows, iter_rows
 from server.database.orm.block_set import OrmBlockSet
 from server.database.orm.completer_block import OrmCompleterBlock
 from server.database.orm.csv_evaluation_preset import OrmCSVEvaluationPreset
+from server.database.orm.csv_evaluation_run import (
+    CSVEvaluationRunStatus,
+    OrmCSVEvaluationRun,
+)
+from server.database.orm.csv_evaluation_run_result import (
+    OrmCSVEvaluationRunResult,
+)
 from server.database.orm.preset import OrmPreset
 from server.database.orm.prompt_block import OrmPromptBlock
 from server.database.orm.space import OrmSpace
 from server.database.orm.user import OrmUser
 from server.database.orm.workspace import OrmWorkspace
 
+from server.settings import settings
+
 from .context import Info
 
 
+async def _get_json_text(
+    db_object: OrmSpace | OrmCSVEvaluationPreset,
+    column_name: str,
+    loader: DataLoader[tuple[UUID, str], str | None],
+) -> str | None:
+    """
+    Get a JSONB column as JSON text. A value already in the identity map, e.g.
+    just assigned by a mutation, is encoded. Otherwise the text is loaded from
+    Postgres and returned as is.
+    """
+
+    if column_name not in inspect(db_object).unloaded:
+        value = getattr(db_object, column_name)
+        return json_codec.dumps(value) if value != None else None
+
+    return await loader.load((db_object.id, column_name))
+
+
 @strawberry.type
 class User:
     @classmethod
@@ -37,15 +68,91 @@ class User:
     profile_picture_url: str | None
 
     @strawberry.field
-    def spaces(self: User, info: Info) -> list[Space]:
-        db = info.context.db
-
-        spaces = db.scalars(
-            self.db_user.spaces.select().order_by(OrmSpace.updated_at.desc())
+    async def spaces(self: User, info: Info) -> list[Space]:
+        spaces = await info.context.loaders.spaces_by_owner_id.load(
+            self.db_user.id
         )
 
         return [Space.from_db(s) for s in spaces]
 
+    @strawberry.field(
+        description="Spaces, most recently updated first, paginated with the endCursor of the previous page"
+    )
+    async def spaces_connection(
+        self: User,
+        info: Info,
+        first: int = 20,
+        after: str | None = None,
+    ) -> SpaceConnection:
+        if first < 1 or first > settings.graphql_max_page_size:
+            raise Exception(
+                f"first must be between 1 and {settings.graphql_max_page_size}"
+            )
+
+        # Keyset pagination, served by ix_spaces_owner_id_updated_at_id as a
+        # range scan however deep the page is.
+        statement = (
+            self.db_user.spaces.select()
+            .order_by(OrmSpace.updated_at.desc(), OrmSpace.id.desc())
+            .limit(first + 1)
+        )
+
+        if after != None:
+            updated_at, id = _decode_space_cursor(after)
+            statement = statement.where(
+                tuple_(OrmSpace.updated_at, OrmSpace.id) < (updated_at, id)
+            )
+
+        db_spaces = list(await info.context.db.scalars(statement))
+
+        edges = [
+            SpaceEdge(
+                cursor=_encode_space_cursor(db_space),
+                node=Space.from_db(db_space),
+            )
+            for db_space in db_spaces[:first]
+        ]
+
+        return SpaceConnection(
+            edges=edges,
+            page_info=PageInfo(
+                has_next_page=len(db_spaces) > first,
+                end_cursor=edges[-1].cursor if edges else None,
+            ),
+        )
+
+
+def _encode_space_cursor(db_space: OrmSpace) -> str:
+    value = f"{db_space.updated_at.isoformat()}|{db_space.id}"
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def _decode_space_cursor(cursor: str) -> tuple[datetime, UUID]:
+    try:
+        value = base64.urlsafe_b64decode(cursor.encode()).decode()
+        updated_at, id = value.split("|")
+        return datetime.fromisoformat(updated_at), UUID(id)
+    except ValueError as exception:
+        raise Exception("Invalid cursor") from exception
+
+
+@strawberry.type
+class PageInfo:
+    has_next_page: bool
+    end_cursor: str | None
+
+
+@strawberry.type
+class SpaceEdge:
+    cursor: str
+    node: Space
+
+
+@strawberry.type
+class SpaceConnection:
+    edges: list[SpaceEdge]
+    page_info: PageInfo
+
 
 @strawberry.enum
 class ContentVersion(LowercaseStrEnum):
@@ -58,17 +165,6 @@ class ContentVersion(LowercaseStrEnum):
 class Space:
     @classmethod
     def from_db(cls, db_space: OrmSpace) -> Space:
-        flow_content = (
-            json.dumps(db_space.flow_content)
-            if db_space.flow_content != None
-            else None
-        )
-        content_v3 = (
-            json.dumps(db_space.content_v3)
-            if db_space.content_v3 != None
-            else None
-        )
-
         return Space(
             db_space=db_space,
             id=db_space.id,
@@ -76,9 +172,7 @@ class Space:
             content_version=ContentVersion(db_space.content_version)
             if db_space.content_version != None
             else ContentVersion.v1,
-            content=json.dumps(db_space.content),
-            flow_content=flow_content,
-            content_v3=content_v3,
+            revision=db_space.revision,
             updated_at=db_space.updated_at,
         )
 
@@ -86,40 +180,63 @@ class Space:
     id: strawberry.ID
     name: str
     content_version: ContentVersion
-    content: str | None
-    flow_content: str | None
-    content_v3: str | None
+    revision: int
     updated_at: datetime
 
+    # Content columns are deferred on OrmSpace, they are only fetched when
+    # the client selects them.
+
+    @strawberry.field
+    async def content(self: Space, info: Info) -> str | None:
+        content = await _get_json_text(
+            self.db_space, "content", info.context.loaders.space_json_texts
+        )
+        return content if content != None else "null"
+
+    @strawberry.field
+    async def flow_content(self: Space, info: Info) -> str | None:
+        return await _get_json_text(
+            self.db_space,
+            "flow_content",
+            info.context.loaders.space_json_texts,
+        )
+
+    @strawberry.field
+    async def content_v3(self: Space, info: Info) -> str | None:
+        return await _get_json_text(
+            self.db_space, "content_v3", info.context.loaders.space_json_texts
+        )
+
     @strawberry.field
-    def csv_evaluation_presets(
+    async def csv_evaluation_presets(
         self: Space, info: Info
     ) -> list[CSVEvaluationPreset]:
-        db = info.context.db
+        loaders = info.context.loaders
 
-        csv_evaluation_presets = db.scalars(
-            self.db_space.csv_evaluation_presets.select().order_by(
-                OrmCSVEvaluationPreset.updated_at.desc()
+        csv_evaluation_presets = (
+            await loaders.csv_evaluation_presets_by_space_id.load(
+                self.db_space.id
             )
         )
 
         return [CSVEvaluationPreset.from_db(p) for p in csv_evaluation_presets]
 
     @strawberry.field
-    def csv_evaluation_preset(
+    async def csv_evaluation_preset(
         self: Space,
         info: Info,
         id: strawberry.ID,
-    ) -> CSVEvaluationPreset:
-        db = info.context.db
+    ) -> CSVEvaluationPreset | None:
+        loaders = info.context.loaders
 
-        csv_evaluation_preset = db.scalar(
-            self.db_space.csv_evaluation_presets.select().where(
-                OrmCSVEvaluationPreset.id == id
-            )
+        csv_evaluation_preset = await loaders.csv_evaluation_preset_by_id.load(
+            UUID(id)
         )
 
-        if csv_evaluation_preset == None:
+        if (
+            csv_evaluation_preset == None
+            or csv_evaluation_preset.space_id != self.db_space.id
+        ):
             return None
 
         return CSVEvaluationPreset.from_db(csv_evaluation_preset)
@@ -131,25 +248,150 @@ class CSVEvaluationPreset:
     def from_db(
         cls, db_csv_evaluation_preset: OrmCSVEvaluationPreset
     ) -> CSVEvaluationPreset:
-        config_content = (
-            json.dumps(db_csv_evaluation_preset.config_content)
-            if db_csv_evaluation_preset.config_content != None
-            else None
-        )
-
         return CSVEvaluationPreset(
             db_csv_evaluation_preset=db_csv_evaluation_preset,
             id=db_csv_evaluation_preset.id,
             name=db_csv_evaluation_preset.name,
-            csv_content=db_csv_evaluation_preset.csv_content,
-            config_content=config_content,
+            row_count=db_csv_evaluation_preset.row_count,
         )
 
     db_csv_evaluation_preset: strawberry.Private[OrmCSVEvaluationPreset]
     id: strawberry.ID
     name: str
-    csv_content: str
-    config_content: str | None
+    row_count: int = strawberry.field(
+        description="Number of CSV rows, including the header row"
+    )
+
+    @strawberry.field(
+        description="The rows formatted as CSV, with normalized line endings and quoting",
+        deprecation_reason="Use rows, it supports pagination",
+    )
+    async def csv_content(self: CSVEvaluationPreset, info: Info) -> str:
+        db = info.context.db
+
+        return format_csv(
+            [
+                row
+                async for row in iter_rows(db, self.db_csv_evaluation_preset.id)
+            ]
+        )
+
+    @strawberry.field
+    async def rows(
+        self: CSVEvaluationPreset,
+        info: Info,
+        offset: int = 0,
+        limit: int = 100,
+    ) -> list[list[str]]:
+        db = info.context.db
+
+        return await get_rows(
+            db,
+            self.db_csv_evaluation_preset.id,
+            offset,
+            min(limit, 1000),
+        )
+
+    @strawberry.field
+    async def config_content(
+        self: CSVEvaluationPreset,
+        info: Info,
+    ) -> str | None:
+        return await _get_json_text(
+            self.db_csv_evaluation_preset,
+            "config_content",
+            info.context.loaders.csv_evaluation_preset_json_texts,
+        )
+
+    @strawberry.field
+    async def csv_evaluation_runs(
+        self: CSVEvaluationPreset,
+        info: Info,
+    ) -> list[CSVEvaluationRun]:
+        db = info.context.db
+
+        db_runs = await db.scalars(
+            self.db_csv_evaluation_preset.csv_evaluation_runs.select().order_by(
+                OrmCSVEvaluationRun.created_at.desc()
+            )
+        )
+
+        return [CSVEvaluationRun.from_db(db_run) for db_run in db_runs]
+
+
+strawberry.enum(CSVEvaluationRunStatus)
+
+
+@strawberry.type
+class CSVEvaluationRun:
+    @classmethod
+    def from_db(cls, db_run: OrmCSVEvaluationRun) -> CSVEvaluationRun:
+        return CSVEvaluationRun(
+            db_run=db_run,
+            id=db_run.id,
+            status=CSVEvaluationRunStatus(db_run.status),
+            concurrency=db_run.concurrency,
+            repeat_count=db_run.repeat_count,
+            total_count=db_run.total_count,
+            finished_count=db_run.finished_count,
+            error=db_run.error,
+            created_at=db_run.created_at,
+            updated_at=db_run.updated_at,
+        )
+
+    db_run: strawberry.Private[OrmCSVEvaluationRun]
+    id: strawberry.ID
+    status: CSVEvaluationRunStatus
+    concurrency: int
+    repeat_count: int
+    total_count: int
+    finished_count: int
+    error: str | None
+    created_at: datetime
+    updated_at: datetime
+
+    @strawberry.field
+    async def results(
+        self: CSVEvaluationRun,
+        info: Info,
+        offset: int = 0,
+        limit: int = 100,
+    ) -> list[CSVEvaluationRunResult]:
+        db = info.context.db
+
+        db_results = await db.scalars(
+            self.db_run.results.select()
+            .order_by(
+                OrmCSVEvaluationRunResult.iteration_index,
+                OrmCSVEvaluationRunResult.row_index,
+            )
+            .offset(offset)
+            .limit(min(limit, 1000))
+        )
+
+        return [
+            CSVEvaluationRunResult(
+                row_index=db_result.row_index,
+                iteration_index=db_result.iteration_index,
+                outputs=(
+                    json_codec.dumps(db_result.outputs)
+                    if db_result.outputs != None
+                    else None
+                ),
+                error=db_result.error,
+            )
+            for db_result in db_results
+        ]
+
+
+@strawberry.type
+class CSVEvaluationRunResult:
+    row_index: int
+    iteration_index: int
+    outputs: str | None = strawberry.field(
+        description="JSON object of flow output values, keyed by variable name"
+    )
+    error: str | None
 
 
 @strawberry.type
@@ -162,3 +404,10 @@ class QuerySpaceResult:
 class CreatePlaceholderUserAndExampleSpaceResult:
     placeholder_client_token: strawberry.ID
     space: Space
+
+
+@strawberry.type
+class RunFlowResult:
+    outputs: str = strawberry.field(
+        description="JSON object of flow output values, keyed by variable name"
+    )
@@ -6,8 +6,9 @@ from .types import Info
 
 def ensure_db_user(func):
     sig = inspect.signature(func)
+    is_async_generator = inspect.isasyncgenfunction(func)
 
-    if not any(
+    if not is_async_generator and not any(
         issubclass(t, type(None)) for t in get_args(sig.return_annotation)
     ):
         raise Exception(
@@ -25,17 +26,35 @@ def ensure_db_user(func):
     if not is_found_info:
         raise Exception("Cannot find an argument with type `Info`.")
 
-    def wrapper(*args, **kwargs):
+    async def wrapper(*args, **kwargs):
         info = cast(Info, kwargs[info_arg_name])
 
-        if info.context.db_user == None:
+        db_user = await info.context.get_db_user()
+
+        if db_user == None:
             print("The access is not authorized.")
             return None
 
-        result = func(db_user=info.context.db_user, *args, **kwargs)
+        result = await func(db_user=db_user, *args, **kwargs)
 
         return result
 
+    # Subscriptions, an unauthorized subscriber gets an empty stream.
+    async def async_generator_wrapper(*args, **kwargs):
+        info = cast(Info, kwargs[info_arg_name])
+
+        db_user = await info.context.get_db_user()
+
+        if db_user == None:
+            print("The access is not authorized.")
+            return
+
+        async for result in func(db_user=db_user, *args, **kwargs):
+            yield result
+
+    if is_async_generator:
+        wrapper = async_generator_wrapper
+
     new_params = dict(sig.parameters)
     del new_params["db_user"]
 
@@ -0,0 +1,42 @@
+"""
+JSON encoding for the hot paths, i.e. space content and evaluation configs.
+
+orjson is used when it's installed, otherwise it falls back to the standard
+library. Both produce JSON that is interchangeable for our purposes.
+"""
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads(value: str | bytes) -> Any:
+    if orjson != None:
+        return orjson.loads(value)
+
+    return json.loads(value)
+
+
+def dumps(value: Any) -> str:
+    if orjson != None:
+        return orjson.dumps(value).decode()
+
+    return json.dumps(value)
+
+
+def validate(value: str) -> str:
+    """
+    Make sure value is a valid JSON document before forwarding it to the
+    database as is.
+    """
+
+    try:
+        loads(value)
+    except ValueError as exception:
+        raise Exception(f"Invalid JSON: {exception}") from exception
+
+    return value
@@ -0,0 +1,37 @@
+"""
+A process wide `httpx.AsyncClient` for calling LLM APIs, so concurrent
+completions share one connection pool instead of opening a connection each.
+"""
+
+import httpx
+
+from server.settings import settings
+
+_client: httpx.AsyncClient | None = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    global _client
+
+    if _client == None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            base_url=settings.openai_api_base_url,
+            timeout=httpx.Timeout(
+                settings.llm_request_timeout_seconds,
+                connect=settings.llm_connect_timeout_seconds,
+            ),
+            limits=httpx.Limits(
+                max_connections=settings.llm_max_connections,
+                max_keepalive_connections=settings.llm_max_connections,
+            ),
+        )
+
+    return _client
+
+
+async def close_http_client() -> None:
+    global _client
+
+    if _client != None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,159 @@
+"""
+Cache of chat completions, so rerunning an unchanged flow or evaluation
+doesn't call the LLM API again.
+
+There are two tiers: an in-process LRU, and the llm_completion_cache_entries
+table shared by all processes. Both evict entries after
+`llm_cache_ttl_seconds`.
+"""
+
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import Any
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+
+from server.database.database import AsyncSessionLocal
+from server.database.orm.llm_completion_cache_entry import (
+    OrmLlmCompletionCacheEntry,
+)
+from server.lru_cache import LRUCache
+from server.metrics import (
+    llm_completion_cache_lookups,
+    llm_completion_cache_stores,
+)
+from server.settings import settings
+
+# Expired rows are deleted after every this many writes.
+_PRUNE_INTERVAL = 100
+
+_memory_cache = LRUCache[str, dict[str, Any]](
+    max_size=settings.llm_cache_memory_max_size,
+    ttl_seconds=settings.llm_cache_ttl_seconds,
+)
+
+_write_count = 0
+
+_LOOKUP_RESULTS = ["memory_hit", "database_hit", "miss"]
+
+# Export every result from the start, so rates can be computed from zero
+for result in _LOOKUP_RESULTS:
+    llm_completion_cache_lookups.labels(result)
+
+
+def get_stats() -> dict[str, float]:
+    """
+    Lookups by result and stores since the process started, read from the
+    Prometheus counters.
+    """
+
+    stats = {
+        result: llm_completion_cache_lookups.labels(result)._value.get()
+        for result in _LOOKUP_RESULTS
+    }
+    stats["store"] = llm_completion_cache_stores._value.get()
+
+    return stats
+
+
+def create_cache_key(
+    api_key: str,
+    request_body: dict[str, Any],
+    repeat_index: int = 0,
+) -> str:
+    """
+    Hash the request body in a canonical form, i.e. with sorted keys and
+    without whitespace. The API key is part of the key, so cached responses
+    are never shared between accounts.
+
+    Repeats of the same request, e.g. the iterations of a CSV evaluation,
+    have their own repeat_index, so each gets its own completion instead of
+    the first one's.
+    """
+
+    canonical = json.dumps(
+        {
+            "api_key_hash": hashlib.sha256(api_key.encode()).hexdigest(),
+            "body": {k: v for k, v in request_body.items() if k != "stream"},
+            "repeat_index": repeat_index,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+async def get_cached_message(key: str) -> dict[str, Any] | None:
+    message = _memory_cache.get(key)
+
+    if message != None:
+        llm_completion_cache_lookups.labels("memory_hit").inc()
+        return message
+
+    if settings.llm_cache_persistent:
+        async with AsyncSessionLocal() as db:
+            message = await db.scalar(
+                select(OrmLlmCompletionCacheEntry.message).where(
+                    OrmLlmCompletionCacheEntry.key == key,
+                    OrmLlmCompletionCacheEntry.expires_at > datetime.utcnow(),
+                )
+            )
+
+        if message != None:
+            llm_completion_cache_lookups.labels("database_hit").inc()
+            _memory_cache.set(key, message)
+            return message
+
+    llm_completion_cache_lookups.labels("miss").inc()
+    return None
+
+
+async def set_cached_message(
+    key: str,
+    model: str,
+    message: dict[str, Any],
+) -> None:
+    global _write_count
+
+    _memory_cache.set(key, message)
+    llm_completion_cache_stores.inc()
+
+    if not settings.llm_cache_persistent:
+        return
+
+    expires_at = datetime.utcnow() + timedelta(
+        seconds=settings.llm_cache_ttl_seconds
+    )
+
+    statement = insert(OrmLlmCompletionCacheEntry).values(
+        key=key,
+        model=model,
+        message=message,
+        expires_at=expires_at,
+    )
+
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            statement.on_conflict_do_update(
+                index_elements=[OrmLlmCompletionCacheEntry.key],
+                set_={
+                    "message": statement.excluded.message,
+                    "expires_at": statement.excluded.expires_at,
+                },
+            )
+        )
+
+        _write_count += 1
+
+        if _write_count % _PRUNE_INTERVAL == 0:
+            await db.execute(
+                delete(OrmLlmCompletionCacheEntry).where(
+                    OrmLlmCompletionCacheEntry.expires_at <= datetime.utcnow()
+                )
+            )
+
+        await db.commit()
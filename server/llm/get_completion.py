@@ -1,8 +1,20 @@
 import codecs
+from typing import AsyncIterator
 
-import openai
+import httpx
 from pydantic import BaseModel, parse_obj_as
 
+from server import json_codec
+from server.settings import settings
+
+from .client import get_http_client
+from .completion_cache import (
+    create_cache_key,
+    get_cached_message,
+    set_cached_message,
+)
+from .rate_limiter import estimate_prompt_tokens, send_with_rate_limit
+
 
 class ApiConfig(BaseModel):
     openai_organization_id: str
@@ -14,22 +26,208 @@ class LlmMessage(BaseModel):
     content: str
 
 
-def get_completion(
-    # TODO: Figure out how to apply APK keys per request, instead of globally.
+def _create_headers(api_config: ApiConfig) -> dict[str, str]:
+    headers = {"Authorization": f"Bearer {api_config.openai_key}"}
+
+    if api_config.openai_organization_id != "":
+        headers["OpenAI-Organization"] = api_config.openai_organization_id
+
+    return headers
+
+
+def _create_body(
+    model: str,
+    temperature: float,
+    messages: list[LlmMessage],
+    stop: str | list[str],
+    seed: int | None,
+    response_format_type: str | None,
+    stream: bool,
+) -> dict:
+    body = {
+        "model": model,
+        "temperature": temperature,
+        "messages": [m.dict() for m in messages],
+        "stream": stream,
+    }
+
+    # NOTE: Must unescape the stop token, otherwise OpenAI API won't match
+    # tokens like \n, because the stop str is stored as \\n in the database.
+    if isinstance(stop, list):
+        if len(stop) > 0:
+            body["stop"] = [codecs.decode(s, "unicode_escape") for s in stop]
+    elif stop != "":
+        body["stop"] = codecs.decode(stop, "unicode_escape")
+
+    if seed != None:
+        body["seed"] = seed
+
+    if response_format_type != None:
+        body["response_format"] = {"type": response_format_type}
+
+    return body
+
+
+def _raise_for_error(status_code: int, content: bytes) -> None:
+    try:
+        message = json_codec.loads(content)["error"]["message"]
+    except Exception:
+        message = content.decode(errors="replace")
+
+    raise Exception(f"LLM request failed with {status_code}: {message}")
+
+
+async def _set_cached_message(key: str, model: str, message: dict) -> None:
+    """
+    The completion is paid for at this point, so it's returned even when it
+    can't be cached, e.g. because the database is unavailable.
+    """
+
+    try:
+        await set_cached_message(key, model, message)
+    except Exception as exception:
+        print(f"Could not cache the completion: {exception}")
+
+
+async def get_completion(
     api_config: ApiConfig,
     model: str,
     temperature: float,
     messages: list[LlmMessage],
-    stop: str,
+    stop: str | list[str],
+    seed: int | None = None,
+    response_format_type: str | None = None,
+    use_cache: bool = True,
+    repeat_index: int = 0,
 ) -> LlmMessage:
-    response: dict = openai.ChatCompletion.create(
-        model=model,
-        temperature=temperature,
-        messages=[m.dict() for m in messages],
-        # NOTE: Must unescape the stop token, otherwise OpenAI API won't match
-        # tokens like \n, because the stop str is stored as \\n in the database.
-        stop=codecs.decode(stop, "unicode_escape") if stop != "" else "",
+    body = _create_body(
+        model,
+        temperature,
+        messages,
+        stop,
+        seed,
+        response_format_type,
+        stream=False,
     )
 
-    choice = response["choices"][0]
-    return parse_obj_as(LlmMessage, choice["message"])
+    use_cache = use_cache and settings.llm_cache_enabled
+
+    if use_cache:
+        cache_key = create_cache_key(api_config.openai_key, body, repeat_index)
+        message = await get_cached_message(cache_key)
+
+        if message != None:
+            return parse_obj_as(LlmMessage, message)
+
+    client = get_http_client()
+    request = client.build_request(
+        "POST",
+        "/chat/completions",
+        headers=_create_headers(api_config),
+        content=json_codec.dumps(body),
+    )
+
+    response = await send_with_rate_limit(
+        api_config.openai_key,
+        model,
+        estimate_prompt_tokens([m.content for m in messages]),
+        lambda: client.send(request),
+    )
+
+    if response.status_code != httpx.codes.OK:
+        _raise_for_error(response.status_code, response.content)
+
+    choice = json_codec.loads(response.content)["choices"][0]
+    llm_message = parse_obj_as(LlmMessage, choice["message"])
+
+    if use_cache:
+        await _set_cached_message(cache_key, model, llm_message.dict())
+
+    return llm_message
+
+
+async def stream_completion(
+    api_config: ApiConfig,
+    model: str,
+    temperature: float,
+    messages: list[LlmMessage],
+    stop: str | list[str],
+    seed: int | None = None,
+    response_format_type: str | None = None,
+    use_cache: bool = True,
+    repeat_index: int = 0,
+) -> AsyncIterator[str]:
+    """
+    Yield content deltas as they arrive from the server-sent events stream.
+    A cached completion is yielded as a single delta.
+    """
+    body = _create_body(
+        model,
+        temperature,
+        messages,
+        stop,
+        seed,
+        response_format_type,
+        stream=True,
+    )
+
+    use_cache = use_cache and settings.llm_cache_enabled
+
+    if use_cache:
+        cache_key = create_cache_key(api_config.openai_key, body, repeat_index)
+        message = await get_cached_message(cache_key)
+
+        if message != None:
+            yield message["content"]
+            return
+
+    role = "assistant"
+    contents: list[str] = []
+    is_done = False
+
+    client = get_http_client()
+    request = client.build_request(
+        "POST",
+        "/chat/completions",
+        headers=_create_headers(api_config),
+        content=json_codec.dumps(body),
+    )
+
+    response = await send_with_rate_limit(
+        api_config.openai_key,
+        model,
+        estimate_prompt_tokens([m.content for m in messages]),
+        lambda: client.send(request, stream=True),
+    )
+
+    try:
+        if response.status_code != httpx.codes.OK:
+            _raise_for_error(response.status_code, await response.aread())
+
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                # Blank lines separate events, lines starting with ":" are
+                # comments, e.g. keep-alive pings.
+                continue
+
+            data = line[len("data:") :].strip()
+
+            if data == "[DONE]":
+                is_done = True
+                break
+
+            delta = json_codec.loads(data)["choices"][0]["delta"]
+            role = delta.get("role") or role
+            content = delta.get("content")
+
+            if content:
+                contents.append(content)
+                yield content
+    finally:
+        await response.aclose()
+
+    # Only cache completions that were streamed to the end
+    if use_cache and is_done:
+        await _set_cached_message(
+            cache_key, model, {"role": role, "content": "".join(contents)}
+        )
@@ -0,0 +1,287 @@
+"""
+Client side rate limiting for LLM API calls, per API key and model.
+
+Requests wait for capacity in two token buckets, one for requests per minute
+and one for (estimated) prompt tokens per minute, so bursts are queued
+instead of being rejected by the provider. Responses with 429 or 5xx are
+retried after `Retry-After`, or with exponential backoff, and a 429 also
+lowers the rate of the bucket until requests succeed again. After repeated
+failures a circuit breaker rejects requests until a cool down has passed.
+"""
+
+import asyncio
+import hashlib
+import random
+import time
+from typing import Awaitable, Callable
+
+import httpx
+
+from server.lru_cache import LRUCache
+from server.metrics import (
+    llm_rate_limit_wait_seconds,
+    llm_request_errors,
+    llm_request_seconds,
+)
+from server.settings import settings
+
+# Rate is multiplied by this after a 429, and recovers by
+# _RATE_FACTOR_RECOVERY after each success.
+_RATE_FACTOR_DECREASE = 0.5
+_RATE_FACTOR_RECOVERY = 0.05
+_RATE_FACTOR_MIN = 0.1
+
+# Models come from the flow content clients send, only the first ones seen
+# get their own metric label, so a misbehaving client can't create unbounded
+# time series.
+_MAX_MODEL_LABELS = 50
+
+_model_labels: set[str] = set()
+
+
+def _get_model_label(model: str) -> str:
+    if model in _model_labels:
+        return model
+
+    if len(_model_labels) >= _MAX_MODEL_LABELS:
+        return "other"
+
+    _model_labels.add(model)
+    return model
+
+
+def estimate_prompt_tokens(message_contents: list[str]) -> int:
+    """
+    Roughly 4 characters per token, plus overhead per message, close enough
+    to OpenAI's tokenizers for English text without loading them.
+    """
+
+    return 3 + sum(4 + len(content) // 4 for content in message_contents)
+
+
+class TokenBucket:
+    def __init__(self, capacity: float, refill_per_second: float) -> None:
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.rate_factor = 1.0
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        # Waiters are served in FIFO order
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        refill_rate = self.refill_per_second * self.rate_factor
+        self._tokens = min(
+            self.capacity,
+            self._tokens + (now - self._updated_at) * refill_rate,
+        )
+        self._updated_at = now
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self, amount: float) -> None:
+        # A single request larger than the bucket would wait forever
+        amount = min(amount, self.capacity)
+
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+
+                if self._paused_until > now:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._refill()
+
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+
+                refill_rate = self.refill_per_second * self.rate_factor
+                await asyncio.sleep((amount - self._tokens) / refill_rate)
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, cooldown_seconds: float) -> None:
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._failure_count = 0
+        self._opened_at: float | None = None
+
+    def check(self) -> None:
+        if self._opened_at == None:
+            return
+
+        if time.monotonic() - self._opened_at < self.cooldown_seconds:
+            raise Exception(
+                "LLM requests are temporarily disabled after repeated failures"
+            )
+
+        # Half open, let requests through, the next failure opens it again.
+        self._failure_count = self.failure_threshold - 1
+        self._opened_at = None
+
+    def record_success(self) -> None:
+        self._failure_count = 0
+
+    def record_failure(self) -> None:
+        self._failure_count += 1
+
+        if self._failure_count >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+
+
+class RateLimiter:
+    def __init__(self) -> None:
+        self.requests = TokenBucket(
+            capacity=settings.llm_requests_per_minute,
+            refill_per_second=settings.llm_requests_per_minute / 60,
+        )
+        self.tokens = TokenBucket(
+            capacity=settings.llm_tokens_per_minute,
+            refill_per_second=settings.llm_tokens_per_minute / 60,
+        )
+        self.circuit_breaker = CircuitBreaker(
+            failure_threshold=settings.llm_circuit_breaker_failure_threshold,
+            cooldown_seconds=settings.llm_circuit_breaker_cooldown_seconds,
+        )
+
+    async def acquire(self, prompt_tokens: int) -> None:
+        await self.requests.acquire(1)
+        await self.tokens.acquire(prompt_tokens)
+
+    def slow_down(self, seconds: float) -> None:
+        for bucket in (self.requests, self.tokens):
+            bucket.pause(seconds)
+            bucket.rate_factor = max(
+                _RATE_FACTOR_MIN, bucket.rate_factor * _RATE_FACTOR_DECREASE
+            )
+
+    def speed_up(self) -> None:
+        for bucket in (self.requests, self.tokens):
+            bucket.rate_factor = min(
+                1.0, bucket.rate_factor + _RATE_FACTOR_RECOVERY
+            )
+
+
+_rate_limiters = LRUCache[tuple[str, str], RateLimiter](
+    max_size=settings.llm_rate_limiter_max_size,
+    ttl_seconds=settings.llm_rate_limiter_idle_seconds,
+)
+
+
+def get_rate_limiter(api_key: str, model: str) -> RateLimiter:
+    key = (hashlib.sha256(api_key.encode()).hexdigest(), model)
+    rate_limiter = _rate_limiters.get(key)
+
+    if rate_limiter == None:
+        rate_limiter = RateLimiter()
+
+    # Set on every use, so it only expires when it's idle
+    _rate_limiters.set(key, rate_limiter)
+
+    return rate_limiter
+
+
+def _get_retry_after_seconds(response: httpx.Response) -> float | None:
+    # OpenAI sends retry-after-ms in addition to the standard header
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1)):
+        value = response.headers.get(header)
+
+        if value != None:
+            try:
+                return float(value) * scale
+            except ValueError:
+                pass
+
+    return None
+
+
+def _get_backoff_seconds(attempt: int) -> float:
+    # Full jitter, so retries from concurrent requests spread out
+    return random.uniform(
+        0,
+        min(
+            settings.llm_backoff_max_seconds,
+            settings.llm_backoff_base_seconds * 2**attempt,
+        ),
+    )
+
+
+def _is_retryable(status_code: int) -> bool:
+    return (
+        status_code == httpx.codes.TOO_MANY_REQUESTS
+        or status_code >= httpx.codes.INTERNAL_SERVER_ERROR
+    )
+
+
+async def send_with_rate_limit(
+    api_key: str,
+    model: str,
+    prompt_tokens: int,
+    send: Callable[[], Awaitable[httpx.Response]],
+) -> httpx.Response:
+    """
+    Call `send` once there is capacity, retrying on 429, 5xx and network
+    errors. Returns the last response, which can still be an error.
+    """
+
+    rate_limiter = get_rate_limiter(api_key, model)
+    model_label = _get_model_label(model)
+
+    attempt = 0
+
+    while True:
+        rate_limiter.circuit_breaker.check()
+
+        tic = time.perf_counter()
+        await rate_limiter.acquire(prompt_tokens)
+        llm_rate_limit_wait_seconds.labels(model_label).observe(
+            time.perf_counter() - tic
+        )
+
+        tic = time.perf_counter()
+
+        try:
+            response = await send()
+        except httpx.TransportError:
+            llm_request_errors.labels(model_label).inc()
+            rate_limiter.circuit_breaker.record_failure()
+
+            if attempt >= settings.llm_max_retries:
+                raise
+
+            await asyncio.sleep(_get_backoff_seconds(attempt))
+            attempt += 1
+            continue
+
+        llm_request_seconds.labels(
+            model_label, str(response.status_code)
+        ).observe(time.perf_counter() - tic)
+
+        if not _is_retryable(response.status_code):
+            rate_limiter.circuit_breaker.record_success()
+            rate_limiter.speed_up()
+            return response
+
+        rate_limiter.circuit_breaker.record_failure()
+
+        if attempt >= settings.llm_max_retries:
+            return response
+
+        delay = _get_retry_after_seconds(response)
+
+        if delay == None:
+            delay = _get_backoff_seconds(attempt)
+
+        if response.status_code == httpx.codes.TOO_MANY_REQUESTS:
+            # Hold back every request for this key and model, not only this
+            # one, the quota is shared.
+            rate_limiter.slow_down(delay)
+
+        await response.aclose()
+        await asyncio.sleep(delay)
+        attempt += 1
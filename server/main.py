@@ -1,17 +1,25 @@
 from pprint import PrettyPrinter
 from typing import cast
+from uuid import UUID
 
 from fastapi import Depends, FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse
+from fastapi.responses import JSONResponse, RedirectResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.middleware.sessions import SessionMiddleware
 
-from server.auth import create_logout_url_with_id_token, oauth
-from server.database.database import engine, get_db
+from server.auth import create_logout_url_with_id_token, get_oauth
+from server.compression import CompressionMiddleware
+from server.database.database import async_engine, get_async_db
+from server.database.pool import check_pool_health
+from server.database.space_snapshot_cache import get_space_snapshot
 from server.database.orm.user import OrmUser
+from server.database.user_cache import get_user_by_id, invalidate_user
 from server.graphql import graphql
+from server.llm import completion_cache
+from server.llm.client import close_http_client
 from server.settings import settings
 
 app = FastAPI()
@@ -30,19 +38,83 @@ app.add_middleware(
     max_age=60 * 60 * 24 * 30,  # 30 days in seconds
 )
 
+# Added last, so it's the outermost middleware and compresses every response
+app.add_middleware(CompressionMiddleware)
+
 app.include_router(graphql.graphql_router, prefix="/graphql")
 
 
+@app.on_event("shutdown")
+async def shutdown() -> None:
+    await close_http_client()
+
+
 @app.get("/health")
-def health() -> str:
-    engine.connect()
-    return "OK"
+async def health() -> JSONResponse:
+    try:
+        result = await check_pool_health(async_engine)
+    except Exception as exception:
+        print(exception)
+        return JSONResponse({"status": "ERROR"}, status_code=503)
+
+    return JSONResponse(
+        {
+            "status": "OK",
+            **result,
+            "llm_completion_cache": completion_cache.get_stats(),
+        }
+    )
+
+
+@app.get("/metrics")
+async def metrics() -> Response:
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/spaces/{id}/snapshot")
+async def space_snapshot(
+    id: UUID,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+) -> Response:
+    """
+    Read-only view of a space, for viewers who don't own it. Browsers
+    revalidate on every use, CDNs can serve it for a short while.
+    """
+
+    snapshot = await get_space_snapshot(db, id)
+
+    if snapshot == None:
+        return Response(status_code=404)
+
+    headers = {
+        "ETag": snapshot.etag,
+        "Cache-Control": (
+            "public, max-age=0, "
+            f"s-maxage={settings.space_snapshot_cdn_max_age_seconds}"
+        ),
+    }
+
+    # Weak comparison, as required for If-None-Match
+    if_none_match = [
+        etag.strip().removeprefix("W/")
+        for etag in request.headers.get("If-None-Match", "").split(",")
+    ]
+
+    if "*" in if_none_match or snapshot.etag in if_none_match:
+        return Response(status_code=304, headers=headers)
+
+    return Response(
+        content=snapshot.body,
+        media_type="application/json",
+        headers=headers,
+    )
 
 
 @app.get("/hello")
-def hello(
+async def hello(
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ) -> str:
     session_user: dict | None = request.session.get("user", None)
 
@@ -56,7 +128,7 @@ def hello(
         print("db_user_id is None")
         return "Hello, World!"
 
-    db_user = db.scalar(select(OrmUser).where(OrmUser.id == db_user_id))
+    db_user = await get_user_by_id(db, db_user_id)
 
     if db_user == None:
         print("db_user is None")
@@ -67,7 +139,7 @@ def hello(
 
 @app.get("/login")
 async def login(request: Request):
-    return await oauth.auth0.authorize_redirect(
+    return await get_oauth().auth0.authorize_redirect(
         request, settings.auth_callback_url
     )
 
@@ -75,10 +147,10 @@ async def login(request: Request):
 @app.get("/auth")
 async def auth(
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     try:
-        token = await oauth.auth0.authorize_access_token(request)
+        token = await get_oauth().auth0.authorize_access_token(request)
     except Exception as exception:
         print(exception)
         return Response(status_code=500)
@@ -106,7 +178,7 @@ async def auth(
         print("sub key is missing")
         return Response(status_code=500)
 
-    db_user = db.scalar(
+    db_user = await db.scalar(
         select(OrmUser).where(OrmUser.auth0_user_id == userinfo_sub)
     )
 
@@ -129,7 +201,9 @@ async def auth(
         db_user.email = userinfo_email
         db_user.profile_picture_url = userinfo_picture
 
-    db.commit()
+    await db.commit()
+
+    invalidate_user(db_user)
 
     request.session["user"] = {
         "db_user_id": str(db_user.id),
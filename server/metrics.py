@@ -0,0 +1,87 @@
+"""
+Prometheus metrics, exported on `/metrics`.
+
+Metrics live in the process that records them. When running several worker
+processes, each one is scraped separately, or prometheus_client's
+multiprocess mode has to be set up.
+"""
+
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from prometheus_client import Counter, Histogram
+
+_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000, 10000)
+_LLM_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+graphql_operation_seconds = Histogram(
+    "graphql_operation_duration_seconds",
+    "Time to parse, validate and execute a GraphQL operation",
+    ["operation_type", "operation_name"],
+)
+graphql_resolver_seconds = Histogram(
+    "graphql_resolver_duration_seconds",
+    "Time spent in async resolvers, e.g. the ones querying the database",
+    ["parent_type", "field_name"],
+)
+graphql_operation_sql_statements = Histogram(
+    "graphql_operation_sql_statements",
+    "SQL statements executed per GraphQL operation",
+    ["operation_type", "operation_name"],
+    buckets=_COUNT_BUCKETS,
+)
+graphql_operation_sql_rows = Histogram(
+    "graphql_operation_sql_rows",
+    "Rows returned or affected by SQL statements per GraphQL operation",
+    ["operation_type", "operation_name"],
+    buckets=_COUNT_BUCKETS,
+)
+
+db_statement_seconds = Histogram(
+    "db_statement_duration_seconds",
+    "Time to execute a SQL statement",
+)
+db_pool_wait_seconds = Histogram(
+    "db_pool_wait_seconds",
+    "Time to check out a connection from the pool, including connecting",
+)
+
+llm_request_seconds = Histogram(
+    "llm_request_duration_seconds",
+    "Time until the LLM API responds, to the first byte when streaming",
+    ["model", "status"],
+    buckets=_LLM_BUCKETS,
+)
+llm_rate_limit_wait_seconds = Histogram(
+    "llm_rate_limit_wait_seconds",
+    "Time LLM requests wait for the client side rate limit",
+    ["model"],
+    buckets=_LLM_BUCKETS,
+)
+llm_request_errors = Counter(
+    "llm_request_errors",
+    "LLM requests that failed without a response, e.g. timeouts",
+    ["model"],
+)
+llm_completion_cache_lookups = Counter(
+    "llm_completion_cache_lookups",
+    "Completion cache lookups, by result: memory_hit, database_hit or miss",
+    ["result"],
+)
+llm_completion_cache_stores = Counter(
+    "llm_completion_cache_stores",
+    "Completions stored in the completion cache",
+)
+
+
+@dataclass
+class OperationStats:
+    sql_statements: int = 0
+    sql_rows: int = 0
+
+
+# Set for the duration of a GraphQL operation, so database events can be
+# attributed to it.
+current_operation_stats: ContextVar[OperationStats | None] = ContextVar(
+    "current_operation_stats", default=None
+)
@@ -0,0 +1,74 @@
+"""
+In-process publish/subscribe, used to push events from background work, e.g.
+CSV evaluation runs, to GraphQL subscriptions served by the same process.
+"""
+
+import asyncio
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
+
+
+class _Subscriber:
+    def __init__(self, max_queue_size: int) -> None:
+        self.queue = asyncio.Queue[Any](maxsize=max_queue_size)
+        self.has_overflowed = False
+
+
+class Broker:
+    def __init__(self) -> None:
+        self._subscribers: dict[str, set[_Subscriber]] = defaultdict(set)
+
+    def publish(self, topic: str, message: Any) -> None:
+        """
+        Never blocks the publisher. A subscriber that falls more than its
+        queue size behind is dropped, and its iterator raises once it has
+        consumed the queued messages, so it can resubscribe and refetch.
+        """
+
+        for subscriber in list(self._subscribers.get(topic, ())):
+            try:
+                subscriber.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                subscriber.has_overflowed = True
+                self._unsubscribe(topic, subscriber)
+
+    @asynccontextmanager
+    async def subscribe(
+        self,
+        topic: str,
+        max_queue_size: int,
+    ) -> AsyncIterator[AsyncIterator[Any]]:
+        """
+        Messages published after entering the context are queued, so nothing
+        is missed between subscribing and reading the current state.
+        """
+
+        subscriber = _Subscriber(max_queue_size)
+        self._subscribers[topic].add(subscriber)
+
+        async def iterate() -> AsyncIterator[Any]:
+            while True:
+                if subscriber.has_overflowed and subscriber.queue.empty():
+                    raise Exception("Subscriber fell behind, resubscribe")
+
+                yield await subscriber.queue.get()
+
+        try:
+            yield iterate()
+        finally:
+            self._unsubscribe(topic, subscriber)
+
+    def _unsubscribe(self, topic: str, subscriber: _Subscriber) -> None:
+        subscribers = self._subscribers.get(topic)
+
+        if subscribers == None:
+            return
+
+        subscribers.discard(subscriber)
+
+        if len(subscribers) == 0:
+            del self._subscribers[topic]
+
+
+broker = Broker()
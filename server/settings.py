@@ -7,6 +7,88 @@ class Settings(BaseSettings):
     postgres_user: str
     postgres_password: str
     postgres_database_name: str
+    # DBAPI driver used by the async engine, e.g. "asyncpg" or "psycopg". The
+    # app always uses the async engine, see server/database/database.py.
+    postgres_async_driver: str = "asyncpg"
+    # "queue" keeps a pool of connections per process, "null" opens a new
+    # connection per checkout, e.g. for Lambda behind PgBouncer or RDS Proxy.
+    postgres_pool_mode: str = "queue"
+    postgres_pool_size: int = 5
+    postgres_max_overflow: int = 10
+    postgres_pool_timeout: float = 30  # seconds
+    postgres_pool_recycle: int = 1800  # seconds
+    postgres_pool_pre_ping: bool = True
+    postgres_statement_timeout_ms: int | None = None
+    postgres_pgbouncer_transaction_mode: bool = False
+    # Statements slower than this are logged, None disables the log. With a
+    # log path, they are also written there with a sampled EXPLAIN plan, see
+    # server/database/instrumentation.py.
+    slow_query_threshold_ms: float | None = 500
+    slow_query_log_path: str | None = None
+    slow_query_explain_sample_rate: float = 0.1
+    # Space updates without an expected revision arriving within this window
+    # are merged into one write. Every such update waits for the window, so
+    # it's off (0) by default.
+    space_write_coalescing_window_ms: int = 0
+    # Read-only space snapshots, see server/database/space_snapshot_cache.py.
+    # Content can be megabytes, so keep the number of entries modest.
+    space_snapshot_cache_max_size: int = 200
+    space_snapshot_cache_ttl_seconds: float = 60
+    # How long CDNs can serve a snapshot before revalidating it
+    space_snapshot_cdn_max_age_seconds: int = 60
+    # Users resolved for requests are cached in process for this long.
+    user_cache_max_size: int = 10000
+    user_cache_ttl_seconds: float = 30
+    # Responses are compressed with the first of these encodings the client
+    # accepts, when they are larger than compression_minimum_size bytes.
+    # br and zstd require the brotli and zstandard packages.
+    compression_encodings: str = "zstd,br,gzip"
+    compression_minimum_size: int = 1024
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 5
+    compression_zstd_level: int = 3
+    # Limit for request bodies sent with Content-Encoding, after decompression
+    request_max_decompressed_size: int = 64 * 1024 * 1024
+    openai_api_base_url: str = "https://api.openai.com/v1"
+    llm_max_connections: int = 100
+    llm_connect_timeout_seconds: float = 5
+    llm_request_timeout_seconds: float = 60
+    # Client side limits per API key and model, set to the account's quota.
+    llm_requests_per_minute: int = 3500
+    llm_tokens_per_minute: int = 90000
+    llm_max_retries: int = 5
+    llm_backoff_base_seconds: float = 1
+    llm_backoff_max_seconds: float = 60
+    llm_circuit_breaker_failure_threshold: int = 10
+    llm_circuit_breaker_cooldown_seconds: float = 30
+    # Rate limiters of API keys and models unused for this long are dropped,
+    # their buckets would be full again anyway.
+    llm_rate_limiter_max_size: int = 10000
+    llm_rate_limiter_idle_seconds: float = 10 * 60
+    csv_evaluation_max_concurrency: int = 20
+    graphql_max_subscriptions_per_connection: int = 10
+    # Events a subscriber can fall behind by
+    graphql_subscription_max_queue_size: int = 1000
+    # Automatic persisted queries. With an allow list, a JSON file containing
+    # a list of query documents, only those queries can be executed.
+    graphql_persisted_query_cache_max_size: int = 1000
+    graphql_persisted_query_cache_ttl_seconds: float = 60 * 60 * 24
+    graphql_persisted_query_allow_list_path: str | None = None
+    graphql_max_page_size: int = 100
+    # Parsed and validated documents cached by query text
+    graphql_document_cache_max_size: int = 1000
+    graphql_max_query_depth: int = 10
+    # See server/graphql/query_cost.py
+    graphql_max_query_cost: int = 5000
+    graphql_query_cost_default_list_size: int = 20
+    # Completions are cached in process, and in Postgres when persistent.
+    llm_cache_enabled: bool = True
+    llm_cache_persistent: bool = True
+    llm_cache_memory_max_size: int = 1000
+    llm_cache_ttl_seconds: int = 60 * 60 * 24 * 7
+    dynamodb_endpoint_url: str = "http://localhost:9000"
+    # Budget for `import server.main`, checked by tests/test_import_time.py
+    import_time_budget_seconds: float = 1
     auth0_client_id: str
     auth0_client_secret: str
     auth0_domain: str
@@ -0,0 +1,11 @@
+from server.benchmarks.graphql_endpoints import percentile
+
+
+def test_percentile_is_nearest_rank():
+    values = [float(value) for value in range(1, 203)]
+
+    assert percentile(values, 50) == 101
+    assert percentile(values, 95) == 192
+    assert percentile(values, 100) == 202
+    assert percentile(values, 0) == 1
+    assert percentile([1.0, 2.0, 3.0, 4.0], 50) == 2
@@ -0,0 +1,105 @@
+import gzip
+import tracemalloc
+import zlib
+from typing import Callable
+
+import brotli
+import pytest
+import zstandard
+
+from server.settings import settings
+
+MAX_SIZE = 1024 * 1024
+
+# Zeros compress about a thousand times, so a body of a few hundred KB
+# expands to BOMB_SIZE.
+BOMB_SIZE = 256 * 1024 * 1024
+
+QUERY = b'{"query": "{ __typename }"}'
+
+
+def compress_zeros(compress: Callable[[bytes], bytes], finish: bytes) -> bytes:
+    zeros = bytes(1024 * 1024)
+    parts = [compress(zeros) for _ in range(BOMB_SIZE // len(zeros))]
+    return b"".join(parts) + finish()
+
+
+@pytest.fixture(scope="module")
+def bombs() -> dict[str, bytes]:
+    gzip_compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    brotli_compressor = brotli.Compressor(quality=5)
+    zstd_compressor = zstandard.ZstdCompressor().compressobj()
+
+    return {
+        "gzip": compress_zeros(gzip_compressor.compress, gzip_compressor.flush),
+        "br": compress_zeros(
+            brotli_compressor.process, brotli_compressor.finish
+        ),
+        "zstd": compress_zeros(zstd_compressor.compress, zstd_compressor.flush),
+    }
+
+
+@pytest.fixture(autouse=True)
+def max_size(monkeypatch):
+    monkeypatch.setattr(settings, "request_max_decompressed_size", MAX_SIZE)
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "br", "zstd"])
+async def test_body_expanding_beyond_the_limit_is_rejected(
+    client, bombs, encoding
+):
+    tracemalloc.start()
+
+    try:
+        response = await client.post(
+            "/graphql",
+            content=bombs[encoding],
+            headers={
+                "Content-Type": "application/json",
+                "Content-Encoding": encoding,
+            },
+        )
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert response.status_code == 413
+    # Rejected after decompressing little more than MAX_SIZE, not BOMB_SIZE
+    assert peak < 8 * MAX_SIZE
+
+
+@pytest.mark.parametrize(
+    "encoding, compress",
+    [
+        ("gzip", gzip.compress),
+        ("br", brotli.compress),
+        ("zstd", zstandard.ZstdCompressor().compress),
+    ],
+)
+async def test_body_is_decompressed(client, encoding, compress):
+    response = await client.post(
+        "/graphql",
+        content=compress(QUERY),
+        headers={
+            "Content-Type": "application/json",
+            "Content-Encoding": encoding,
+        },
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {"data": {"__typename": "Query"}}
+
+
+async def test_body_of_exactly_the_limit_is_accepted(client, monkeypatch):
+    monkeypatch.setattr(settings, "request_max_decompressed_size", len(QUERY))
+
+    response = await client.post(
+        "/graphql",
+        content=gzip.compress(QUERY),
+        headers={
+            "Content-Type": "application/json",
+            "Content-Encoding": "gzip",
+        },
+    )
+
+    assert response.status_code == 200
@@ -0,0 +1,219 @@
+import json
+from uuid import UUID, uuid4
+
+import pytest
+from sqlalchemy import select, update
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from server.database import content_patch
+from server.database.orm.space import OrmSpace
+from server.database.orm.user import OrmUser
+
+
+def node(id: str, x: float) -> dict:
+    return {"id": id, "type": "InputNode", "position": {"x": x, "y": 0}}
+
+
+async def create_space(session_maker, token: str | None = None) -> UUID:
+    async with session_maker() as db:
+        db_space = OrmSpace(
+            owner=OrmUser(
+                is_user_placeholder=True, placeholder_client_token=token
+            ),
+            content_v3={
+                "nodes": [node("a", 0), node("b", 0)],
+                "nodeConfigsDict": {},
+            },
+        )
+        db.add(db_space)
+        await db.commit()
+        return db_space.id
+
+
+async def test_patches_run_in_one_update(postgres_engine):
+    session_maker = async_sessionmaker(postgres_engine, expire_on_commit=False)
+    space_id = await create_space(session_maker)
+    other_space_id = await create_space(session_maker)
+
+    doc = OrmSpace.content_v3
+    doc = content_patch.add_node(doc, json.dumps(node("c", 0)))
+    # Nodes added by an earlier patch in the same update can be moved
+    doc = content_patch.move_node(doc, "c", json.dumps({"x": 3, "y": 3}))
+    doc = content_patch.move_node(doc, "a", json.dumps({"x": 1, "y": 1}))
+    doc = content_patch.set_node_config(
+        doc, "c", json.dumps({"type": "InputNode", "nodeId": "c"})
+    )
+
+    async with session_maker() as db:
+        await db.execute(
+            update(OrmSpace)
+            .where(OrmSpace.id == space_id)
+            .values(content_v3=doc)
+        )
+        await db.commit()
+
+        content = await db.scalar(
+            select(OrmSpace.content_v3).where(OrmSpace.id == space_id)
+        )
+        other_content = await db.scalar(
+            select(OrmSpace.content_v3).where(OrmSpace.id == other_space_id)
+        )
+
+    assert content["nodes"] == [
+        {**node("a", 0), "position": {"x": 1, "y": 1}},
+        node("b", 0),
+        {**node("c", 0), "position": {"x": 3, "y": 3}},
+    ]
+    assert content["nodeConfigsDict"] == {
+        "c": {"type": "InputNode", "nodeId": "c"}
+    }
+    assert other_content["nodes"] == [node("a", 0), node("b", 0)]
+
+
+async def test_moving_a_missing_node_aborts_the_update(postgres_engine):
+    session_maker = async_sessionmaker(postgres_engine, expire_on_commit=False)
+    space_id = await create_space(session_maker)
+
+    doc = content_patch.move_node(
+        OrmSpace.content_v3, "missing", json.dumps({"x": 1, "y": 1})
+    )
+
+    async with session_maker() as db:
+        with pytest.raises(DBAPIError):
+            await db.execute(
+                update(OrmSpace)
+                .where(OrmSpace.id == space_id)
+                .values(content_v3=doc)
+            )
+
+
+PATCH_SPACE_CONTENT = """
+mutation ($id: ID!, $expectedRevision: Int!, $patches: [SpaceContentPatch!]!) {
+  patchSpaceContent(
+    id: $id
+    expectedRevision: $expectedRevision
+    patches: $patches
+  ) {
+    id
+    revision
+  }
+}
+"""
+
+
+async def patch_space_content(
+    client, token: str, space_id: UUID, expected_revision: int, patches: list
+) -> dict:
+    response = await client.post(
+        "/graphql",
+        json={
+            "query": PATCH_SPACE_CONTENT,
+            "variables": {
+                "id": str(space_id),
+                "expectedRevision": expected_revision,
+                "patches": patches,
+            },
+        },
+        headers={"PlaceholderUserToken": token},
+    )
+    return response.json()
+
+
+async def get_revision(session_maker, space_id: UUID) -> int:
+    async with session_maker() as db:
+        return await db.scalar(
+            select(OrmSpace.revision).where(OrmSpace.id == space_id)
+        )
+
+
+# Without patches, the update only increments the revision, so the
+# revision checks run on SQLite too.
+
+
+async def test_patching_at_the_expected_revision(client, session_maker):
+    token = str(uuid4())
+    space_id = await create_space(session_maker, token)
+
+    result = await patch_space_content(client, token, space_id, 0, [])
+
+    assert result.get("errors") == None
+    assert result["data"]["patchSpaceContent"] == {
+        "id": str(space_id),
+        "revision": 1,
+    }
+
+
+async def test_patching_an_outdated_revision_fails(client, session_maker):
+    token = str(uuid4())
+    space_id = await create_space(session_maker, token)
+    await patch_space_content(client, token, space_id, 0, [])
+
+    result = await patch_space_content(client, token, space_id, 0, [])
+
+    assert result["data"]["patchSpaceContent"] == None
+    assert result["errors"][0]["message"] == (
+        "Space is at revision 1, reload it before updating"
+    )
+    assert await get_revision(session_maker, space_id) == 1
+
+
+async def test_patching_a_space_of_another_user_returns_null(
+    client, session_maker
+):
+    space_id = await create_space(session_maker, str(uuid4()))
+    token = str(uuid4())
+    await create_space(session_maker, token)
+
+    result = await patch_space_content(client, token, space_id, 0, [])
+
+    assert result.get("errors") == None
+    assert result["data"]["patchSpaceContent"] == None
+    assert await get_revision(session_maker, space_id) == 0
+
+
+@pytest.mark.parametrize(
+    "patch, message",
+    [
+        ({"op": "SET", "value": "1"}, "path is required for SET"),
+        ({"op": "REMOVE"}, "path is required for REMOVE"),
+        ({"op": "SET", "path": ["name"]}, "value is required for SET"),
+        ({"op": "ADD_NODE"}, "value is required for ADD_NODE"),
+        (
+            {"op": "MOVE_NODE", "value": "{}"},
+            "node_id is required for MOVE_NODE",
+        ),
+        (
+            {"op": "SET_NODE_CONFIG", "value": "{}"},
+            "node_id is required for SET_NODE_CONFIG",
+        ),
+        (
+            {"op": "SET_VARIABLE_VALUE", "value": "1"},
+            "variable_id is required for SET_VARIABLE_VALUE",
+        ),
+    ],
+)
+async def test_invalid_patches_are_rejected(
+    client, session_maker, patch, message
+):
+    token = str(uuid4())
+    space_id = await create_space(session_maker, token)
+
+    result = await patch_space_content(client, token, space_id, 0, [patch])
+
+    assert result["data"]["patchSpaceContent"] == None
+    assert result["errors"][0]["message"] == message
+    assert await get_revision(session_maker, space_id) == 0
+
+
+async def test_unknown_patch_operation_is_rejected(client, session_maker):
+    token = str(uuid4())
+    space_id = await create_space(session_maker, token)
+
+    result = await patch_space_content(
+        client, token, space_id, 0, [{"op": "RENAME", "value": "1"}]
+    )
+
+    assert result.get("data") == None
+    assert "RENAME" in result["errors"][0]["message"]
+    assert await get_revision(session_maker, space_id) == 0
@@ -0,0 +1,215 @@
+import asyncio
+from uuid import UUID, uuid4
+
+import httpx
+import pytest
+from sqlalchemy import select
+
+from server.database.csv_rows import replace_all_rows
+from server.database.orm.csv_evaluation_preset import OrmCSVEvaluationPreset
+from server.database.orm.csv_evaluation_run import (
+    CSVEvaluationRunStatus,
+    OrmCSVEvaluationRun,
+)
+from server.database.orm.csv_evaluation_run_result import (
+    OrmCSVEvaluationRunResult,
+)
+from server.database.orm.space import OrmSpace
+from server.database.orm.user import OrmUser
+from server.flow import csv_evaluation
+from server.llm import completion_cache, get_completion
+from server.llm.get_completion import ApiConfig
+from server.lru_cache import LRUCache
+from server.settings import settings
+
+from .test_run_flow import Flow
+
+CONCURRENCY = 2
+
+
+async def create_run(
+    session_maker,
+    row_count: int,
+    content: dict | None = None,
+    config_content: dict | None = None,
+    repeat_count: int = 1,
+) -> UUID:
+    async with session_maker() as db:
+        db_user = OrmUser(
+            is_user_placeholder=True, placeholder_client_token=str(uuid4())
+        )
+        db_space = OrmSpace(
+            owner=db_user,
+            content_v3=content
+            or {
+                "nodes": [],
+                "edges": [],
+                "variablesDict": {},
+                "nodeConfigsDict": {},
+                "variableValueLookUpDicts": [],
+            },
+        )
+        db_preset = OrmCSVEvaluationPreset(
+            owner=db_user, space=db_space, config_content=config_content
+        )
+        db.add(db_preset)
+        await db.flush()
+
+        await replace_all_rows(
+            db, db_preset, ([str(index)] for index in range(row_count))
+        )
+
+        db_run = OrmCSVEvaluationRun(
+            owner=db_user,
+            preset=db_preset,
+            concurrency=CONCURRENCY,
+            repeat_count=repeat_count,
+        )
+        db.add(db_run)
+        await db.commit()
+
+        return db_run.id
+
+
+async def run(session_maker, run_id: UUID) -> OrmCSVEvaluationRun:
+    tasks = asyncio.all_tasks()
+
+    await asyncio.wait_for(
+        csv_evaluation.run_csv_evaluation(
+            run_id, ApiConfig(openai_organization_id="", openai_key="")
+        ),
+        timeout=5,
+    )
+
+    # No producer or worker is left waiting on the queue
+    await asyncio.sleep(0)
+    assert asyncio.all_tasks() == tasks
+
+    async with session_maker() as db:
+        return await db.get_one(OrmCSVEvaluationRun, run_id)
+
+
+@pytest.fixture(autouse=True)
+def patch_session(monkeypatch, session_maker):
+    monkeypatch.setattr(csv_evaluation, "AsyncSessionLocal", session_maker)
+
+
+@pytest.fixture
+def stub_run_flow(monkeypatch):
+    async def run_flow(*args, **kwargs):
+        return {}
+
+    monkeypatch.setattr(csv_evaluation, "run_flow", run_flow)
+
+
+async def test_run_stores_results(session_maker, stub_run_flow):
+    run_id = await create_run(session_maker, 10)
+
+    db_run = await run(session_maker, run_id)
+
+    assert db_run.status == CSVEvaluationRunStatus.SUCCEEDED
+    assert db_run.finished_count == 9
+
+
+async def test_failing_producer_stops_workers(
+    session_maker, stub_run_flow, monkeypatch
+):
+    run_id = await create_run(session_maker, 10)
+
+    async def iter_rows(*args):
+        raise Exception("Rows can't be loaded")
+        yield
+
+    monkeypatch.setattr(csv_evaluation, "iter_rows", iter_rows)
+
+    db_run = await run(session_maker, run_id)
+
+    assert db_run.status == CSVEvaluationRunStatus.FAILED
+    assert db_run.error == "Rows can't be loaded"
+
+
+async def test_failing_worker_stops_producer(
+    session_maker, stub_run_flow, monkeypatch
+):
+    # More rows than fit in the queue, so the producer is waiting to add
+    # rows when the workers fail.
+    run_id = await create_run(session_maker, 10 * CONCURRENCY)
+
+    def insert(*args):
+        raise Exception("Results can't be stored")
+
+    monkeypatch.setattr(csv_evaluation, "_RESULT_BATCH_SIZE", 1)
+    monkeypatch.setattr(csv_evaluation, "insert", insert)
+
+    db_run = await run(session_maker, run_id)
+
+    assert db_run.status == CSVEvaluationRunStatus.FAILED
+    assert db_run.error == "Results can't be stored"
+
+
+async def test_repeats_get_their_own_completions(session_maker, monkeypatch):
+    flow = Flow()
+    topic = flow.add_input("input", "topic")
+    (result,) = flow.add_output("output", ["result"])
+    flow.add_chain(topic, "a", result)
+
+    calls = 0
+
+    # Like the API with temperature 1, every call answers differently
+    async def send_with_rate_limit(api_key, model, prompt_tokens, send):
+        nonlocal calls
+        calls += 1
+        message = {"role": "assistant", "content": f"Answer {calls}"}
+        return httpx.Response(200, json={"choices": [{"message": message}]})
+
+    monkeypatch.setattr(
+        get_completion, "send_with_rate_limit", send_with_rate_limit
+    )
+    monkeypatch.setattr(settings, "llm_cache_persistent", False)
+    monkeypatch.setattr(completion_cache, "_memory_cache", LRUCache(10, 60))
+    stats_before = completion_cache.get_stats()
+
+    # A header row and one row, run twice
+    run_id = await create_run(
+        session_maker,
+        2,
+        content=flow.content,
+        config_content={
+            "variableIdToCsvColumnIndexMap": {topic: 0},
+        },
+        repeat_count=2,
+    )
+
+    db_run = await run(session_maker, run_id)
+
+    assert db_run.status == CSVEvaluationRunStatus.SUCCEEDED
+    assert calls == 2
+
+    async with session_maker() as db:
+        outputs = await db.scalars(
+            select(OrmCSVEvaluationRunResult.outputs)
+            .where(OrmCSVEvaluationRunResult.run_id == run_id)
+            .order_by(OrmCSVEvaluationRunResult.iteration_index)
+        )
+
+        assert list(outputs) == [{"result": "Answer 1"}, {"result": "Answer 2"}]
+
+    # Running the evaluation again is served from the cache
+    run_id = await create_run(
+        session_maker,
+        2,
+        content=flow.content,
+        config_content={
+            "variableIdToCsvColumnIndexMap": {topic: 0},
+        },
+        repeat_count=2,
+    )
+
+    await run(session_maker, run_id)
+
+    assert calls == 2
+
+    stats = completion_cache.get_stats()
+    assert stats["miss"] - stats_before["miss"] == 2
+    assert stats["store"] - stats_before["store"] == 2
+    assert stats["memory_hit"] - stats_before["memory_hit"] == 2
@@ -0,0 +1,29 @@
+from uuid import uuid4
+
+import pytest
+
+from server.database.csv_rows import format_csv, get_rows, parse_csv
+
+
+def test_blank_lines_are_kept_as_rows():
+    rows = list(parse_csv('a,b\r\n\r\n"x",y\r\n'))
+
+    assert rows == [["a", "b"], [], ["x", "y"]]
+
+
+def test_formatting_normalizes_line_endings_and_quoting():
+    rows = list(parse_csv('a,b\r\n\r\n"x",y\r\n'))
+
+    assert format_csv(rows) == "a,b\n\nx,y\n"
+
+
+def test_fields_are_quoted_when_needed():
+    rows = [["a,b", 'say "hi"', "line\nbreak"]]
+
+    assert list(parse_csv(format_csv(rows))) == rows
+
+
+async def test_negative_offset_is_rejected(session_maker):
+    async with session_maker() as db:
+        with pytest.raises(Exception, match="offset must not be negative"):
+            await get_rows(db, uuid4(), -1, 10)
@@ -0,0 +1,70 @@
+import httpx
+import pytest
+
+from server.llm import get_completion as module
+from server.llm.get_completion import (
+    ApiConfig,
+    LlmMessage,
+    get_completion,
+    stream_completion,
+)
+
+API_CONFIG = ApiConfig(openai_organization_id="", openai_key="key")
+MESSAGES = [LlmMessage(role="user", content="Hi")]
+
+STREAM = (
+    'data: {"choices": [{"delta": {"role": "assistant"}}]}\n\n'
+    'data: {"choices": [{"delta": {"content": "Hel"}}]}\n\n'
+    'data: {"choices": [{"delta": {"content": "lo"}}]}\n\n'
+    "data: [DONE]\n\n"
+)
+
+
+@pytest.fixture(autouse=True)
+def failing_cache(monkeypatch):
+    async def get_cached_message(key):
+        return None
+
+    async def set_cached_message(key, model, message):
+        raise Exception("Database is unavailable")
+
+    monkeypatch.setattr(module, "get_cached_message", get_cached_message)
+    monkeypatch.setattr(module, "set_cached_message", set_cached_message)
+
+
+def respond_with(monkeypatch, response: httpx.Response) -> None:
+    async def send_with_rate_limit(api_key, model, prompt_tokens, send):
+        return response
+
+    monkeypatch.setattr(module, "send_with_rate_limit", send_with_rate_limit)
+
+
+async def test_completion_is_returned_when_caching_fails(monkeypatch):
+    respond_with(
+        monkeypatch,
+        httpx.Response(
+            200,
+            json={
+                "choices": [
+                    {"message": {"role": "assistant", "content": "Hello"}}
+                ]
+            },
+        ),
+    )
+
+    message = await get_completion(API_CONFIG, "gpt-4", 1, MESSAGES, [])
+
+    assert message == LlmMessage(role="assistant", content="Hello")
+
+
+async def test_streamed_completion_ends_when_caching_fails(monkeypatch):
+    respond_with(monkeypatch, httpx.Response(200, text=STREAM))
+
+    contents = [
+        content
+        async for content in stream_completion(
+            API_CONFIG, "gpt-4", 1, MESSAGES, []
+        )
+    ]
+
+    assert contents == ["Hel", "lo"]
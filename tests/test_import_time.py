@@ -0,0 +1,74 @@
+"""
+Importing the server is what every cold start pays before serving the first
+request, so it must stay within `settings.import_time_budget_seconds`.
+"""
+
+import subprocess
+import sys
+
+from server.settings import settings
+
+RUNS = 5
+
+MEASURE_IMPORT = """
+import time
+tic = time.perf_counter()
+import server.main
+print(time.perf_counter() - tic)
+"""
+
+
+def measure_import_seconds() -> float:
+    # A new interpreter every time, so nothing is imported yet. It inherits
+    # the settings conftest sets in the environment.
+    result = subprocess.run(
+        [sys.executable, "-c", MEASURE_IMPORT],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return float(result.stdout.splitlines()[-1])
+
+
+def get_slowest_imports(count: int) -> list[tuple[int, str]]:
+    """
+    Modules with the highest import time, excluding their own imports, in
+    microseconds.
+    """
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server.main"],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+
+    imports = []
+
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:"):
+            continue
+
+        self_us, _, name = line.removeprefix("import time:").split("|")
+
+        if self_us.strip().isdigit():
+            imports.append((int(self_us), name.strip()))
+
+    return sorted(imports, reverse=True)[:count]
+
+
+def test_import_is_within_budget():
+    budget = settings.import_time_budget_seconds
+    # The fastest run is the least affected by noise
+    seconds = min(measure_import_seconds() for _ in range(RUNS))
+
+    if seconds > budget:
+        slowest = "\n".join(
+            f"  {self_us / 1000:8.1f}ms  {name}"
+            for self_us, name in get_slowest_imports(15)
+        )
+        raise AssertionError(
+            f"import server.main took {seconds:0.3f}s, over the budget of"
+            f" {budget:0.3f}s. Slowest imports:\n{slowest}"
+        )
@@ -0,0 +1,111 @@
+from uuid import uuid4
+
+from sqlalchemy import select
+
+from server.database.orm.csv_evaluation_preset import OrmCSVEvaluationPreset
+from server.database.orm.space import OrmSpace
+from server.database.orm.user import OrmUser
+
+QUERY = """
+query {
+  user {
+    spaces {
+      id
+      name
+      csvEvaluationPresets {
+        id
+        name
+      }
+    }
+  }
+}
+"""
+
+
+async def create_user(session_maker, space_count: int) -> str:
+    token = str(uuid4())
+
+    async with session_maker() as db:
+        db_user = OrmUser(
+            is_user_placeholder=True, placeholder_client_token=token
+        )
+
+        for index in range(space_count):
+            db_space = OrmSpace(owner=db_user, name=f"Space {index}")
+            db.add(db_space)
+            db.add_all(
+                OrmCSVEvaluationPreset(
+                    owner=db_user, space=db_space, name=f"Preset {i}"
+                )
+                for i in range(2)
+            )
+
+        await db.commit()
+
+    return token
+
+
+async def count_statements(client, statements, token: str, space_count: int):
+    statements.clear()
+
+    response = await client.post(
+        "/graphql",
+        json={"query": QUERY},
+        headers={"PlaceholderUserToken": token},
+    )
+    result = response.json()
+
+    assert result.get("errors") == None
+    assert len(result["data"]["user"]["spaces"]) == space_count
+
+    return len(statements)
+
+
+async def test_user_spaces_statement_count_is_constant(
+    client, session_maker, statements
+):
+    one_space_token = await create_user(session_maker, 1)
+    many_spaces_token = await create_user(session_maker, 100)
+
+    one_space_count = await count_statements(
+        client, statements, one_space_token, 1
+    )
+    many_spaces_count = await count_statements(
+        client, statements, many_spaces_token, 100
+    )
+
+    assert many_spaces_count == one_space_count
+
+
+async def test_missing_csv_evaluation_preset_is_null(client, session_maker):
+    token = await create_user(session_maker, 1)
+
+    async with session_maker() as db:
+        space_id = await db.scalar(select(OrmSpace.id))
+
+    response = await client.post(
+        "/graphql",
+        json={
+            "query": """
+                query ($spaceId: UUID!, $presetId: ID!) {
+                  space(id: $spaceId) {
+                    space {
+                      id
+                      csvEvaluationPreset(id: $presetId) {
+                        id
+                      }
+                    }
+                  }
+                }
+            """,
+            "variables": {"spaceId": str(space_id), "presetId": str(uuid4())},
+        },
+        headers={"PlaceholderUserToken": token},
+    )
+    result = response.json()
+
+    assert result.get("errors") == None
+    assert result["data"]["space"]["space"] == {
+        "id": str(space_id),
+        "csvEvaluationPreset": None,
+    }
@@ -0,0 +1,42 @@
+from server.llm import rate_limiter
+from server.llm.rate_limiter import get_rate_limiter
+from server.lru_cache import LRUCache
+
+
+def test_rate_limiters_are_shared_per_key_and_model(monkeypatch):
+    monkeypatch.setattr(
+        rate_limiter,
+        "_rate_limiters",
+        LRUCache(max_size=10, ttl_seconds=60),
+    )
+
+    assert get_rate_limiter("key", "gpt-4") is get_rate_limiter("key", "gpt-4")
+    assert get_rate_limiter("key", "gpt-4") is not get_rate_limiter(
+        "key", "gpt-3.5-turbo"
+    )
+    assert get_rate_limiter("key", "gpt-4") is not get_rate_limiter(
+        "other key", "gpt-4"
+    )
+
+
+def test_rate_limiters_are_bounded(monkeypatch):
+    rate_limiters = LRUCache(max_size=10, ttl_seconds=60)
+    monkeypatch.setattr(rate_limiter, "_rate_limiters", rate_limiters)
+
+    first = get_rate_limiter("key", "model 0")
+
+    for index in range(100):
+        get_rate_limiter("key", f"model {index}")
+
+    assert len(rate_limiters) == 10
+    assert get_rate_limiter("key", "model 0") is not first
+
+
+def test_model_labels_are_bounded(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "_model_labels", set())
+    monkeypatch.setattr(rate_limiter, "_MAX_MODEL_LABELS", 2)
+
+    assert rate_limiter._get_model_label("gpt-4") == "gpt-4"
+    assert rate_limiter._get_model_label("gpt-3.5-turbo") == "gpt-3.5-turbo"
+    assert rate_limiter._get_model_label("made up model") == "other"
+    assert rate_limiter._get_model_label("gpt-4") == "gpt-4"
@@ -0,0 +1,252 @@
+import asyncio
+
+import pytest
+
+from server.flow import nodes
+from server.flow.events import FlowRunEvent, FlowRunEventType
+from server.flow.nodes import render_template
+from server.flow.run_flow import run_flow
+from server.llm.get_completion import ApiConfig, LlmMessage
+
+API_CONFIG = ApiConfig(openai_organization_id="", openai_key="key")
+
+
+class Flow:
+    """
+    Builds content_v3 documents, with the variable layout of the frontend's
+    node definitions.
+    """
+
+    def __init__(self) -> None:
+        self.content: dict = {
+            "nodes": [],
+            "edges": [],
+            "variablesDict": {},
+            "nodeConfigsDict": {},
+            "variableValueLookUpDicts": [{}],
+        }
+
+    def add_node(self, node_id: str, node_type: str, **config) -> None:
+        self.content["nodes"].append({"id": node_id, "type": node_type})
+        self.content["nodeConfigsDict"][node_id] = {
+            "nodeId": node_id,
+            "type": node_type,
+            **config,
+        }
+
+    def add_variable(
+        self, node_id: str, name: str, variable_type: str, index: int
+    ) -> str:
+        variable_id = f"{node_id}/{name}/{variable_type}"
+        self.content["variablesDict"][variable_id] = {
+            "id": variable_id,
+            "name": name,
+            "type": variable_type,
+            "index": index,
+            "nodeId": node_id,
+        }
+        return variable_id
+
+    def connect(self, source_handle: str, target_handle: str) -> None:
+        variables = self.content["variablesDict"]
+        self.content["edges"].append(
+            {
+                "id": f"{source_handle}->{target_handle}",
+                "source": variables[source_handle]["nodeId"],
+                "target": variables[target_handle]["nodeId"],
+                "sourceHandle": source_handle,
+                "targetHandle": target_handle,
+            }
+        )
+
+    def add_input(self, node_id: str, name: str) -> str:
+        self.add_node(node_id, "InputNode")
+        return self.add_variable(node_id, name, "FlowInput", 0)
+
+    def add_message(self, node_id: str, content: str, names: list[str]):
+        self.add_node(
+            node_id, "ChatGPTMessageNode", role="user", content=content
+        )
+        messages = self.add_variable(node_id, "messages", "NodeInput", 0)
+        inputs = [
+            self.add_variable(node_id, name, "NodeInput", index + 1)
+            for index, name in enumerate(names)
+        ]
+        self.add_variable(node_id, "message", "NodeOutput", 0)
+        return (
+            messages,
+            inputs,
+            self.add_variable(node_id, "messages", "NodeOutput", 1),
+        )
+
+    def add_completion(self, node_id: str) -> tuple[str, str]:
+        self.add_node(
+            node_id, "ChatGPTChatCompletionNode", model="gpt-4", temperature=1
+        )
+        messages = self.add_variable(node_id, "messages", "NodeInput", 0)
+        content = self.add_variable(node_id, "content", "NodeOutput", 0)
+        self.add_variable(node_id, "message", "NodeOutput", 1)
+        self.add_variable(node_id, "messages", "NodeOutput", 2)
+        return messages, content
+
+    def add_output(self, node_id: str, names: list[str]) -> list[str]:
+        self.add_node(node_id, "OutputNode")
+        return [
+            self.add_variable(node_id, name, "FlowOutput", index)
+            for index, name in enumerate(names)
+        ]
+
+    def add_chain(self, topic: str, chain: str, result: str) -> None:
+        """
+        Message -> completion -> output variable, for the topic variable.
+        """
+
+        _, (topic_in,), messages_out = self.add_message(
+            f"message {chain}",
+            f"Write about {{{{topic}}}} ({chain})",
+            ["topic"],
+        )
+        messages_in, content = self.add_completion(f"completion {chain}")
+        self.connect(topic, topic_in)
+        self.connect(messages_out, messages_in)
+        self.connect(content, result)
+
+
+@pytest.fixture
+def completions(monkeypatch) -> list[str]:
+    """
+    Prompts sent to the stubbed LLM, which answers with the prompt in upper
+    case.
+    """
+
+    prompts: list[str] = []
+
+    async def get_completion(messages: list[LlmMessage], **kwargs):
+        prompt = messages[-1].content
+        prompts.append(prompt)
+        await asyncio.sleep(0)
+        return LlmMessage(role="assistant", content=prompt.upper())
+
+    async def stream_completion(messages: list[LlmMessage], **kwargs):
+        message = await get_completion(messages)
+
+        for word in message.content.split(" "):
+            yield word + " "
+
+    monkeypatch.setattr(nodes, "get_completion", get_completion)
+    monkeypatch.setattr(nodes, "stream_completion", stream_completion)
+    return prompts
+
+
+def create_two_chain_flow() -> Flow:
+    flow = Flow()
+    topic = flow.add_input("input", "topic")
+    first, second = flow.add_output("output", ["first", "second"])
+    flow.add_chain(topic, "a", first)
+    flow.add_chain(topic, "b", second)
+    return flow
+
+
+async def test_nodes_run_after_the_nodes_they_depend_on(completions):
+    flow = create_two_chain_flow()
+    events: list[FlowRunEvent] = []
+
+    async def emit(event: FlowRunEvent) -> None:
+        events.append(event)
+
+    outputs = await run_flow(
+        flow.content, API_CONFIG, {"topic": "the sea"}, emit=emit
+    )
+
+    # Streamed word by word
+    assert outputs == {
+        "first": "WRITE ABOUT THE SEA (A) ",
+        "second": "WRITE ABOUT THE SEA (B) ",
+    }
+
+    started = [
+        e.node_id for e in events if e.type == FlowRunEventType.NODE_STARTED
+    ]
+    finished = [
+        e.node_id for e in events if e.type == FlowRunEventType.NODE_FINISHED
+    ]
+
+    def assert_runs_after(node_id: str, upstream_node_id: str) -> None:
+        assert finished.index(upstream_node_id) < started.index(node_id)
+
+    for chain in ["a", "b"]:
+        assert_runs_after(f"message {chain}", "input")
+        assert_runs_after(f"completion {chain}", f"message {chain}")
+        assert_runs_after("output", f"completion {chain}")
+
+    assert events[-1].type == FlowRunEventType.FLOW_FINISHED
+    assert events[-1].values == outputs
+
+
+async def test_independent_nodes_run_concurrently(monkeypatch):
+    # Each completion waits for the other one to start, so running them one
+    # after the other times out.
+    barrier = asyncio.Barrier(2)
+
+    async def get_completion(messages: list[LlmMessage], **kwargs):
+        await asyncio.wait_for(barrier.wait(), timeout=1)
+        return LlmMessage(role="assistant", content="done")
+
+    monkeypatch.setattr(nodes, "get_completion", get_completion)
+
+    outputs = await run_flow(
+        create_two_chain_flow().content, API_CONFIG, {"topic": "the sea"}
+    )
+
+    assert outputs == {"first": "done", "second": "done"}
+
+
+async def test_flow_with_a_cycle_fails(completions):
+    flow = Flow()
+    messages_a, _, messages_out_a = flow.add_message(
+        "message a", "{{topic}}", ["topic"]
+    )
+    messages_b, _, messages_out_b = flow.add_message("message b", "b", [])
+    flow.connect(messages_out_a, messages_b)
+    flow.connect(messages_out_b, messages_a)
+
+    with pytest.raises(Exception, match="Flow contains a cycle"):
+        await run_flow(flow.content, API_CONFIG)
+
+
+async def test_flow_with_an_unsupported_node_fails(completions):
+    flow = Flow()
+    flow.add_node("javascript", "JavaScriptFunctionNode")
+
+    with pytest.raises(Exception, match="Unsupported node type"):
+        await run_flow(flow.content, API_CONFIG)
+
+
+async def test_missing_input_renders_as_empty(completions):
+    flow = create_two_chain_flow()
+
+    outputs = await run_flow(flow.content, API_CONFIG)
+
+    assert sorted(completions) == ["Write about  (a)", "Write about  (b)"]
+    assert outputs == {
+        "first": "WRITE ABOUT  (A)",
+        "second": "WRITE ABOUT  (B)",
+    }
+
+
+@pytest.mark.parametrize(
+    "template, expected",
+    [
+        ("Hello {{name}}!", "Hello &lt;World&gt;&amp;!"),
+        ("Hello {{{name}}}!", "Hello <World>&!"),
+        ("Hello {{& name}}!", "Hello <World>&!"),
+        ("Hello {{ name }}!", "Hello &lt;World&gt;&amp;!"),
+        ("Hello {{missing}}!", "Hello !"),
+        ("{{count}} {{items}}", "2 [&quot;a&quot;,&quot;b&quot;]"),
+        ("No tags", "No tags"),
+    ],
+)
+def test_render_template(template: str, expected: str):
+    values = {"name": "<World>&", "count": 2, "items": ["a", "b"]}
+
+    assert render_template(template, values) == expected
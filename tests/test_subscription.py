@@ -0,0 +1,155 @@
+import asyncio
+from uuid import UUID
+
+from server.database.orm.csv_evaluation_run import (
+    CSVEvaluationRunStatus,
+    OrmCSVEvaluationRun,
+)
+from server.database.orm.user import OrmUser
+from server.flow import csv_evaluation, events
+from server.graphql import subscription
+from server.graphql.context import Context
+from server.graphql.graphql import schema
+from server.pubsub import broker
+from server.settings import settings
+
+from .test_csv_evaluation import create_run
+
+SUBSCRIPTION = """
+subscription {
+  runFlow(spaceId: "space", openaiApiKey: "key") {
+    type
+  }
+}
+"""
+
+
+CSV_EVALUATION_RUN_SUBSCRIPTION = """
+subscription ($id: ID!) {
+  csvEvaluationRun(id: $id) {
+    status
+    finishedCount
+  }
+}
+"""
+
+
+class UserContext(Context):
+    async def get_db_user(self) -> OrmUser | None:
+        return OrmUser(is_user_placeholder=True)
+
+
+class RunOwnerContext(Context):
+    def __init__(self, db, run_id: UUID) -> None:
+        super().__init__(db)
+        self.run_id = run_id
+
+    async def get_db_user(self) -> OrmUser | None:
+        db_run = await self.db.get(OrmCSVEvaluationRun, self.run_id)
+        return await db_run.awaitable_attrs.owner
+
+
+async def run_flow(content, api_config, inputs, use_cache, emit) -> None:
+    # Faster than the client reads, so the queue fills up
+    while True:
+        await emit(events.FlowRunEvent(type=events.FlowRunEventType.NODE_TOKEN))
+
+
+async def load_flow_content(db, db_user, space_id):
+    return {}
+
+
+async def test_unsubscribing_from_a_blocked_flow_stops_it(
+    monkeypatch, session_maker
+):
+    monkeypatch.setattr(settings, "graphql_subscription_max_queue_size", 1)
+    monkeypatch.setattr(subscription, "run_flow", run_flow)
+    monkeypatch.setattr(subscription, "load_flow_content", load_flow_content)
+
+    tasks = asyncio.all_tasks()
+
+    async with session_maker() as db:
+        result = await schema.subscribe(
+            SUBSCRIPTION, context_value=UserContext(db)
+        )
+
+        first = await anext(result)
+        assert first.errors == None
+
+        # Let the flow fill the queue
+        await asyncio.sleep(0.01)
+
+        await result.aclose()
+
+    await asyncio.sleep(0.01)
+    assert asyncio.all_tasks() == tasks
+
+
+async def test_events_of_a_finished_flow_are_all_sent(
+    monkeypatch, session_maker
+):
+    async def run_flow(content, api_config, inputs, use_cache, emit) -> None:
+        for _ in range(3):
+            await emit(
+                events.FlowRunEvent(type=events.FlowRunEventType.NODE_TOKEN)
+            )
+
+    monkeypatch.setattr(settings, "graphql_subscription_max_queue_size", 1)
+    monkeypatch.setattr(subscription, "run_flow", run_flow)
+    monkeypatch.setattr(subscription, "load_flow_content", load_flow_content)
+
+    async with session_maker() as db:
+        result = await schema.subscribe(
+            SUBSCRIPTION, context_value=UserContext(db)
+        )
+
+        async def read_all() -> list:
+            return [item async for item in result]
+
+        # The flow finishes while the queue is full, so the end of the
+        # events must still be queued once there is room.
+        assert len(await asyncio.wait_for(read_all(), timeout=5)) == 3
+
+
+async def test_csv_evaluation_run_id_is_normalized(session_maker):
+    run_id = await create_run(session_maker, 2)
+
+    async with session_maker() as db:
+        # The same run, but not in the form events are published with
+        result = await schema.subscribe(
+            CSV_EVALUATION_RUN_SUBSCRIPTION,
+            context_value=RunOwnerContext(db, run_id),
+            variable_values={"id": run_id.hex.upper()},
+        )
+
+        first = await anext(result)
+        assert first.errors == None
+        assert first.data == {
+            "csvEvaluationRun": {"status": "PENDING", "finishedCount": 0}
+        }
+
+        broker.publish(
+            csv_evaluation.csv_evaluation_run_topic(run_id),
+            csv_evaluation.CSVEvaluationRunEvent(
+                status=CSVEvaluationRunStatus.SUCCEEDED,
+                total_count=1,
+                finished_count=1,
+            ),
+        )
+
+        second = await asyncio.wait_for(anext(result), timeout=5)
+        assert second.data == {
+            "csvEvaluationRun": {"status": "SUCCEEDED", "finishedCount": 1}
+        }
+
+
+async def test_invalid_csv_evaluation_run_id_is_rejected(session_maker):
+    async with session_maker() as db:
+        result = await schema.subscribe(
+            CSV_EVALUATION_RUN_SUBSCRIPTION,
+            context_value=UserContext(db),
+            variable_values={"id": "not a run"},
+        )
+
+        first = await anext(result)
+        assert first.errors[0].message == "Invalid run id not a run"